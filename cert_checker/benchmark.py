@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Certificate Checker Benchmark
+Runs the checker against a farm of local TLS listeners and records throughput,
+handshake latency, memory and CPU per probe for each scan engine.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+# Days until expiry served by the farm, cycled across listeners
+EXPIRY_DAYS = [-5, 3, 15, 90, 365]
+
+def create_certificates(directory: str) -> Tuple[str, Dict[int, Tuple[str, str]]]:
+    """
+    Create a throwaway CA and one leaf certificate per entry in EXPIRY_DAYS.
+    
+    Args:
+        directory (str): Directory to write the PEM files to
+    
+    Returns:
+        Tuple[str, Dict[int, Tuple[str, str]]]: CA certificate path and
+            (certificate, key) paths per days until expiry
+    """
+    import ipaddress
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    
+    now = datetime.now(timezone.utc)
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Benchmark CA')])
+    ca_cert = (
+        x509.CertificateBuilder()
+        .subject_name(ca_name)
+        .issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=30))
+        .not_valid_after(now + timedelta(days=3650))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(ca_key, hashes.SHA256())
+    )
+    ca_path = os.path.join(directory, 'ca.crt')
+    with open(ca_path, 'wb') as f:
+        f.write(ca_cert.public_bytes(serialization.Encoding.PEM))
+    
+    leaves = {}
+    for days in EXPIRY_DAYS:
+        key = ec.generate_private_key(ec.SECP256R1())
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')]))
+            .issuer_name(ca_name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=30))
+            # Half a day of margin so the integer day count is stable during the run
+            .not_valid_after(now + timedelta(days=days, hours=12))
+            .add_extension(x509.SubjectAlternativeName([
+                x509.DNSName('localhost'),
+                x509.IPAddress(ipaddress.ip_address('127.0.0.1'))
+            ]), critical=False)
+            .sign(ca_key, hashes.SHA256())
+        )
+        cert_path = os.path.join(directory, f"leaf_{days}.crt")
+        key_path = os.path.join(directory, f"leaf_{days}.key")
+        with open(cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        leaves[days] = (cert_path, key_path)
+    
+    return ca_path, leaves
+
+def plan_listeners(count: int, reset_ratio: float, hang_ratio: float) -> List[Dict]:
+    """
+    Decide the behaviour and certificate of every listener in the farm.
+    
+    Args:
+        count (int): Number of listeners
+        reset_ratio (float): Fraction of listeners that reset the connection
+        hang_ratio (float): Fraction of listeners that accept but never handshake
+    
+    Returns:
+        List[Dict]: One entry per listener with 'behaviour' and 'days'
+    """
+    resets = int(count * reset_ratio)
+    hangs = int(count * hang_ratio)
+    listeners = []
+    for index in range(count):
+        if index < resets:
+            behaviour = 'reset'
+        elif index < resets + hangs:
+            behaviour = 'hang'
+        else:
+            behaviour = 'tls'
+        listeners.append({'behaviour': behaviour, 'days': EXPIRY_DAYS[index % len(EXPIRY_DAYS)]})
+    return listeners
+
+def raise_file_limit() -> None:
+    """
+    Raise the soft open-file limit to the hard limit for large farms.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def serve_farm(listeners: List[Dict], leaves: Dict[int, Tuple[str, str]], latency: float, ready) -> None:
+    """
+    Run every listener on one event loop until the process is terminated.
+    
+    Args:
+        listeners (List[Dict]): Listener plan from plan_listeners
+        leaves (Dict[int, Tuple[str, str]]): Certificate and key paths per days until expiry
+        latency (float): Seconds to wait before each TLS handshake
+        ready: multiprocessing connection used to send back the listening ports
+    """
+    raise_file_limit()
+    contexts = {}
+    for days, (cert_path, key_path) in leaves.items():
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path, key_path)
+        contexts[days] = context
+    
+    open_connections = set()
+    
+    class ListenerProtocol(asyncio.Protocol):
+        """
+        One accepted connection, handled according to its listener's behaviour.
+        """
+        
+        def __init__(self, listener):
+            self.listener = listener
+            self.transport = None
+        
+        def connection_made(self, transport):
+            self.transport = transport
+            # A paused transport is not referenced by the loop, keep it alive until closed
+            open_connections.add(self)
+            if self.listener['behaviour'] == 'reset':
+                # SO_LINGER with a zero timeout turns close() into a TCP RST
+                sock = transport.get_extra_info('socket')
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                transport.abort()
+                return
+            # Leave the ClientHello in the kernel buffer until the handshake starts
+            transport.pause_reading()
+            if self.listener['behaviour'] == 'tls':
+                asyncio.get_running_loop().call_later(latency, lambda: asyncio.ensure_future(self.handshake()))
+        
+        async def handshake(self):
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.start_tls(self.transport, self, contexts[self.listener['days']], server_side=True)
+            except (ConnectionError, ssl.SSLError, OSError):
+                self.transport.abort()
+        
+        def connection_lost(self, exc):
+            open_connections.discard(self)
+            self.transport.abort()
+    
+    async def main():
+        loop = asyncio.get_running_loop()
+        servers = []
+        for listener in listeners:
+            servers.append(await loop.create_server(lambda listener=listener: ListenerProtocol(listener),
+                                                    '127.0.0.1', 0, backlog=1024))
+        ready.send([server.sockets[0].getsockname()[1] for server in servers])
+        await asyncio.Event().wait()
+    
+    asyncio.run(main())
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    
+    Args:
+        values (List[float]): Samples
+        fraction (float): Percentile as a fraction, e.g. 0.99
+    
+    Returns:
+        float: The percentile, or 0.0 for no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+def run_mode(config: Dict, expected: Dict[str, str]) -> Dict:
+    """
+    Scan the farm with one configuration in a fresh process and measure it.
+    
+    Runs inside its own process so peak RSS and CPU time belong to this
+    mode only.
+    
+    Args:
+        config (Dict): Checker configuration for the run
+        expected (Dict[str, str]): Expected status per URL
+    
+    Returns:
+        Dict: Throughput, latency, memory and CPU figures
+    """
+    raise_file_limit()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as checker_module
+    
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(config, f)
+        config_path = f.name
+    try:
+        checker = checker_module.CertificateChecker(config_path)
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        results = checker.check_certificates(force_refresh=True)
+        elapsed = time.perf_counter() - started
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    finally:
+        os.unlink(config_path)
+    
+    handshakes = [r['timings']['handshake'] for r in results if 'handshake' in r.get('timings', {})]
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    
+    return {
+        'probes': len(results),
+        'elapsed_seconds': round(elapsed, 4),
+        'hosts_per_second': round(len(results) / elapsed, 2) if elapsed else None,
+        'handshake_p50_ms': round(percentile(handshakes, 0.50) * 1000, 3),
+        'handshake_p99_ms': round(percentile(handshakes, 0.99) * 1000, 3),
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(usage_after.ru_maxrss / 1024, 2),
+        'cpu_ms_per_probe': round(cpu_seconds * 1000 / len(results), 4) if results else None,
+        'statuses': statuses,
+        'mismatches': sum(1 for r in results if expected.get(r['url']) != r['status'])
+    }
+
+def expected_status(listener: Dict, verify: bool) -> str:
+    """
+    Status the checker should report for a listener with default thresholds.
+    
+    Args:
+        listener (Dict): Listener plan entry
+        verify (bool): Whether chain verification is enabled
+    
+    Returns:
+        str: Expected status
+    """
+    if listener['behaviour'] != 'tls':
+        return 'ERROR'
+    days = listener['days']
+    if days < 0:
+        # Verification rejects expired certificates before the expiry is read
+        return 'ERROR' if verify else 'EXPIRED'
+    if days <= 7:
+        return 'CRITICAL'
+    if days <= 30:
+        return 'WARNING'
+    return 'OK'
+
+def git_commit() -> str:
+    """
+    Current git commit, so results can be compared across commits.
+    
+    Returns:
+        str: Commit hash or 'unknown'
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    """
+    Start the farm, scan it once per mode and collect the measurements.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+    
+    Returns:
+        Dict: Machine-readable benchmark report
+    """
+    raise_file_limit()
+    listeners = plan_listeners(args.listeners, args.reset_ratio, args.hang_ratio)
+    context = multiprocessing.get_context('spawn')
+    
+    with tempfile.TemporaryDirectory() as directory:
+        ca_path, leaves = create_certificates(directory)
+        
+        receiver, sender = context.Pipe(duplex=False)
+        farm = context.Process(target=serve_farm, args=(listeners, leaves, args.latency_ms / 1000, sender), daemon=True)
+        farm.start()
+        try:
+            ports = receiver.recv()
+            urls = [f"https://127.0.0.1:{port}" for port in ports]
+            expected = {url: expected_status(listener, args.verify) for url, listener in zip(urls, listeners)}
+            
+            report = {
+                'timestamp': datetime.now().isoformat(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'listeners': args.listeners,
+                'latency_ms': args.latency_ms,
+                'reset_ratio': args.reset_ratio,
+                'hang_ratio': args.hang_ratio,
+                'timeout': args.timeout,
+                'tls_mode': 'verify' if args.verify else 'fetch',
+                'modes': {}
+            }
+            
+            for mode in args.modes:
+                config = {
+                    'websites': urls,
+                    'timeout': args.timeout,
+                    'engine': mode,
+                    'max_workers': args.max_workers,
+                    'max_concurrency': args.max_concurrency,
+                    'tls': {'mode': 'verify', 'ca_file': ca_path} if args.verify else {'mode': 'fetch'},
+                    # Per-probe logging would dominate the measurement
+                    'logging': {'level': 'CRITICAL', 'path': None}
+                }
+                with multiprocessing.get_context('spawn').Pool(1) as pool:
+                    report['modes'][mode] = pool.apply(run_mode, (config, expected))
+                print(f"{mode}: {json.dumps(report['modes'][mode])}")
+        finally:
+            farm.terminate()
+            farm.join()
+    
+    return report
+
+def main():
+    """
+    Parse arguments, run the benchmark and write the report.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the certificate checker against local TLS listeners')
+    parser.add_argument('--listeners', type=int, default=500, help='number of local TLS listeners')
+    parser.add_argument('--modes', nargs='+', default=['threads', 'asyncio'], choices=['threads', 'asyncio'],
+                        help='scan engines to benchmark')
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay injected before each handshake')
+    parser.add_argument('--reset-ratio', type=float, default=0.02, help='fraction of listeners that reset connections')
+    parser.add_argument('--hang-ratio', type=float, default=0.01, help='fraction of listeners that never handshake')
+    parser.add_argument('--timeout', type=float, default=2, help='checker timeout in seconds')
+    parser.add_argument('--max-workers', type=int, default=5, help='thread pool size for the threads engine')
+    parser.add_argument('--max-concurrency', type=int, default=500, help='concurrency for the asyncio engine')
+    parser.add_argument('--verify', action='store_true', help='verify chains against the throwaway CA instead of fetch-only mode')
+    parser.add_argument('--output', default='benchmark_results.json', help='machine-readable report path')
+    args = parser.parse_args()
+    
+    report = run_benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
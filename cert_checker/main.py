@@ -4,505 +4,5092 @@ Certificate Expiry Date Checker Script
 Checks SSL/TLS certificate expiration dates for a list of websites.
 """
 
+import argparse
+import atexit
+import base64
+import bisect
+import calendar
+import collections
+import fnmatch
+import functools
+import hashlib
+import heapq
+import ipaddress
+import itertools
 import json
+import math
 import ssl
 import socket
 import sys
-import requests
 import os
+import queue
+import random
+import re
+import sqlite3
+import struct
+import time
+from array import array
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 import logging
-from typing import List, Dict, Optional, Tuple
-from tabulate import tabulate
+import logging.handlers
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 import concurrent.futures
+import csv
 import threading
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('cert_checker.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+def log_level(value) -> int:
+    """
+    Convert a level name such as 'debug' or a number to a logging level.
+    
+    Args:
+        value: Level name or number
+        
+    Returns:
+        int: Logging level
+        
+    Raises:
+        ValueError: If the name is not a logging level
+    """
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {value}")
+    return level
+
+class HostLogFilter(logging.Filter):
+    """
+    Per-host verbosity and rate limiting of repeated errors.
+    
+    Records logged with extra={'host': hostname} are compared against that
+    host's level from 'hosts', or 'host_level' for all other hosts. With a
+    repeat interval, an error whose message (with the host masked) was
+    already logged within the interval is dropped and counted; the count
+    is appended to the next one that gets through.
+    """
+    
+    def __init__(self, level: int, host_level: int, hosts: Dict[str, int], repeat_interval: float,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the filter.
+        
+        Args:
+            level (int): Minimum level of records without a host
+            host_level (int): Minimum level of records for hosts not in hosts
+            hosts (Dict[str, int]): Minimum level per hostname
+            repeat_interval (float): Seconds within which repeated errors are dropped, 0 to keep all
+            clock (Callable[[], float]): Time source
+        """
+        super().__init__()
+        self.level = level
+        self.host_level = host_level
+        self.hosts = hosts
+        self.repeat_interval = repeat_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Masked message -> [time last emitted, number suppressed since]
+        self._repeats = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        host = getattr(record, 'host', None)
+        threshold = self.level if host is None else self.hosts.get(host, self.host_level)
+        if record.levelno < threshold:
+            return False
+        if record.levelno < logging.ERROR or not self.repeat_interval:
+            return True
+        
+        message = record.getMessage()
+        key = message.replace(host, '*') if host else message
+        now = self.clock()
+        with self._lock:
+            entry = self._repeats.get(key)
+            if entry is not None and now - entry[0] < self.repeat_interval:
+                entry[1] += 1
+                return False
+            suppressed = entry[1] if entry is not None else 0
+            self._repeats[key] = [now, 0]
+            if len(self._repeats) > 1024:
+                self._repeats = {k: v for k, v in self._repeats.items() if now - v[0] < self.repeat_interval}
+        if suppressed:
+            record.msg = f"{message} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+class JSONLogFormatter(logging.Formatter):
+    """
+    One JSON object per log record, for log shippers.
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        host = getattr(record, 'host', None)
+        if host:
+            entry['host'] = host
+        return json.dumps(entry)
+
+class LogPipeline:
+    """
+    Queued logging so that threads never wait on log I/O.
+    
+    The root logger only has a QueueHandler, which filters a record and
+    puts it on an in-memory queue. A QueueListener thread formats queued
+    records and writes them to the log file and stdout.
+    """
+    
+    FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+    
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+    
+    def configure(self, config: Optional[Dict] = None) -> None:
+        """
+        (Re)build the pipeline from the 'logging' configuration section.
+        
+        Args:
+            config (Optional[Dict]): 'level', 'host_level', 'hosts', 'repeat_interval_seconds',
+                'format' ('text' or 'json'), 'path' (None for no log file) and 'stream'
+                ('stdout' or 'stderr')
+        """
+        config = config or {}
+        level = log_level(config.get('level', 'INFO'))
+        host_level = log_level(config.get('host_level', level))
+        hosts = {host: log_level(value) for host, value in config.get('hosts', {}).items()}
+        formatter = JSONLogFormatter() if config.get('format', 'text') == 'json' else logging.Formatter(self.FORMAT)
+        handlers = [logging.StreamHandler(sys.stderr if config.get('stream') == 'stderr' else sys.stdout)]
+        path = config.get('path', 'cert_checker.log')
+        if path:
+            # The file is only created once there is something to write
+            handlers.append(logging.FileHandler(path, delay=True))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        # A fresh queue each time, so a forked worker never shares its parent's
+        handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        handler.addFilter(HostLogFilter(level, host_level, hosts, config.get('repeat_interval_seconds', 0)))
+        listener = logging.handlers.QueueListener(handler.queue, *handlers)
+        
+        self.stop()
+        root = logging.getLogger()
+        root.setLevel(min([level, host_level, *hosts.values()]))
+        root.addHandler(handler)
+        listener.start()
+        self.handler, self.listener = handler, listener
+    
+    def stop(self) -> None:
+        """
+        Detach the queue, write out queued records and close the log file.
+        """
+        if self.handler is None:
+            return
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.handler = self.listener = None
+
+# Configured by CertificateChecker, so importing the module opens no log file
+log_pipeline = LogPipeline()
+atexit.register(log_pipeline.stop)
 logger = logging.getLogger(__name__)
 
-class CertificateChecker:
+def record_phase(timings: Dict[str, float], phase: str, started: float) -> float:
     """
-    A class to check SSL/TLS certificate expiration dates for websites.
+    Store the time elapsed since started under the given phase name.
+    
+    Args:
+        timings (Dict[str, float]): Dictionary to record into
+        phase (str): Phase name such as 'connect' or 'handshake'
+        started (float): time.monotonic() at the start of the phase
+        
+    Returns:
+        float: Current time.monotonic(), the start of the next phase
+    """
+    now = time.monotonic()
+    timings[phase] = round(now - started, 6)
+    return now
+
+# Sort key for results without a known expiry, after any real day count
+UNKNOWN_DAYS = 2 ** 31
+
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+@functools.lru_cache(maxsize=65536)
+def cert_time_to_seconds(value: str) -> int:
+    """
+    Convert a certificate time such as 'Jan 15 23:59:59 2025 GMT' to epoch seconds.
+    
+    The fixed getpeercert() format is split by hand instead of going
+    through strptime; other formats fall back to strptime with %Z.
+    
+    Args:
+        value (str): notBefore or notAfter value from getpeercert()
+        
+    Returns:
+        int: Seconds since the epoch
+        
+    Raises:
+        ValueError: If the value is not a certificate time
+    """
+    try:
+        day, clock, year, zone = value[4:].split()
+        hour, minute, second = clock.split(':')
+        if zone != 'GMT':
+            raise ValueError(zone)
+        return calendar.timegm((int(year), MONTHS[value[:3]], int(day), int(hour), int(minute), int(second)))
+    except (KeyError, ValueError):
+        return int(datetime.strptime(value, '%b %d %H:%M:%S %Y %Z').replace(tzinfo=timezone.utc).timestamp())
+
+@functools.lru_cache(maxsize=65536)
+def result_time_to_seconds(value: str) -> int:
+    """
+    Convert a result time such as '2025-01-15 23:59:59 UTC' to epoch seconds.
+    
+    Expiry dates in results and captured chains all use this fixed format,
+    so it is split by hand like cert_time_to_seconds; anything else falls
+    back to strptime.
+    
+    Args:
+        value (str): 'expiry_date' of a result or 'not_after' of a chain entry
+        
+    Returns:
+        int: Seconds since the epoch
+        
+    Raises:
+        ValueError: If the value is not a result time
+    """
+    try:
+        date, clock, zone = value.split()
+        year, month, day = date.split('-')
+        hour, minute, second = clock.split(':')
+        if zone != 'UTC':
+            raise ValueError(zone)
+        return calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    except ValueError:
+        return int(datetime.strptime(value, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())
+
+class StartTLSError(ConnectionError):
+    """
+    Raised when a server does not agree to upgrade a plaintext connection to TLS.
+    """
+
+def _read_smtp_reply():
+    """
+    Read a possibly multi-line SMTP reply.
+    
+    Returns:
+        int: Reply code
+    """
+    while True:
+        line = yield ('readline',)
+        if len(line) < 4 or not line[:3].isdigit():
+            raise StartTLSError(f"Unexpected SMTP reply: {line[:80]!r}")
+        if line[3:4] != b'-':
+            return int(line[:3])
+
+def smtp_starttls(hostname: str):
+    """
+    STARTTLS dialogue for SMTP (RFC 3207).
+    
+    Args:
+        hostname (str): Server hostname
+    """
+    if (yield from _read_smtp_reply()) != 220:
+        raise StartTLSError("SMTP server did not greet")
+    yield ('send', b'EHLO localhost\r\n')
+    if (yield from _read_smtp_reply()) != 250:
+        raise StartTLSError("SMTP server rejected EHLO")
+    yield ('send', b'STARTTLS\r\n')
+    if (yield from _read_smtp_reply()) != 220:
+        raise StartTLSError("SMTP server refused STARTTLS")
+
+def imap_starttls(hostname: str):
+    """
+    STARTTLS dialogue for IMAP (RFC 2595).
+    
+    Args:
+        hostname (str): Server hostname
+    """
+    greeting = yield ('readline',)
+    if not greeting.startswith(b'* OK'):
+        raise StartTLSError(f"Unexpected IMAP greeting: {greeting[:80]!r}")
+    yield ('send', b'a1 STARTTLS\r\n')
+    while True:
+        line = yield ('readline',)
+        if not line:
+            raise StartTLSError("IMAP server closed the connection")
+        if line.startswith(b'a1 '):
+            if not line.startswith(b'a1 OK'):
+                raise StartTLSError("IMAP server refused STARTTLS")
+            return
+
+def _ber_length(data: bytes, position: int) -> Tuple[int, int]:
+    """
+    Decode a BER length field.
+    
+    Args:
+        data (bytes): Encoded data
+        position (int): Offset of the length field
+        
+    Returns:
+        Tuple[int, int]: Length and offset of the content that follows
+    """
+    length = data[position]
+    if length & 0x80:
+        size = length & 0x7f
+        return int.from_bytes(data[position + 1:position + 1 + size], 'big'), position + 1 + size
+    return length, position + 1
+
+def ldap_starttls(hostname: str):
+    """
+    StartTLS extended operation for LDAP (RFC 4511).
+    
+    Args:
+        hostname (str): Server hostname
+    """
+    oid = b'1.3.6.1.4.1.1466.20037'
+    request = bytes([0x77, len(oid) + 2, 0x80, len(oid)]) + oid
+    message_id = bytes([0x02, 0x01, 0x01])
+    yield ('send', bytes([0x30, len(message_id) + len(request)]) + message_id + request)
+    
+    # LDAPMessage: SEQUENCE { messageID, extendedResp [APPLICATION 24] { resultCode, ... } }
+    header = yield ('read', 2)
+    if header[0] != 0x30:
+        raise StartTLSError("Unexpected LDAP response")
+    if header[1] & 0x80:
+        length = int.from_bytes((yield ('read', header[1] & 0x7f)), 'big')
+    else:
+        length = header[1]
+    message = yield ('read', length)
+    try:
+        if message[0] != 0x02:
+            raise StartTLSError("Unexpected LDAP response")
+        id_length, position = _ber_length(message, 1)
+        position += id_length
+        if message[position] != 0x78:
+            raise StartTLSError("Unexpected LDAP response")
+        _, position = _ber_length(message, position + 1)
+        if message[position] != 0x0a:
+            raise StartTLSError("Unexpected LDAP response")
+        result_code = message[position + 2]
+    except IndexError:
+        raise StartTLSError("Truncated LDAP response")
+    if result_code != 0:
+        raise StartTLSError(f"LDAP server refused StartTLS (result code {result_code})")
+
+def postgres_starttls(hostname: str):
+    """
+    SSLRequest negotiation for PostgreSQL.
+    
+    Args:
+        hostname (str): Server hostname
+    """
+    yield ('send', struct.pack('!II', 8, 80877103))
+    if (yield ('read', 1)) != b'S':
+        raise StartTLSError("PostgreSQL server does not accept SSL")
+
+# URL schemes that upgrade a plaintext connection before the TLS handshake.
+# Each dialogue is a generator yielding ('send', data), ('readline',) or
+# ('read', size) steps and receiving what was read.
+STARTTLS_PROTOCOLS = {
+    'smtp': smtp_starttls,
+    'imap': imap_starttls,
+    'ldap': ldap_starttls,
+    'postgres': postgres_starttls,
+    'postgresql': postgres_starttls
+}
+
+DEFAULT_PORTS = {
+    'https': 443,
+    'smtp': 25,
+    'smtps': 465,
+    'imap': 143,
+    'imaps': 993,
+    'ldap': 389,
+    'ldaps': 636,
+    'postgres': 5432,
+    'postgresql': 5432
+}
+
+def run_starttls(sock: socket.socket, dialogue) -> None:
+    """
+    Drive a STARTTLS dialogue over a blocking socket.
+    
+    Args:
+        sock (socket.socket): Connected socket with a timeout set
+        dialogue: Generator from STARTTLS_PROTOCOLS
+    """
+    stream = sock.makefile('rb')
+    try:
+        reply = None
+        while True:
+            try:
+                step = dialogue.send(reply)
+            except StopIteration:
+                return
+            if step[0] == 'send':
+                sock.sendall(step[1])
+                reply = None
+            elif step[0] == 'readline':
+                reply = stream.readline(4096)
+            else:
+                reply = stream.read(step[1])
+                if len(reply) < step[1]:
+                    raise StartTLSError("Connection closed during STARTTLS")
+    finally:
+        stream.close()
+
+async def run_starttls_async(reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter', dialogue) -> None:
+    """
+    Drive a STARTTLS dialogue over asyncio streams.
+    
+    Args:
+        reader (asyncio.StreamReader): Connection reader
+        writer (asyncio.StreamWriter): Connection writer
+        dialogue: Generator from STARTTLS_PROTOCOLS
+    """
+    import asyncio
+    
+    reply = None
+    while True:
+        try:
+            step = dialogue.send(reply)
+        except StopIteration:
+            return
+        if step[0] == 'send':
+            writer.write(step[1])
+            await writer.drain()
+            reply = None
+        elif step[0] == 'readline':
+            reply = await reader.readline()
+        else:
+            try:
+                reply = await reader.readexactly(step[1])
+            except asyncio.IncompleteReadError:
+                raise StartTLSError("Connection closed during STARTTLS")
+
+class SSLContextManager:
+    """
+    Builds the shared SSL context used by every certificate probe.
+    
+    Creating a context loads the system CA bundle, so it is done once per
+    checker and reused by all threads and coroutines.
+    """
+    
+    TLS_VERSIONS = {
+        'TLSv1': ssl.TLSVersion.TLSv1,
+        'TLSv1.1': ssl.TLSVersion.TLSv1_1,
+        'TLSv1.2': ssl.TLSVersion.TLSv1_2,
+        'TLSv1.3': ssl.TLSVersion.TLSv1_3
+    }
+    
+    def __init__(self, tls_config: Optional[Dict] = None):
+        """
+        Initialize the context manager with TLS settings.
+        
+        Args:
+            tls_config (Optional[Dict]): The 'tls' section of the configuration
+            
+        Raises:
+            ValueError: If the mode or a TLS version is not recognised
+        """
+        tls_config = tls_config or {}
+        self.mode = tls_config.get('mode', 'verify')
+        if self.mode not in ('verify', 'fetch'):
+            raise ValueError(f"Unknown TLS mode: {self.mode}")
+        self.minimum_version = self._lookup_version(tls_config.get('minimum_version'))
+        self.maximum_version = self._lookup_version(tls_config.get('maximum_version'))
+        self.session_tickets = tls_config.get('session_tickets', False)
+        self.ca_file = tls_config.get('ca_file')
+        self.chain = tls_config.get('chain', False)
+        self._context = None
+        self._lock = threading.Lock()
+    
+    def _lookup_version(self, name: Optional[str]) -> Optional[ssl.TLSVersion]:
+        """
+        Translate a configured TLS version name to an ssl.TLSVersion.
+        
+        Args:
+            name (Optional[str]): Version name such as 'TLSv1.2'
+            
+        Returns:
+            Optional[ssl.TLSVersion]: Matching version or None if not configured
+        """
+        if name is None:
+            return None
+        if name not in self.TLS_VERSIONS:
+            raise ValueError(f"Unknown TLS version: {name}")
+        return self.TLS_VERSIONS[name]
+    
+    @property
+    def fetch_only(self) -> bool:
+        """
+        Whether certificates are fetched without chain verification.
+        """
+        return self.mode == 'fetch'
+    
+    def get_context(self) -> ssl.SSLContext:
+        """
+        Return the shared SSL context, creating it on first use.
+        
+        Returns:
+            ssl.SSLContext: Configured client context
+        """
+        if self._context is None:
+            with self._lock:
+                if self._context is None:
+                    self._context = self._create_context()
+        return self._context
+    
+    def _create_context(self) -> ssl.SSLContext:
+        """
+        Create a client SSL context from the configured settings.
+        
+        Returns:
+            ssl.SSLContext: Configured client context
+        """
+        context = ssl.create_default_context(cafile=self.ca_file)
+        
+        if self.fetch_only:
+            # Accept expired, self-signed and mismatched certificates so they still report an expiry date
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        
+        if self.minimum_version is not None:
+            context.minimum_version = self.minimum_version
+        if self.maximum_version is not None:
+            context.maximum_version = self.maximum_version
+        
+        if not self.session_tickets:
+            # Sessions are never resumed, so tickets are only wasted bytes
+            context.options |= ssl.OP_NO_TICKET
+        
+        logger.info(f"SSL context created (mode: {self.mode})")
+        return context
+    
+    def read_certificate(self, ssl_object) -> Dict:
+        """
+        Read the peer certificate from an established TLS connection.
+        
+        In verify mode this is the dictionary returned by getpeercert(). In
+        fetch mode the validated dictionary is empty, so the binary DER
+        certificate is decoded into the same shape instead. Both include a
+        SHA-256 'fingerprint' of the DER certificate. With 'chain' enabled,
+        'chain' lists the metadata of every presented certificate, leaf first.
+        
+        Args:
+            ssl_object: An ssl.SSLSocket or ssl.SSLObject after the handshake
+            
+        Returns:
+            Dict: Certificate information in getpeercert() format
+        """
+        der = ssl_object.getpeercert(True)
+        if self.fetch_only:
+            cert_info = decode_der_certificate(der)
+        else:
+            cert_info = ssl_object.getpeercert()
+        if der is not None:
+            cert_info['fingerprint'] = hashlib.sha256(der).hexdigest()
+            if self.chain:
+                cert_info['chain'] = [describe_certificate(certificate) for certificate in self.read_chain(ssl_object) or [der]]
+        return cert_info
+    
+    def read_chain(self, ssl_object) -> List[bytes]:
+        """
+        Read the certificate chain presented by the server.
+        
+        Args:
+            ssl_object: An ssl.SSLSocket or ssl.SSLObject after the handshake
+            
+        Returns:
+            List[bytes]: DER certificates in the order sent, leaf first; empty if
+                this Python version cannot expose the chain
+        """
+        if hasattr(ssl_object, 'get_unverified_chain'):
+            # Public API from Python 3.13
+            return list(ssl_object.get_unverified_chain() or [])
+        sslobj = getattr(ssl_object, '_sslobj', None)
+        if sslobj is None or not hasattr(sslobj, 'get_unverified_chain'):
+            return []
+        return [certificate.public_bytes(ssl._ssl.ENCODING_DER) for certificate in sslobj.get_unverified_chain() or []]
+
+def _format_name(name) -> Tuple:
+    """
+    Convert a cryptography Name into the nested tuple format used by getpeercert().
+    
+    Args:
+        name: cryptography.x509.Name instance
+        
+    Returns:
+        Tuple: Relative distinguished names as ((attribute, value),) tuples
+    """
+    return tuple(
+        tuple((attribute.oid._name, attribute.value) for attribute in rdn)
+        for rdn in name.rdns
+    )
+
+def decode_der_certificate(der: bytes) -> Dict:
+    """
+    Decode a DER certificate into the dictionary format returned by getpeercert().
+    
+    Args:
+        der (bytes): Certificate in binary DER form
+        
+    Returns:
+        Dict: Certificate information with subject, issuer, serialNumber,
+              notBefore, notAfter and subjectAltName keys
+    """
+    from cryptography import x509
+    
+    certificate = x509.load_der_x509_certificate(der)
+    cert_info = {
+        'subject': _format_name(certificate.subject),
+        'issuer': _format_name(certificate.issuer),
+        'serialNumber': format(certificate.serial_number, 'X'),
+        'notBefore': certificate.not_valid_before_utc.strftime('%b %d %H:%M:%S %Y GMT'),
+        'notAfter': certificate.not_valid_after_utc.strftime('%b %d %H:%M:%S %Y GMT')
+    }
+    
+    try:
+        san = certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        cert_info['subjectAltName'] = tuple(('DNS', name) for name in san.get_values_for_type(x509.DNSName))
+    except x509.ExtensionNotFound:
+        pass
+    
+    return cert_info
+
+@functools.lru_cache(maxsize=4096)
+def _describe_certificate(der: bytes) -> Dict:
+    """
+    Parse the audit metadata of a DER certificate, memoized per certificate.
+    
+    Intermediates are shared by many hosts, so most chains only parse their leaf.
+    
+    Args:
+        der (bytes): Certificate in binary DER form
+        
+    Returns:
+        Dict: Certificate metadata, see describe_certificate
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+    from cryptography.x509.oid import AuthorityInformationAccessOID
+    
+    certificate = x509.load_der_x509_certificate(der)
+    public_key = certificate.public_key()
+    if isinstance(public_key, rsa.RSAPublicKey):
+        key_type, key_size = 'RSA', public_key.key_size
+    elif isinstance(public_key, ec.EllipticCurvePublicKey):
+        key_type, key_size = 'EC', public_key.curve.key_size
+    elif isinstance(public_key, dsa.DSAPublicKey):
+        key_type, key_size = 'DSA', public_key.key_size
+    elif isinstance(public_key, ed25519.Ed25519PublicKey):
+        key_type, key_size = 'Ed25519', 256
+    elif isinstance(public_key, ed448.Ed448PublicKey):
+        key_type, key_size = 'Ed448', 456
+    else:
+        key_type, key_size = type(public_key).__name__, None
+    
+    metadata = {
+        'subject': certificate.subject.rfc4514_string(),
+        'issuer': certificate.issuer.rfc4514_string(),
+        'serial_number': format(certificate.serial_number, 'X'),
+        'fingerprint': hashlib.sha256(der).hexdigest(),
+        'key_type': key_type,
+        'key_size': key_size,
+        'not_before': certificate.not_valid_before_utc.strftime('%Y-%m-%d %H:%M:%S UTC'),
+        'not_after': certificate.not_valid_after_utc.strftime('%Y-%m-%d %H:%M:%S UTC'),
+        'subject_alt_names': [],
+        'ocsp_urls': []
+    }
+    
+    try:
+        san = certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        metadata['subject_alt_names'] = san.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        pass
+    try:
+        access = certificate.extensions.get_extension_for_class(x509.AuthorityInformationAccess).value
+        metadata['ocsp_urls'] = [
+            description.access_location.value for description in access
+            if description.access_method == AuthorityInformationAccessOID.OCSP
+        ]
+    except x509.ExtensionNotFound:
+        pass
+    
+    return metadata
+
+def describe_certificate(der: bytes) -> Dict:
+    """
+    Extract audit metadata from a DER certificate.
+    
+    Args:
+        der (bytes): Certificate in binary DER form
+        
+    Returns:
+        Dict: subject, issuer, serial_number, fingerprint, key_type, key_size,
+              not_before, not_after, subject_alt_names and ocsp_urls
+    """
+    return dict(_describe_certificate(der))
+
+def certificate_covers(cert_info: Dict, hostname: str) -> bool:
+    """
+    Check whether a certificate's DNS SANs cover a hostname.
+    
+    A wildcard matches exactly one left-most label, as in RFC 6125.
+    
+    Args:
+        cert_info (Dict): Certificate information in getpeercert() format
+        hostname (str): Hostname to look for
+        
+    Returns:
+        bool: True if a SAN entry matches the hostname
+    """
+    hostname = hostname.lower().rstrip('.')
+    parent = hostname.split('.', 1)[1] if '.' in hostname else None
+    for kind, name in cert_info.get('subjectAltName', ()):
+        if kind != 'DNS':
+            continue
+        name = name.lower().rstrip('.')
+        if name == hostname or (name.startswith('*.') and name[2:] == parent):
+            return True
+    return False
+
+PEM_CERTIFICATE = re.compile(rb'-----BEGIN CERTIFICATE-----(.*?)-----END CERTIFICATE-----', re.S)
+
+def read_certificate_file(path: str) -> Dict:
+    """
+    Parse every certificate in a PEM bundle or a DER file.
+    
+    Runs in worker processes, so it only returns plain data. Other PEM
+    blocks such as private keys are ignored.
+    
+    Args:
+        path (str): Certificate file
+        
+    Returns:
+        Dict: 'certificates', a list of dictionaries with hostname (first DNS
+              name, else the subject), not_after and fingerprint, and 'error',
+              set if the file could not be read or parsed
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if b'-----BEGIN' in data:
+            ders = [base64.b64decode(b''.join(block.split())) for block in PEM_CERTIFICATE.findall(data)]
+        else:
+            ders = [data]
+        certificates = []
+        for der in ders:
+            metadata = _describe_certificate(der)
+            certificates.append({
+                'hostname': (metadata['subject_alt_names'] or [metadata['subject']])[0],
+                'not_after': metadata['not_after'],
+                'fingerprint': metadata['fingerprint']
+            })
+        return {'certificates': certificates, 'error': None}
+    except (OSError, ValueError) as e:
+        return {'certificates': [], 'error': f"Failed to parse certificate file: {e}"}
+
+def find_certificate_files(paths: List[str], patterns: List[str]) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Walk directories for certificate files.
+    
+    Symlinked directories are not followed, but symlinked files are, and
+    a file reached through several links is reported once. That covers
+    Kubernetes secret volumes, whose files are links into a hidden directory.
+    
+    Args:
+        paths (List[str]): Files and directories to scan
+        patterns (List[str]): Filename patterns such as '*.pem'
+        
+    Yields:
+        Tuple[str, os.stat_result]: Absolute path and stat of each matching file
+    """
+    matches = re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns)).match
+    seen = set()
+    pending = [os.path.abspath(path) for path in paths]
+    while pending:
+        path = pending.pop()
+        try:
+            if os.path.isfile(path):
+                entries = [(path, os.stat(path))]
+            else:
+                entries = []
+                with os.scandir(path) as directory:
+                    for entry in directory:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif matches(entry.name) and entry.is_file():
+                            entries.append((entry.path, entry.stat()))
+        except OSError as e:
+            logger.warning(f"Cannot scan {path}: {e}")
+            continue
+        for file_path, stat in entries:
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                yield file_path, stat
+
+def open_database(path: str, busy_timeout: float = 30.0) -> sqlite3.Connection:
+    """
+    Open a SQLite database that several processes can write to at once.
+    
+    Shard worker processes share the cache and history files. In WAL mode
+    readers never block the writer, and the busy timeout makes a writer wait
+    for another process's short transaction instead of failing with
+    'database is locked'.
+    
+    Args:
+        path (str): Path to the SQLite database file
+        busy_timeout (float): Seconds to wait for another writer's lock
+        
+    Returns:
+        sqlite3.Connection: Connection usable from any thread
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class ResultCache:
+    """
+    On-disk cache of the last observed certificate per hostname:port.
+    
+    Entries are stored in SQLite so they survive between cron runs. Every
+    write is committed in its own short transaction, so shard processes
+    sharing the file never hold the write lock across a probe.
+    """
+    
+    def __init__(self, path: str = 'cert_cache.db'):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS certificates ('
+            'target TEXT PRIMARY KEY, '
+            'not_after INTEGER NOT NULL, '
+            'fingerprint TEXT, '
+            'checked_at INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+    
+    def get(self, target: str) -> Optional[Dict]:
+        """
+        Look up the cached certificate for a target.
+        
+        Args:
+            target (str): Cache key in hostname:port form
+            
+        Returns:
+            Optional[Dict]: Entry with not_after, fingerprint and checked_at (epoch seconds) or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT not_after, fingerprint, checked_at FROM certificates WHERE target = ?',
+                (target,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'not_after': row[0], 'fingerprint': row[1], 'checked_at': row[2]}
+    
+    def put(self, target: str, not_after: int, fingerprint: Optional[str], checked_at: int) -> None:
+        """
+        Store the latest observation for a target.
+        
+        Args:
+            target (str): Cache key in hostname:port form
+            not_after (int): Certificate expiry as epoch seconds
+            fingerprint (Optional[str]): SHA-256 fingerprint of the certificate
+            checked_at (int): Time of the check as epoch seconds
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO certificates (target, not_after, fingerprint, checked_at) VALUES (?, ?, ?, ?)',
+                (target, not_after, fingerprint, checked_at)
+            )
+            self._conn.commit()
+    
+    def commit(self) -> None:
+        """
+        Persist pending writes to disk.
+        """
+        with self._lock:
+            self._conn.commit()
+    
+    def close(self) -> None:
+        """
+        Commit pending writes and close the database.
+        """
+        self.commit()
+        self._conn.close()
+
+class HistoryStore:
     """
+    Append-only SQLite history of every certificate check result.
+    
+    'observations' keeps one row per result of every run, indexed by
+    hostname, fingerprint, status and expiry time. 'latest' keeps the most
+    recent row per URL and address, so questions about the current state
+    of the whole estate are answered from an index without scanning history.
+    Each result is committed on its own, so shard processes writing to the
+    same file only ever wait for one short transaction.
+    """
+    
+    COLUMNS = ('observed_at', 'url', 'hostname', 'address', 'status', 'not_after',
+               'expiry_date', 'days_until_expiry', 'fingerprint', 'error')
+    
+    def __init__(self, path: str = 'cert_history.db'):
+        """
+        Open (or create) the history database.
+        
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        self._conn.row_factory = sqlite3.Row
+        columns = (
+            'observed_at REAL NOT NULL, url TEXT NOT NULL, hostname TEXT, address TEXT NOT NULL, '
+            'status TEXT NOT NULL, not_after INTEGER, expiry_date TEXT, days_until_expiry INTEGER, '
+            'fingerprint TEXT, error TEXT'
+        )
+        self._conn.executescript(
+            f'CREATE TABLE IF NOT EXISTS observations ({columns});'
+            f'CREATE TABLE IF NOT EXISTS latest ({columns}, PRIMARY KEY (url, address));'
+            'CREATE INDEX IF NOT EXISTS observations_hostname ON observations (hostname, observed_at);'
+            'CREATE INDEX IF NOT EXISTS observations_fingerprint ON observations (fingerprint);'
+            'CREATE INDEX IF NOT EXISTS observations_not_after ON observations (not_after);'
+            'CREATE INDEX IF NOT EXISTS observations_status ON observations (status, observed_at);'
+            'CREATE INDEX IF NOT EXISTS latest_not_after ON latest (not_after);'
+            'CREATE INDEX IF NOT EXISTS latest_status ON latest (status, not_after);'
+        )
+        self._conn.commit()
+    
+    def record(self, result: Dict, observed_at: float) -> None:
+        """
+        Append a result and make it the latest for its URL and address.
+        
+        Args:
+            result (Dict): Certificate check result
+            observed_at (float): Epoch seconds of the run that produced it
+        """
+        days = result['days_until_expiry']
+        row = (
+            observed_at, result['url'], result['hostname'], result.get('address') or '', result['status'],
+            ResultStore.expiry_seconds(result['expiry_date']), result['expiry_date'],
+            days if type(days) is int else None, result.get('fingerprint'), result['error']
+        )
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        with self._lock:
+            self._conn.execute(f'INSERT INTO observations VALUES ({placeholders})', row)
+            self._conn.execute(f'INSERT OR REPLACE INTO latest VALUES ({placeholders})', row)
+            self._conn.commit()
+    
+    def commit(self) -> None:
+        """
+        Persist pending writes to disk.
+        """
+        with self._lock:
+            self._conn.commit()
+    
+    def close(self) -> None:
+        """
+        Commit pending writes and close the database.
+        """
+        self.commit()
+        self._conn.close()
+    
+    def _query(self, sql: str, parameters: Tuple) -> List[Dict]:
+        """
+        Run a read query.
+        
+        Args:
+            sql (str): SELECT statement
+            parameters (Tuple): Bound parameters
+            
+        Returns:
+            List[Dict]: Rows as dictionaries
+        """
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, parameters)]
+    
+    def expiring(self, before: float, statuses: Optional[List[str]] = None, limit: int = 100) -> List[Dict]:
+        """
+        Latest results whose certificate expires before a point in time.
+        
+        Args:
+            before (float): Epoch seconds
+            statuses (Optional[List[str]]): Only these statuses, all if None
+            limit (int): Maximum number of rows
+            
+        Returns:
+            List[Dict]: Matching results, soonest expiry first
+        """
+        sql = 'SELECT * FROM latest WHERE not_after <= ?'
+        parameters = [before]
+        if statuses:
+            sql += f" AND status IN ({', '.join('?' * len(statuses))})"
+            parameters.extend(statuses)
+        return self._query(sql + ' ORDER BY not_after LIMIT ?', tuple(parameters) + (limit,))
+    
+    def most_urgent(self, limit: int = 20, statuses: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Latest results ordered by expiry, failed checks last.
+        
+        Args:
+            limit (int): Maximum number of rows
+            statuses (Optional[List[str]]): Only these statuses, all if None
+            
+        Returns:
+            List[Dict]: The most urgent results
+        """
+        sql = 'SELECT * FROM latest'
+        parameters = []
+        if statuses:
+            sql += f" WHERE status IN ({', '.join('?' * len(statuses))})"
+            parameters.extend(statuses)
+        return self._query(sql + ' ORDER BY not_after IS NULL, not_after LIMIT ?', tuple(parameters) + (limit,))
+    
+    def rotations(self, hostname: str, since: float = 0) -> List[Dict]:
+        """
+        Certificates a hostname has served, one row per fingerprint.
+        
+        Args:
+            hostname (str): Hostname to look up
+            since (float): Only observations after these epoch seconds
+            
+        Returns:
+            List[Dict]: fingerprint, first_seen, last_seen, expiry_date and observations,
+                oldest certificate first
+        """
+        return self._query(
+            'SELECT fingerprint, MIN(observed_at) AS first_seen, MAX(observed_at) AS last_seen, '
+            'MAX(expiry_date) AS expiry_date, COUNT(*) AS observations FROM observations '
+            'WHERE hostname = ? AND observed_at >= ? AND fingerprint IS NOT NULL '
+            'GROUP BY fingerprint ORDER BY first_seen',
+            (hostname, since)
+        )
+
+class CertificateFileIndex:
+    """
+    SQLite index of scanned certificate files by path, mtime and size.
+    
+    The parsed certificates of each file are stored with its mtime and
+    size, so a later scan only reads files that changed.
+    """
+    
+    def __init__(self, path: str = 'cert_file_index.db'):
+        """
+        Open (or create) the index database.
+        
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._conn = open_database(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, '
+            'mtime_ns INTEGER NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'parsed TEXT NOT NULL)'
+        )
+        self._conn.commit()
+    
+    def load(self) -> Dict[str, Tuple[int, int, str]]:
+        """
+        Read the whole index.
+        
+        Returns:
+            Dict[str, Tuple[int, int, str]]: mtime_ns, size and the read_certificate_file
+                result as JSON, by path
+        """
+        rows = self._conn.execute('SELECT path, mtime_ns, size, parsed FROM files')
+        return {row[0]: row[1:] for row in rows}
+    
+    def put(self, path: str, mtime_ns: int, size: int, parsed: Dict) -> None:
+        """
+        Store the parsed certificates of a file.
+        
+        Args:
+            path (str): Certificate file
+            mtime_ns (int): Modification time the file was parsed at
+            size (int): Size the file was parsed at
+            parsed (Dict): read_certificate_file result
+        """
+        self._conn.execute(
+            'INSERT OR REPLACE INTO files (path, mtime_ns, size, parsed) VALUES (?, ?, ?, ?)',
+            (path, mtime_ns, size, json.dumps(parsed))
+        )
+    
+    def remove(self, paths: Iterable[str]) -> None:
+        """
+        Forget files that no longer exist.
+        
+        Args:
+            paths (Iterable[str]): Certificate files
+        """
+        self._conn.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in paths))
+    
+    def close(self) -> None:
+        """
+        Commit pending writes and close the database.
+        """
+        self._conn.commit()
+        self._conn.close()
+
+class ScanCheckpoint:
+    """
+    Append-only journal of completed results for resuming an interrupted scan.
+    
+    Each result is written as one JSON line as soon as it completes and
+    flushed, so a killed process loses at most the probes in flight. The
+    first line records when the scan started; a journal older than the
+    scan window is discarded instead of resumed. The journal is deleted
+    once the scan completes.
+    """
+    
+    def __init__(self, path: str, window_seconds: float, clock: Callable[[], float] = time.time):
+        """
+        Initialize the checkpoint.
+        
+        Args:
+            path (str): Path of the JSON Lines journal
+            window_seconds (float): Maximum age of a journal that may be resumed
+            clock (Callable[[], float]): Returns the current time as epoch seconds
+        """
+        self.path = path
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._file = None
+    
+    def _load(self) -> Optional[List[Dict]]:
+        """
+        Read the results of an existing journal that is still within the window.
+        
+        Returns:
+            Optional[List[Dict]]: Journaled results, or None if there is nothing to resume
+        """
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        
+        try:
+            header = json.loads(lines[0])
+            started_at = header['started_at']
+        except (IndexError, json.JSONDecodeError, KeyError, TypeError):
+            logger.error(f"Ignoring invalid checkpoint journal {self.path}")
+            return None
+        if self.clock() - started_at > self.window_seconds:
+            logger.info(f"Checkpoint journal {self.path} is outside the scan window, starting over")
+            return None
+        
+        results = []
+        for line in lines[1:]:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                # The last line may be cut short if the process was killed mid-write
+                continue
+        return results
+    
+    def open(self) -> List[Dict]:
+        """
+        Resume or start the journal.
+        
+        Returns:
+            List[Dict]: Results completed by the interrupted scan, empty when starting over
+        """
+        resumed = self._load()
+        if resumed is None:
+            self._file = open(self.path, 'w')
+            self._file.write(json.dumps({'started_at': self.clock()}) + '\n')
+            self._file.flush()
+            return []
+        
+        self._file = open(self.path, 'a')
+        logger.info(f"Resuming scan from {self.path} with {len(resumed)} completed results")
+        return resumed
+    
+    def record(self, result: Dict) -> None:
+        """
+        Append a completed result.
+        
+        Args:
+            result (Dict): Certificate check result
+        """
+        self._file.write(json.dumps(result, default=str) + '\n')
+        self._file.flush()
+    
+    def close(self) -> None:
+        """
+        Close the journal, keeping it for a later resume.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def finish(self) -> None:
+        """
+        Close and delete the journal after the scan completed.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class DNSResolver:
+    """
+    Resolves hostnames concurrently ahead of the TLS probes and caches the answers.
+    
+    The system resolver does not expose record TTLs, so answers are kept for
+    a configured number of seconds.
+    """
+    
+    def __init__(self, ttl: int = 300, concurrency: int = 100):
+        """
+        Initialize the resolver.
+        
+        Args:
+            ttl (int): Seconds to keep a resolved answer
+            concurrency (int): Maximum number of lookups in flight
+        """
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._cache = {}
+        # Seconds spent on the most recent lookup per hostname, 0.0 for cache hits
+        self.durations = {}
+        # Error of the most recent lookup per hostname that failed
+        self.errors = {}
+    
+    async def _resolve(self, hostname: str, port: int) -> List[str]:
+        """
+        Resolve one hostname to its A/AAAA addresses, using the cache if possible.
+        
+        Args:
+            hostname (str): Hostname to resolve
+            port (int): Port passed to getaddrinfo
+            
+        Returns:
+            List[str]: Unique addresses in resolver order, empty if resolution failed
+        """
+        import asyncio
+        
+        cached = self._cache.get(hostname)
+        if cached is not None and cached[0] > time.monotonic():
+            self.durations[hostname] = 0.0
+            return cached[1]
+        
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            infos = await loop.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError) as e:
+            logger.error(f"DNS resolution failed for {hostname}: {e}", extra={'host': hostname})
+            self.errors[hostname] = str(e)
+            return []
+        finally:
+            record_phase(self.durations, hostname, started)
+        
+        self.errors.pop(hostname, None)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[hostname] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+    
+    async def resolve_all(self, hosts: List[Tuple[str, int]]) -> Dict[str, List[str]]:
+        """
+        Resolve many hostnames concurrently, looking each one up only once.
+        
+        Args:
+            hosts (List[Tuple[str, int]]): Hostname and port pairs
+            
+        Returns:
+            Dict[str, List[str]]: Addresses per hostname
+        """
+        import asyncio
+        
+        unique = dict(hosts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def bounded(hostname, port):
+            async with semaphore:
+                return hostname, await self._resolve(hostname, port)
+        
+        answers = await asyncio.gather(*(bounded(h, p) for h, p in unique.items()))
+        return dict(answers)
+    
+    def addresses(self, hostname: str) -> List[str]:
+        """
+        Addresses from the last successful lookup of a hostname.
+        
+        Args:
+            hostname (str): Hostname that was resolved
+            
+        Returns:
+            List[str]: Cached addresses, empty if the hostname was never resolved
+        """
+        cached = self._cache.get(hostname)
+        return cached[1] if cached is not None else []
+
+class AdaptiveScheduler:
+    """
+    AIMD concurrency control with per-backend connection caps for the asyncio engine.
+    
+    The global limit grows by roughly one slot per window of fast, successful
+    handshakes and is cut multiplicatively when probes fail or exceed the
+    target latency. Probes are grouped by backend (the resolved address,
+    widened to a network prefix so a CDN edge block counts as one backend)
+    and each backend gets a connection cap and a minimum spacing between
+    connection starts.
+    """
+    
+    def __init__(self, scheduler_config: Dict, max_concurrency: int):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            scheduler_config (Dict): The 'scheduler' section of the configuration
+            max_concurrency (int): Upper bound for the global limit
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = scheduler_config.get('min_concurrency', 1)
+        self.limit = float(min(scheduler_config.get('initial_concurrency', 20), max_concurrency))
+        self.target_latency = scheduler_config.get('target_latency', 2.0)
+        self.decrease_factor = scheduler_config.get('decrease_factor', 0.5)
+        self.max_per_backend = scheduler_config.get('max_per_backend', 4)
+        self.min_interval = scheduler_config.get('min_interval', 0.0)
+        self.ipv4_prefix = scheduler_config.get('ipv4_prefix', 24)
+        self.ipv6_prefix = scheduler_config.get('ipv6_prefix', 48)
+        self.active = 0
+        self._backend_active = {}
+        self._backend_next_start = {}
+        self._last_decrease = 0.0
+        self._condition = None
+        self._wakeup = None
+    
+    def backend_key(self, host: str) -> str:
+        """
+        Group a hostname or IP address into the backend it is rate limited under.
+        
+        Args:
+            host (str): Resolved IP address, or hostname if not resolved
+            
+        Returns:
+            str: Network prefix for IP addresses, otherwise the hostname
+        """
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return host
+        prefix = self.ipv4_prefix if address.version == 4 else self.ipv6_prefix
+        return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+    
+    def interleave(self, probes: List[Tuple[str, Optional[str]]], key_for: Callable[[str, Optional[str]], str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        Order probes round-robin across backends so no backend is hit in a burst.
+        
+        Args:
+            probes (List[Tuple[str, Optional[str]]]): URL and optional address pairs
+            key_for (Callable[[str, Optional[str]], str]): Returns the backend key of a probe
+            
+        Returns:
+            List[Tuple[str, Optional[str]]]: The same probes, interleaved by backend
+        """
+        groups = {}
+        for probe in probes:
+            groups.setdefault(key_for(*probe), []).append(probe)
+        rounds = itertools.zip_longest(*groups.values())
+        return [probe for round_ in rounds for probe in round_ if probe is not None]
+    
+    def start_run(self) -> None:
+        """
+        Reset per-run state inside a new event loop, keeping the learned limit.
+        """
+        import asyncio
+        
+        self.active = 0
+        self._backend_active = {}
+        self._backend_next_start = {}
+        self._condition = asyncio.Condition()
+    
+    async def acquire(self, key: str) -> None:
+        """
+        Wait for a global slot and a slot on the given backend.
+        
+        Args:
+            key (str): Backend key from backend_key
+        """
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.active < max(int(self.limit), 1) and self._backend_active.get(key, 0) < self.max_per_backend
+            )
+            self.active += 1
+            self._backend_active[key] = self._backend_active.get(key, 0) + 1
+            now = loop.time()
+            start = max(now, self._backend_next_start.get(key, now))
+            self._backend_next_start[key] = start + self.min_interval
+        
+        # Space out connection starts to the same backend
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except asyncio.CancelledError:
+                # A hedge loser or the deadline cancelled the probe before the
+                # caller could release; this task cannot wait for the lock
+                # again, so waiters are woken from a separate one
+                self._free_slots(key)
+                self._wakeup = loop.create_task(self._notify())
+                raise
+    
+    def _free_slots(self, key: str) -> None:
+        """
+        Return the global slot and the backend slot taken by acquire.
+        
+        Args:
+            key (str): Backend key from backend_key
+        """
+        self.active -= 1
+        self._backend_active[key] -= 1
+        if not self._backend_active[key]:
+            del self._backend_active[key]
+    
+    async def _notify(self) -> None:
+        """
+        Wake the probes waiting in acquire.
+        """
+        async with self._condition:
+            self._condition.notify_all()
+    
+    async def release(self, key: str, latency: float, success: bool) -> None:
+        """
+        Return the slots taken by acquire and adapt the global limit.
+        
+        Args:
+            key (str): Backend key from backend_key
+            latency (float): Seconds the probe took
+            success (bool): Whether a certificate was retrieved
+        """
+        async with self._condition:
+            self._free_slots(key)
+            self._adjust(latency, success)
+            self._condition.notify_all()
+    
+    def _adjust(self, latency: float, success: bool) -> None:
+        """
+        Apply one AIMD step to the global limit.
+        
+        Args:
+            latency (float): Seconds the probe took
+            success (bool): Whether a certificate was retrieved
+        """
+        if success and latency <= self.target_latency:
+            # Additive increase: about one extra slot per full window of good probes
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            return
+        
+        # Multiplicative decrease, at most once per target latency so one burst of failures counts once
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+            self._last_decrease = now
+            logger.info(f"Reducing scan concurrency to {int(self.limit)}")
+
+class ProbeBudget:
+    """
+    Run-wide deadline, retry policy and hedging threshold for one scan.
+    
+    Probes still unfinished when the deadline passes are reported as timed
+    out. A failed probe is retried after a jittered exponential backoff
+    while the budget allows it. Once enough handshakes have completed, a
+    probe that runs longer than their 95th percentile is hedged with a
+    second attempt.
+    """
+    
+    def __init__(self, seconds: float, retries: int = 2, backoff: float = 1.0, hedge: bool = True,
+                 min_samples: int = 20, clock: Callable[[], float] = time.monotonic):
+        """
+        Start the budget.
+        
+        Args:
+            seconds (float): Wall-clock budget of the whole scan
+            retries (int): Retries per failed probe
+            backoff (float): Base backoff in seconds, doubled per retry
+            hedge (bool): Hedge probes slower than the observed 95th percentile
+            min_samples (int): Completed probes needed before hedging starts
+            clock (Callable[[], float]): Monotonic time source
+        """
+        self.seconds = seconds
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.clock = clock
+        self.deadline = clock() + seconds
+        self._durations = collections.deque(maxlen=1000)
+        self._p95 = None
+        self._lock = threading.Lock()
+    
+    def remaining(self) -> float:
+        """
+        Seconds left before the deadline, negative once it has passed.
+        """
+        return self.deadline - self.clock()
+    
+    def observe(self, seconds: float) -> None:
+        """
+        Record the duration of a successful probe.
+        
+        Args:
+            seconds (float): Probe duration
+        """
+        with self._lock:
+            self._durations.append(seconds)
+            count = len(self._durations)
+            # Sorting is cheap at this size but not worth doing on every probe
+            if count >= self.min_samples and (self._p95 is None or count % 10 == 0):
+                self._p95 = sorted(self._durations)[int(0.95 * (count - 1))]
+    
+    def hedge_delay(self) -> Optional[float]:
+        """
+        How long a probe may run before it is hedged.
+        
+        Returns:
+            Optional[float]: The observed 95th percentile, or None while hedging is off
+        """
+        return self._p95 if self.hedge else None
+    
+    def retry_delay(self, attempt: int) -> Optional[float]:
+        """
+        Backoff before retrying a failed probe.
+        
+        Args:
+            attempt (int): Number of retries already made
+            
+        Returns:
+            Optional[float]: Seconds to wait, or None if the probe should not be retried
+        """
+        if attempt >= self.retries:
+            return None
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        return delay if delay < self.remaining() else None
+
+class ScanMetrics:
+    """
+    Aggregate counters and phase histograms for Prometheus.
+    
+    Updated from the result callback as each probe completes and rendered
+    in the Prometheus text exposition format, either to a textfile for the
+    node_exporter textfile collector or over a small /metrics endpoint.
+    """
+    
+    PHASES = ('queue', 'resolve', 'connect', 'starttls', 'handshake', 'parse')
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    
+    def __init__(self):
+        """
+        Initialize empty metrics.
+        """
+        self._lock = threading.Lock()
+        self.probes = {}
+        self.histograms = {phase: [0] * (len(self.BUCKETS) + 1) for phase in self.PHASES}
+        self.sums = dict.fromkeys(self.PHASES, 0.0)
+        self.last_scan_duration = None
+        self.last_scan_timestamp = None
+        self.last_scan_results = None
+        self._server = None
+    
+    def observe(self, result: Dict) -> None:
+        """
+        Record one certificate check result.
+        
+        Args:
+            result (Dict): Certificate check result, optionally with 'timings'
+        """
+        with self._lock:
+            self.probes[result['status']] = self.probes.get(result['status'], 0) + 1
+            for phase, seconds in result.get('timings', {}).items():
+                if phase not in self.histograms:
+                    continue
+                self.histograms[phase][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+                self.sums[phase] += seconds
+    
+    def observe_scan(self, duration: float, result_count: int) -> None:
+        """
+        Record the completion of a whole scan.
+        
+        Args:
+            duration (float): Wall-clock seconds the scan took
+            result_count (int): Number of results produced
+        """
+        with self._lock:
+            self.last_scan_duration = duration
+            self.last_scan_timestamp = time.time()
+            self.last_scan_results = result_count
+    
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        
+        Returns:
+            str: Metrics document
+        """
+        with self._lock:
+            lines = [
+                '# HELP cert_checker_probes_total Certificate checks by result status.',
+                '# TYPE cert_checker_probes_total counter'
+            ]
+            for status, count in sorted(self.probes.items()):
+                lines.append(f'cert_checker_probes_total{{status="{status}"}} {count}')
+            
+            lines.append('# HELP cert_checker_phase_seconds Time spent per probe phase.')
+            lines.append('# TYPE cert_checker_phase_seconds histogram')
+            for phase in self.PHASES:
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), self.histograms[phase]):
+                    cumulative += count
+                    lines.append(f'cert_checker_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'cert_checker_phase_seconds_sum{{phase="{phase}"}} {self.sums[phase]:.6f}')
+                lines.append(f'cert_checker_phase_seconds_count{{phase="{phase}"}} {cumulative}')
+            
+            if self.last_scan_timestamp is not None:
+                lines.extend([
+                    '# HELP cert_checker_last_scan_duration_seconds Wall-clock duration of the last scan.',
+                    '# TYPE cert_checker_last_scan_duration_seconds gauge',
+                    f'cert_checker_last_scan_duration_seconds {self.last_scan_duration:.6f}',
+                    '# HELP cert_checker_last_scan_results Results produced by the last scan.',
+                    '# TYPE cert_checker_last_scan_results gauge',
+                    f'cert_checker_last_scan_results {self.last_scan_results}',
+                    '# HELP cert_checker_last_scan_timestamp_seconds Unix time the last scan finished.',
+                    '# TYPE cert_checker_last_scan_timestamp_seconds gauge',
+                    f'cert_checker_last_scan_timestamp_seconds {self.last_scan_timestamp:.3f}'
+                ])
+        return '\n'.join(lines) + '\n'
+    
+    def write_textfile(self, path: str) -> None:
+        """
+        Atomically write the metrics for the node_exporter textfile collector.
+        
+        Args:
+            path (str): Destination .prom file
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+        logger.info(f"Metrics written to {path}")
+    
+    def serve(self, port: int, host: str = '0.0.0.0') -> None:
+        """
+        Serve the metrics at /metrics from a background thread.
+        
+        Args:
+            port (int): Port to listen on
+            host (str): Address to bind
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+    
+    def shutdown(self) -> None:
+        """
+        Stop the /metrics endpoint if it is running.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class ResultStore:
+    """
+    Column-oriented container for certificate check results.
+    
+    Instead of one dictionary per result, fields are kept in parallel
+    compact arrays: status codes as bytes, expiry dates as epoch seconds,
+    days until expiry as 32-bit ints, fingerprints as raw digests and
+    phase timings as doubles. Hostnames are interned. Values that do not
+    fit their column (errors, addresses, unexpected formats) go to a
+    sparse per-index overflow dict, so the round trip is lossless.
+    
+    Per-status counts are updated as results arrive. Indexing and
+    iteration produce plain result dictionaries, so code written for a
+    list of results keeps working; the dictionaries are copies, edit
+    results before appending them.
+    """
+    
+    STATUSES = ('OK', 'WARNING', 'CRITICAL', 'EXPIRED', 'ERROR')
+    STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S UTC'
+    # Sentinels standing for 'N/A' in the integer columns
+    NO_EXPIRY = -2 ** 63
+    NO_DAYS = -2 ** 31
+    NO_FINGERPRINT = bytes(32)
+    
+    def __init__(self, results: Iterable[Dict] = ()):
+        """
+        Initialize the store.
+        
+        Args:
+            results (Iterable[Dict]): Results to add
+        """
+        self._urls = []
+        self._hostnames = []
+        self._statuses = array('B')
+        self._expiry = array('q')
+        self._days = array('i')
+        self._fingerprints = bytearray()
+        self._timings = {phase: array('d') for phase in ScanMetrics.PHASES}
+        self._overflow = {}
+        self.counts = {}
+        self.extend(results)
+    
+    def append(self, result: Dict) -> None:
+        """
+        Add a result.
+        
+        Args:
+            result (Dict): Certificate check result
+        """
+        index = len(self._urls)
+        overflow = {key: value for key, value in result.items()
+                    if key not in ('url', 'hostname', 'status', 'expiry_date', 'days_until_expiry',
+                                   'error', 'fingerprint', 'timings')}
+        
+        self._urls.append(result['url'])
+        hostname = result['hostname']
+        self._hostnames.append(sys.intern(hostname) if isinstance(hostname, str) else hostname)
+        
+        status = result['status']
+        self._statuses.append(self.STATUS_CODES.get(status, 0))
+        if status not in self.STATUS_CODES:
+            overflow['status'] = status
+        self.counts[status] = self.counts.get(status, 0) + 1
+        
+        expiry = self.expiry_seconds(result['expiry_date'])
+        self._expiry.append(self.NO_EXPIRY if expiry is None else expiry)
+        if expiry is None and result['expiry_date'] != 'N/A':
+            overflow['expiry_date'] = result['expiry_date']
+        
+        days = result['days_until_expiry']
+        if type(days) is int and self.NO_DAYS < days < 2 ** 31:
+            self._days.append(days)
+        else:
+            self._days.append(self.NO_DAYS)
+            if days != 'N/A':
+                overflow['days_until_expiry'] = days
+        
+        if result['error'] is not None:
+            overflow['error'] = result['error']
+        
+        fingerprint = result.get('fingerprint')
+        try:
+            digest = bytes.fromhex(fingerprint) if fingerprint else self.NO_FINGERPRINT
+        except (TypeError, ValueError):
+            digest = b''
+        if len(digest) == 32:
+            self._fingerprints += digest
+        else:
+            self._fingerprints += self.NO_FINGERPRINT
+            overflow['fingerprint'] = fingerprint
+        
+        timings = result.get('timings')
+        if timings and set(timings) <= set(self._timings):
+            for phase, column in self._timings.items():
+                column.append(timings.get(phase, float('nan')))
+        else:
+            for column in self._timings.values():
+                column.append(float('nan'))
+            if timings is not None:
+                overflow['timings'] = timings
+        
+        if overflow:
+            self._overflow[index] = overflow
+    
+    def extend(self, results: Iterable[Dict]) -> None:
+        """
+        Add several results.
+        
+        Args:
+            results (Iterable[Dict]): Certificate check results
+        """
+        for result in results:
+            self.append(result)
+    
+    @classmethod
+    def expiry_seconds(cls, value) -> Optional[int]:
+        """
+        Convert a formatted expiry date to epoch seconds.
+        
+        Args:
+            value: Expiry date as formatted by _build_expiry_result
+            
+        Returns:
+            Optional[int]: Epoch seconds, or None if the value is not such a date
+        """
+        if not isinstance(value, str):
+            return None
+        try:
+            return result_time_to_seconds(value)
+        except ValueError:
+            return None
+    
+    def _build(self, index: int) -> Dict:
+        """
+        Rebuild the result dictionary stored at an index.
+        
+        Args:
+            index (int): Non-negative position in the store
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        expiry = self._expiry[index]
+        days = self._days[index]
+        result = {
+            'url': self._urls[index],
+            'hostname': self._hostnames[index],
+            'status': self.STATUSES[self._statuses[index]],
+            'expiry_date': 'N/A' if expiry == self.NO_EXPIRY
+                else datetime.fromtimestamp(expiry, timezone.utc).strftime(self.DATE_FORMAT),
+            'days_until_expiry': 'N/A' if days == self.NO_DAYS else days,
+            'error': None
+        }
+        
+        digest = self._fingerprints[index * 32:(index + 1) * 32]
+        if digest != self.NO_FINGERPRINT:
+            result['fingerprint'] = digest.hex()
+        timings = {phase: column[index] for phase, column in self._timings.items() if column[index] == column[index]}
+        if timings:
+            result['timings'] = timings
+        result.update(self._overflow.get(index, ()))
+        return result
+    
+    def __len__(self) -> int:
+        return len(self._urls)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._build(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('result index out of range')
+        return self._build(index)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self._build(index)
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ResultStore, list)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    def sort_by_urgency(self) -> None:
+        """
+        Reorder results by days until expiry (expired first, unknown last).
+        
+        Equivalent to sorting with CertificateChecker._sort_key, but reads
+        only the days column and compares plain integers.
+        """
+        days = self._days
+        keys = array('q', (UNKNOWN_DAYS if value == self.NO_DAYS else value for value in days))
+        order = sorted(range(len(self)), key=keys.__getitem__)
+        
+        self._urls = [self._urls[i] for i in order]
+        self._hostnames = [self._hostnames[i] for i in order]
+        self._statuses = array('B', (self._statuses[i] for i in order))
+        self._expiry = array('q', (self._expiry[i] for i in order))
+        self._days = array('i', (days[i] for i in order))
+        self._fingerprints = bytearray().join(self._fingerprints[i * 32:(i + 1) * 32] for i in order)
+        self._timings = {phase: array('d', (column[i] for i in order)) for phase, column in self._timings.items()}
+        position = {old: new for new, old in enumerate(order)}
+        self._overflow = {position[old]: overflow for old, overflow in self._overflow.items()}
+    
+    def reclassify(self, reference_time: float, thresholds: Dict) -> None:
+        """
+        Recompute days until expiry and status of every dated result.
+        
+        Works on the integer columns in one pass, e.g. to put results
+        produced at different times on the same reference instant.
+        Results without an expiry date keep their status.
+        
+        Args:
+            reference_time (float): Epoch seconds to count days from
+            thresholds (Dict): 'critical' and 'warning' day thresholds
+        """
+        critical, warning = thresholds['critical'], thresholds['warning']
+        expired_code, critical_code, warning_code, ok_code = (
+            self.STATUS_CODES[status] for status in ('EXPIRED', 'CRITICAL', 'WARNING', 'OK')
+        )
+        no_expiry = self.NO_EXPIRY
+        # Expiry dates are whole seconds, so rounding the reference up keeps
+        # the floor division identical to the float computation
+        reference = math.ceil(reference_time)
+        
+        days = [old if expiry == no_expiry else (expiry - reference) // 86400
+                for expiry, old in zip(self._expiry, self._days)]
+        self._statuses = array('B', (
+            old if expiry == no_expiry
+            else expired_code if value < 0
+            else critical_code if value <= critical
+            else warning_code if value <= warning
+            else ok_code
+            for expiry, value, old in zip(self._expiry, days, self._statuses)
+        ))
+        self._days = array('i', days)
+        
+        for index, overflow in self._overflow.items():
+            if self._expiry[index] != no_expiry:
+                overflow.pop('status', None)
+                overflow.pop('days_until_expiry', None)
+        
+        self.counts = {status: self._statuses.count(code) for code, status in enumerate(self.STATUSES)}
+        for index, overflow in self._overflow.items():
+            if 'status' in overflow:
+                self.counts[self.STATUSES[self._statuses[index]]] -= 1
+                self.counts[overflow['status']] = self.counts.get(overflow['status'], 0) + 1
+        self.counts = {status: count for status, count in self.counts.items() if count}
+
+def status_counts(results: Iterable[Dict]) -> Dict[str, int]:
+    """
+    Count results per status.
+    
+    Args:
+        results (Iterable[Dict]): Certificate check results
+        
+    Returns:
+        Dict[str, int]: Number of results per status
+    """
+    if isinstance(results, ResultStore):
+        return dict(results.counts)
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return counts
+
+class ResultRenderer:
+    """
+    Base class for the console report formats selected by 'output_format'.
+    
+    A renderer receives results one at a time through write() and the
+    per-status totals through finish(). Formats with streaming set write
+    each row as it arrives, so they can be fed while a scan is running.
+    """
+    
+    streaming = False
+    
+    def __init__(self, thresholds: Dict[str, int], stream: TextIO = None):
+        """
+        Initialize the renderer.
+        
+        Args:
+            thresholds (Dict[str, int]): 'critical' and 'warning' thresholds in days
+            stream (TextIO): Destination, sys.stdout if None
+        """
+        self.thresholds = thresholds
+        self.stream = stream if stream is not None else sys.stdout
+    
+    def write(self, result: Dict) -> None:
+        """
+        Render one result.
+        
+        Args:
+            result (Dict): Certificate check result
+        """
+    
+    def finish(self, counts: Dict[str, int]) -> None:
+        """
+        Complete the report.
+        
+        Args:
+            counts (Dict[str, int]): Per-status totals of the whole run
+        """
+    
+    def print_summary(self, counts: Dict[str, int]) -> None:
+        """
+        Print per-status totals and the configured thresholds.
+        
+        Args:
+            counts (Dict[str, int]): Per-status totals of the whole run
+        """
+        out = self.stream
+        print(f"\nSummary:", file=out)
+        print(f"Total certificates checked: {sum(counts.values())}", file=out)
+        print(f"🟢 OK: {counts.get('OK', 0)}", file=out)
+        print(f"🟡 Warning (≤{self.thresholds['warning']} days): {counts.get('WARNING', 0)}", file=out)
+        print(f"🔴 Critical (≤{self.thresholds['critical']} days): {counts.get('CRITICAL', 0)}", file=out)
+        print(f"❌ Expired: {counts.get('EXPIRED', 0)}", file=out)
+        print(f"❗ Errors: {counts.get('ERROR', 0)}", file=out)
+        print(f"\nConfigured Thresholds:", file=out)
+        print(f"Critical: ≤{self.thresholds['critical']} days", file=out)
+        print(f"Warning: ≤{self.thresholds['warning']} days", file=out)
+        print("="*80, file=out)
+
+class TableRenderer(ResultRenderer):
+    """
+    Grid table followed by the summary, for people reading the console.
+    """
+    
+    HEADERS = ['URL', 'Hostname', 'Status', 'Expiry Date', 'Days Until Expiry']
+    
+    def __init__(self, thresholds: Dict[str, int], stream: TextIO = None):
+        super().__init__(thresholds, stream)
+        self.rows = []
+    
+    def write(self, result: Dict) -> None:
+        self.rows.append([
+            result['url'],
+            result['hostname'],
+            result['status'],
+            result['expiry_date'],
+            result['days_until_expiry']
+        ])
+    
+    def finish(self, counts: Dict[str, int]) -> None:
+        if not self.rows:
+            print("No results to display", file=self.stream)
+            return
+        from tabulate import tabulate
+        
+        print("\n" + "="*80, file=self.stream)
+        print("SSL/TLS Certificate Expiry Report", file=self.stream)
+        print("="*80, file=self.stream)
+        print(tabulate(self.rows, headers=self.HEADERS, tablefmt='grid'), file=self.stream)
+        self.print_summary(counts)
+
+class CSVRenderer(ResultRenderer):
+    """
+    One CSV row per result, written as it arrives.
+    """
+    
+    streaming = True
+    FIELDS = ['url', 'hostname', 'status', 'expiry_date', 'days_until_expiry', 'error']
+    
+    def __init__(self, thresholds: Dict[str, int], stream: TextIO = None):
+        super().__init__(thresholds, stream)
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(self.FIELDS)
+    
+    def write(self, result: Dict) -> None:
+        self.writer.writerow([result[field] for field in self.FIELDS])
+
+class JSONLinesRenderer(ResultRenderer):
+    """
+    One JSON object per result, written as it arrives.
+    """
+    
+    streaming = True
+    
+    def write(self, result: Dict) -> None:
+        self.stream.write(json.dumps(result, default=str) + '\n')
+
+class SummaryRenderer(ResultRenderer):
+    """
+    Per-status totals only, without any per-certificate rows.
+    """
+    
+    def finish(self, counts: Dict[str, int]) -> None:
+        print("\n" + "="*80, file=self.stream)
+        print("SSL/TLS Certificate Expiry Summary", file=self.stream)
+        print("="*80, file=self.stream)
+        self.print_summary(counts)
+
+class ChangeTableRenderer(TableRenderer):
+    """
+    Grid table of the changes since the previous run, for people reading the console.
+    """
+    
+    HEADERS = ['URL', 'Change', 'Previous Status', 'Status', 'Expiry Date', 'Days Until Expiry']
+    
+    def write(self, result: Dict) -> None:
+        self.rows.append([
+            result['url'],
+            result['change'],
+            result['previous_status'] or '-',
+            result['status'],
+            result['expiry_date'],
+            result['days_until_expiry']
+        ])
+    
+    def finish(self, counts: Dict[str, int]) -> None:
+        if not self.rows:
+            print(f"\nNo certificate changes since the previous run ({sum(counts.values())} checked)", file=self.stream)
+            return
+        from tabulate import tabulate
+        
+        print("\n" + "="*80, file=self.stream)
+        print("SSL/TLS Certificate Changes Since Previous Run", file=self.stream)
+        print("="*80, file=self.stream)
+        print(tabulate(self.rows, headers=self.HEADERS, tablefmt='grid'), file=self.stream)
+        print(f"\n{len(self.rows)} changes, {sum(counts.values())} certificates checked", file=self.stream)
+        print("="*80, file=self.stream)
+
+class ChangeCSVRenderer(CSVRenderer):
+    """
+    One CSV row per change since the previous run.
+    """
+    
+    FIELDS = ['url', 'hostname', 'change', 'previous_status', 'status', 'previous_expiry_date',
+              'expiry_date', 'days_until_expiry', 'error']
+
+class ChangeSummaryRenderer(SummaryRenderer):
+    """
+    Number of changes since the previous run followed by the per-status totals.
+    """
+    
+    def __init__(self, thresholds: Dict[str, int], stream: TextIO = None):
+        super().__init__(thresholds, stream)
+        self.changes = 0
+    
+    def write(self, result: Dict) -> None:
+        self.changes += 1
+    
+    def finish(self, counts: Dict[str, int]) -> None:
+        print("\n" + "="*80, file=self.stream)
+        print("SSL/TLS Certificate Changes Summary", file=self.stream)
+        print("="*80, file=self.stream)
+        print(f"Changes since the previous run: {self.changes}", file=self.stream)
+        self.print_summary(counts)
+
+# Console report formats by 'output_format'
+RENDERERS = {
+    'table': TableRenderer,
+    'csv': CSVRenderer,
+    'jsonl': JSONLinesRenderer,
+    'summary': SummaryRenderer,
+}
+
+# The same formats for the changes listed by 'report_mode' delta
+CHANGE_RENDERERS = {
+    'table': ChangeTableRenderer,
+    'csv': ChangeCSVRenderer,
+    'jsonl': JSONLinesRenderer,
+    'summary': ChangeSummaryRenderer,
+}
+
+class SlackAlertDispatcher:
+    """
+    Delivers certificate alerts to a Slack incoming webhook.
+    
+    Messages are sent over one pooled requests.Session. Long certificate
+    lists are split into several messages that stay within Slack's limits.
+    Rate limiting (429) and server errors are retried with exponential
+    backoff, honoring Retry-After. With 'deduplicate' enabled, a
+    certificate is alerted only once per fingerprint and status, so
+    frequent or daemon runs don't repeat the same notification.
+    """
+    
+    STATUS_EMOJI = {'CRITICAL': "🔴", 'EXPIRED': "❌", 'ERROR': "❗", 'WARNING': "🟡"}
+    
+    def __init__(self, webhook_config: Dict):
+        """
+        Initialize the dispatcher.
+        
+        Args:
+            webhook_config (Dict): The 'slack_webhook' section of the configuration
+        """
+        import requests
+        
+        self.webhook_config = webhook_config
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self.sleep = time.sleep
+        self._sent = None
+    
+    @property
+    def state_path(self) -> str:
+        """
+        Path of the file remembering which alerts were already sent.
+        """
+        return self.webhook_config.get('dedupe_state', 'slack_alert_state.json')
+    
+    def _load_state(self) -> Dict[str, str]:
+        """
+        Load the alerts already sent, keyed by URL and fingerprint.
+        
+        Returns:
+            Dict[str, str]: Last alerted status per alert key
+        """
+        if self._sent is None:
+            try:
+                with open(self.state_path, 'r') as f:
+                    self._sent = json.load(f)
+            except FileNotFoundError:
+                self._sent = {}
+            except json.JSONDecodeError as e:
+                logger.error(f"Ignoring invalid Slack alert state file: {e}")
+                self._sent = {}
+        return self._sent
+    
+    def _save_state(self) -> None:
+        """
+        Persist the alerts already sent.
+        """
+        try:
+            with open(self.state_path, 'w') as f:
+                json.dump(self._sent, f)
+        except OSError as e:
+            logger.error(f"Error saving Slack alert state: {e}")
+    
+    @staticmethod
+    def _alert_key(result: Dict) -> str:
+        """
+        Identify a certificate for deduplication.
+        
+        Args:
+            result (Dict): Certificate check result
+            
+        Returns:
+            str: URL and certificate fingerprint (empty if unknown)
+        """
+        return f"{result['url']}|{result.get('fingerprint') or ''}"
+    
+    def _deduplicate(self, alertable: List[Dict]) -> List[Dict]:
+        """
+        Drop certificates that were already alerted with the same status.
+        
+        Args:
+            alertable (List[Dict]): Results that would trigger an alert
+            
+        Returns:
+            List[Dict]: Results not alerted before in their current status
+        """
+        sent = self._load_state()
+        return [r for r in alertable if sent.get(self._alert_key(r)) != r['status']]
+    
+    def _record(self, results: List[Dict], alerted: List[Dict]) -> None:
+        """
+        Remember what was alerted and forget certificates that recovered or were replaced.
+        
+        Args:
+            results (List[Dict]): All results of the run or batch
+            alerted (List[Dict]): Results included in the delivered alert
+        """
+        sent = self._load_state()
+        alerted_keys = {self._alert_key(r) for r in alerted}
+        keys_by_url = collections.defaultdict(list)
+        for key in sent:
+            keys_by_url[key.rpartition('|')[0]].append(key)
+        for result in results:
+            key = self._alert_key(result)
+            if result.get('fingerprint'):
+                # A new certificate makes the keys of the ones it replaced stale
+                for stale in keys_by_url.get(result['url'], ()):
+                    if stale != key:
+                        sent.pop(stale, None)
+            if key in alerted_keys:
+                sent[key] = result['status']
+            elif result['status'] == 'OK':
+                sent.pop(key, None)
+        self._save_state()
+    
+    def _paginate(self, sections: List[Tuple[str, List[str]]]) -> List[List[Tuple[str, List[str]]]]:
+        """
+        Split detail lines into pages that stay within the message limits.
+        
+        Args:
+            sections (List[Tuple[str, List[str]]]): Section kind and its detail lines
+            
+        Returns:
+            List[List[Tuple[str, List[str]]]]: Pages, each a list of sections with their lines
+        """
+        max_entries = self.webhook_config.get('max_entries_per_message', 50)
+        max_chars = self.webhook_config.get('max_chars_per_message', 3000)
+        pages = [[]]
+        entries = chars = 0
+        
+        for kind, lines in sections:
+            for line in lines:
+                if entries and (entries >= max_entries or chars + len(line) > max_chars):
+                    pages.append([])
+                    entries = chars = 0
+                if not pages[-1] or pages[-1][-1][0] != kind:
+                    pages[-1].append((kind, []))
+                pages[-1][-1][1].append(line)
+                entries += 1
+                chars += len(line)
+        return pages
+    
+    def build_messages(self, checked: int, critical_certs: List[Dict], warning_certs: List[Dict],
+                       thresholds: Dict) -> List[Dict]:
+        """
+        Build the Slack payloads for an alert.
+        
+        The first message carries the summary; certificate details are
+        spread over as many messages as needed.
+        
+        Args:
+            checked (int): Number of certificates checked
+            critical_certs (List[Dict]): Critical, expired and failed certificates to list
+            warning_certs (List[Dict]): Warning certificates to list
+            thresholds (Dict): Configured thresholds
+            
+        Returns:
+            List[Dict]: Slack message payloads in sending order
+        """
+        # Determine alert color and emoji based on severity
+        if critical_certs:
+            color = "danger"
+            alert_level = "CRITICAL"
+            emoji = "🚨"
+        elif warning_certs:
+            color = "warning"
+            alert_level = "WARNING"
+            emoji = "⚠️"
+        else:
+            color = "good"
+            alert_level = "INFO"
+            emoji = "ℹ️"
+        
+        # Build the main message
+        main_text = f"{emoji} *Certificate Expiry Alert - {alert_level}*"
+        
+        sections = []
+        if critical_certs:
+            sections.append(('critical', [
+                f"• {self.STATUS_EMOJI[cert['status']]} *{cert['url']}*: {cert['status']} ({cert['days_until_expiry']} days)\n"
+                for cert in critical_certs
+            ]))
+        if warning_certs:
+            sections.append(('warning', [
+                f"• 🟡 *{cert['url']}*: {cert['status']} ({cert['days_until_expiry']} days)\n"
+                for cert in warning_certs
+            ]))
+        pages = self._paginate(sections)
+        
+        messages = []
+        for number, page in enumerate(pages, 1):
+            attachments = []
+            if number == 1:
+                text = main_text
+                attachments.append({
+                    "color": color,
+                    "title": f"Certificate Monitoring Report",
+                    "text": f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}",
+                    "fields": [
+                        {
+                            "title": "Total Certificates Checked",
+                            "value": str(checked),
+                            "short": True
+                        },
+                        {
+                            "title": "Critical/Expired",
+                            "value": str(len(critical_certs)),
+                            "short": True
+                        },
+                        {
+                            "title": "Warning",
+                            "value": str(len(warning_certs)),
+                            "short": True
+                        },
+                        {
+                            "title": "Thresholds",
+                            "value": f"Critical: ≤{thresholds['critical']} days, Warning: ≤{thresholds['warning']} days",
+                            "short": True
+                        }
+                    ],
+                    "footer": "Certificate Monitor",
+                    "footer_icon": "https://slack.com/img/favicon.ico",
+                    "ts": int(datetime.now().timestamp())
+                })
+            else:
+                text = f"{main_text} (continued {number}/{len(pages)})"
+            
+            for kind, lines in page:
+                if kind == 'critical':
+                    attachments.append({
+                        "color": "danger",
+                        "title": "Critical Certificates Details",
+                        "text": "*CRITICAL/EXPIRED Certificates:*\n" + "".join(lines),
+                        "mrkdwn_in": ["text"]
+                    })
+                else:
+                    attachments.append({
+                        "color": "warning",
+                        "title": "Warning Certificates Details",
+                        "text": "*WARNING Certificates:*\n" + "".join(lines),
+                        "mrkdwn_in": ["text"]
+                    })
+            
+            messages.append({
+                "text": text,
+                "username": "Certificate Monitor",
+                "icon_emoji": ":shield:",
+                "attachments": attachments
+            })
+        return messages
+    
+    def _retry_delay(self, attempt: int, response: Optional['requests.Response'] = None) -> float:
+        """
+        Seconds to wait before the next delivery attempt.
+        
+        Retry-After is honored up to 'max_retry_after_seconds', so a bogus or
+        very long value cannot stall the run.
+        
+        Args:
+            attempt (int): Zero-based number of the failed attempt
+            response (Optional[requests.Response]): Failed response, checked for Retry-After
+            
+        Returns:
+            float: Delay in seconds
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None:
+                try:
+                    return min(max(float(retry_after), 0.0), self.webhook_config.get('max_retry_after_seconds', 60))
+                except ValueError:
+                    pass
+        base = self.webhook_config.get('backoff_seconds', 1.0)
+        return min(base * 2 ** attempt, 60) * (0.5 + random.random() / 2)
+    
+    def post(self, payload: Dict) -> bool:
+        """
+        Deliver one message, retrying on rate limiting, server and connection errors.
+        
+        Args:
+            payload (Dict): Slack message payload
+            
+        Returns:
+            bool: True if Slack accepted the message
+        """
+        import requests
+        
+        webhook_url = self.webhook_config.get('url')
+        max_retries = self.webhook_config.get('max_retries', 5)
+        
+        for attempt in range(max_retries + 1):
+            response = None
+            try:
+                response = self.session.post(webhook_url, json=payload, timeout=10)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return True
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError as e:
+                # Other client errors will not succeed on retry
+                logger.error(f"Failed to send Slack webhook alert: {e}")
+                return False
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            
+            if attempt < max_retries:
+                delay = self._retry_delay(attempt, response)
+                logger.warning(f"Slack webhook delivery failed ({error}), retrying in {delay:.1f}s")
+                self.sleep(delay)
+        
+        logger.error(f"Failed to send Slack webhook alert after {max_retries + 1} attempts: {error}")
+        return False
+    
+    def send(self, results: List[Dict], thresholds: Dict, checked: Optional[int] = None) -> bool:
+        """
+        Send alerts for the given results according to the webhook configuration.
+        
+        Args:
+            results (List[Dict]): Certificate check results
+            thresholds (Dict): Configured thresholds
+            checked (Optional[int]): Number of certificates checked, when results
+                is only the changed subset; defaults to len(results)
+            
+        Returns:
+            bool: True if every message was delivered
+        """
+        webhook_config = self.webhook_config
+        
+        # Check for critical/expired certificates
+        critical_certs = [r for r in results if r['status'] in ['CRITICAL', 'EXPIRED', 'ERROR']]
+        warning_certs = [r for r in results if r['status'] == 'WARNING']
+        if not webhook_config.get('send_on_critical', True):
+            critical_certs = []
+        if not webhook_config.get('send_on_warning', False):
+            warning_certs = []
+        
+        deduplicate = webhook_config.get('deduplicate', False)
+        if deduplicate:
+            critical_certs = self._deduplicate(critical_certs)
+            warning_certs = self._deduplicate(warning_certs)
+        
+        # Decide whether to send alert
+        if not critical_certs and not warning_certs:
+            logger.info("No alerts to send based on configuration")
+            if deduplicate:
+                self._record(results, [])
+            return False
+        
+        if not webhook_config.get('url'):
+            logger.error("No Slack webhook URL configured")
+            return False
+        
+        checked = len(results) if checked is None else checked
+        messages = self.build_messages(checked, critical_certs, warning_certs, thresholds)
+        for number, payload in enumerate(messages, 1):
+            if not self.post(payload):
+                logger.error(f"Slack alert stopped after {number - 1} of {len(messages)} messages")
+                return False
+        
+        if deduplicate:
+            self._record(results, critical_certs + warning_certs)
+        logger.info(f"Slack webhook alert sent successfully ({len(messages)} messages)")
+        return True
+
+class CertificateChecker:
+    """
+    A class to check SSL/TLS certificate expiration dates for websites.
+    """
+    
+    def __init__(self, config_file: str = 'config.json', config: Optional[Dict] = None):
+        """
+        Initialize the CertificateChecker with configuration.
+        
+        Args:
+            config_file (str): Path to the configuration file
+            config (Optional[Dict]): Configuration to use instead of reading config_file
+        """
+        self.config_file = config_file
+        self.config = config if config is not None else self._load_config(config_file)
+        self.results = []
+        self.lock = threading.Lock()
+        self.cache = None
+        self.history = None
+        self._slack_dispatcher = None
+        # Certificates by probe while a consolidated scan is running
+        self._probed_certificates = None
+        # Epoch seconds that days until expiry are counted from, fixed per run
+        self.reference_time = None
+        # Deadline and retry policy of the running scan, when 'deadline' is enabled
+        self.budget = None
+        # Probe counters and phase histograms, exported when 'metrics' is enabled
+        self.metrics = ScanMetrics()
+        self._configure()
+    
+    def _build_components(self, config: Dict) -> Dict:
+        """
+        Build the components that depend on a configuration, without installing them.
+        
+        If any component fails to build, the databases opened so far are closed
+        again, so a rejected configuration leaves nothing behind.
+        
+        Args:
+            config (Dict): Configuration to build from
+            
+        Returns:
+            Dict: Attribute name to component
+            
+        Raises:
+            ValueError: If a setting is invalid
+            sqlite3.Error: If the cache or history database cannot be opened
+        """
+        # Get thresholds from config or use defaults
+        components = {'thresholds': config.get('thresholds', {'critical': 7, 'warning': 30})}
+        try:
+            # One SSL context shared by every probe
+            components['ssl_contexts'] = SSLContextManager(config.get('tls'))
+            # Optional cache of previous observations to skip unnecessary handshakes
+            cache_config = config.get('cache', {})
+            components['cache'] = ResultCache(cache_config.get('path', 'cert_cache.db')) if cache_config.get('enabled', False) else None
+            # Optional append-only history of every result for later queries
+            history_config = config.get('history', {})
+            components['history'] = HistoryStore(history_config.get('path', 'cert_history.db')) if history_config.get('enabled', False) else None
+            # Optional resolution stage run before the probes
+            dns_config = config.get('dns', {})
+            components['resolver'] = DNSResolver(dns_config.get('ttl', 300), dns_config.get('concurrency', 100)) if dns_config.get('enabled', False) else None
+            # Optional adaptive concurrency for the asyncio engine
+            scheduler_config = config.get('scheduler', {})
+            components['scheduler'] = None
+            if scheduler_config.get('enabled', False):
+                components['scheduler'] = AdaptiveScheduler(scheduler_config, config.get('max_concurrency', 500))
+                if config.get('engine', 'threads') != 'asyncio':
+                    logger.warning("The adaptive scheduler only applies to the asyncio engine")
+        except Exception:
+            self._close_components(components)
+            raise
+        return components
+    
+    def _close_components(self, components: Dict) -> None:
+        """
+        Close the databases among a set of components.
+        
+        Args:
+            components (Dict): Attribute name to component, as built by _build_components
+        """
+        for name in ('cache', 'history'):
+            if components.get(name) is not None:
+                components[name].close()
+    
+    def _logging_config(self, config: Dict) -> Dict:
+        """
+        The 'logging' section of a configuration, as the log pipeline should apply it.
+        
+        With a 'csv' or 'jsonl' output format the rows stream to stdout, so log
+        lines are sent to stderr to keep the rows machine-readable.
+        
+        Args:
+            config (Dict): Configuration to read
+            
+        Returns:
+            Dict: Logging settings for LogPipeline.configure
+        """
+        logging_config = dict(config.get('logging') or {})
+        renderer = RENDERERS.get(config.get('output_format', 'table'))
+        if renderer is not None and renderer.streaming:
+            logging_config['stream'] = 'stderr'
+        return logging_config
+    
+    def _configure(self) -> None:
+        """
+        Build the components that depend on the loaded configuration.
+        """
+        log_pipeline.configure(self._logging_config(self.config))
+        for name, component in self._build_components(self.config).items():
+            setattr(self, name, component)
+    
+    def reload_config(self) -> None:
+        """
+        Re-read the configuration file and rebuild the components that depend on it.
+        
+        Metrics and the loaded process stay in place, so a long-running checker
+        picks up new websites, thresholds and settings without a restart. The
+        new configuration and its components are built and validated first
+        and only then swapped in, so a failed reload leaves the checker
+        running on its previous configuration.
+        
+        Raises:
+            FileNotFoundError: If config file doesn't exist
+            json.JSONDecodeError: If config file is invalid JSON
+            ValueError: If a setting is invalid
+            sqlite3.Error: If the cache or history database cannot be opened
+        """
+        config = self._load_config(self.config_file)
+        components = self._build_components(config)
+        try:
+            log_pipeline.configure(self._logging_config(config))
+        except Exception:
+            self._close_components(components)
+            raise
+        self._close_components({'cache': self.cache, 'history': self.history})
+        self.config = config
+        for name, component in components.items():
+            setattr(self, name, component)
+    
+    def _load_config(self, config_file: str) -> Dict:
+        """
+        Load configuration from JSON file.
+        
+        Args:
+            config_file (str): Path to the configuration file
+            
+        Returns:
+            Dict: Configuration dictionary
+            
+        Raises:
+            FileNotFoundError: If config file doesn't exist
+            json.JSONDecodeError: If config file is invalid JSON
+        """
+        try:
+            with open(config_file, 'r') as f:
+                config = json.load(f)
+                logger.info(f"Configuration loaded from {config_file}")
+                return config
+        except FileNotFoundError:
+            logger.error(f"Configuration file {config_file} not found")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in configuration file: {e}")
+            raise
+    
+    def _parse_url(self, url: str) -> Tuple[str, int]:
+        """
+        Parse URL to extract hostname and port.
+        
+        Args:
+            url (str): URL to parse
+            
+        Returns:
+            Tuple[str, int]: Hostname and port
+        """
+        parsed = urlparse(url)
+        hostname = parsed.hostname or parsed.netloc
+        port = parsed.port or DEFAULT_PORTS.get(parsed.scheme, 80)
+        return hostname, port
+    
+    def _get_certificate_info(self, hostname: str, port: int, timeout: int, address: Optional[str] = None,
+                              timings: Optional[Dict[str, float]] = None, protocol: str = 'https') -> Optional[Dict]:
+        """
+        Retrieve SSL certificate information for a given hostname and port.
+        
+        Args:
+            hostname (str): The hostname to check
+            port (int): The port to connect to
+            timeout (int): Connection timeout in seconds
+            address (Optional[str]): Pre-resolved IP address to connect to, hostname is still sent as SNI
+            timings (Optional[Dict[str, float]]): Filled with 'connect', 'starttls', 'handshake' and
+                'parse' durations in seconds for the phases that completed
+            protocol (str): URL scheme; schemes in STARTTLS_PROTOCOLS are upgraded
+                to TLS before the handshake
+            
+        Returns:
+            Optional[Dict]: Certificate information or None if failed
+        """
+        timings = {} if timings is None else timings
+        try:
+            context = self.ssl_contexts.get_context()
+            
+            # Connect to the server and get certificate
+            started = time.monotonic()
+            with socket.create_connection((address or hostname, port), timeout=timeout) as sock:
+                started = record_phase(timings, 'connect', started)
+                if protocol in STARTTLS_PROTOCOLS:
+                    run_starttls(sock, STARTTLS_PROTOCOLS[protocol](hostname))
+                    started = record_phase(timings, 'starttls', started)
+                with context.wrap_socket(sock, server_hostname=hostname) as ssock:
+                    started = record_phase(timings, 'handshake', started)
+                    cert = self.ssl_contexts.read_certificate(ssock)
+                    record_phase(timings, 'parse', started)
+                    
+            return cert
+            
+        except socket.timeout:
+            logger.error(f"Timeout connecting to {hostname}:{port}", extra={'host': hostname})
+            return None
+        except socket.gaierror as e:
+            logger.error(f"DNS resolution failed for {hostname}: {e}", extra={'host': hostname})
+            return None
+        except ssl.SSLError as e:
+            logger.error(f"SSL error for {hostname}: {e}", extra={'host': hostname})
+            return None
+        except StartTLSError as e:
+            logger.error(f"STARTTLS failed for {hostname}:{port}: {e}", extra={'host': hostname})
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error for {hostname}: {e}", extra={'host': hostname})
+            return None
+    
+    def _parse_certificate_date(self, date_string: str) -> datetime:
+        """
+        Parse certificate date string to datetime object.
+        
+        Args:
+            date_string (str): Date string from certificate
+            
+        Returns:
+            datetime: Parsed datetime object
+        """
+        return datetime.fromtimestamp(cert_time_to_seconds(date_string), timezone.utc)
+    
+    def _calculate_days_until_expiry(self, expiry_date: datetime) -> int:
+        """
+        Calculate days until certificate expires.
+        
+        Counted from the reference time of the current run, so every
+        result of a run uses the same instant.
+        
+        Args:
+            expiry_date (datetime): Certificate expiry date
+            
+        Returns:
+            int: Days until expiry (negative if already expired)
+        """
+        reference = self.reference_time if self.reference_time is not None else time.time()
+        return int((expiry_date.timestamp() - reference) // 86400)
+    
+    def _determine_status(self, days_until_expiry: int) -> str:
+        """
+        Determine status based on configurable thresholds.
+        
+        Args:
+            days_until_expiry (int): Days until expiry
+            
+        Returns:
+            str: Status (CRITICAL, WARNING, OK, EXPIRED)
+        """
+        if days_until_expiry < 0:
+            return 'EXPIRED'
+        elif days_until_expiry <= self.thresholds['critical']:
+            return 'CRITICAL'
+        elif days_until_expiry <= self.thresholds['warning']:
+            return 'WARNING'
+        else:
+            return 'OK'
+    
+    def _build_result(self, url: str, hostname: str, cert_info: Optional[Dict]) -> Dict:
+        """
+        Build a result dictionary from retrieved certificate information.
+        
+        Args:
+            url (str): URL that was checked
+            hostname (str): Hostname that was checked
+            cert_info (Optional[Dict]): Certificate information or None if retrieval failed
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        if cert_info is None:
+            return {
+                'url': url,
+                'hostname': hostname,
+                'status': 'ERROR',
+                'expiry_date': 'N/A',
+                'days_until_expiry': 'N/A',
+                'error': 'Failed to retrieve certificate'
+            }
+        
+        # Parse certificate dates
+        expiry_date = self._effective_expiry(cert_info)
+        result = self._build_expiry_result(url, hostname, expiry_date)
+        if cert_info.get('fingerprint'):
+            result['fingerprint'] = cert_info['fingerprint']
+        if 'chain' in cert_info:
+            result['chain'] = cert_info['chain']
+        return result
+    
+    def _effective_expiry(self, cert_info: Dict) -> datetime:
+        """
+        Find the expiry date that drives the status of a certificate.
+        
+        This is the leaf's notAfter, or the earliest expiry of any
+        certificate in the presented chain when the chain was captured.
+        
+        Args:
+            cert_info (Dict): Certificate information
+            
+        Returns:
+            datetime: Earliest expiry date
+        """
+        expiry_date = self._parse_certificate_date(cert_info['notAfter'])
+        chain = cert_info.get('chain')
+        if chain:
+            earliest = min(result_time_to_seconds(certificate['not_after']) for certificate in chain)
+            if earliest < expiry_date.timestamp():
+                expiry_date = datetime.fromtimestamp(earliest, timezone.utc)
+        return expiry_date
+    
+    def _build_expiry_result(self, url: str, hostname: str, expiry_date: datetime) -> Dict:
+        """
+        Build a result dictionary for a known certificate expiry date.
+        
+        Args:
+            url (str): URL that was checked
+            hostname (str): Hostname that was checked
+            expiry_date (datetime): Certificate expiry date
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        days_until_expiry = self._calculate_days_until_expiry(expiry_date)
+        
+        # Determine status using configurable thresholds
+        status = self._determine_status(days_until_expiry)
+        
+        result = {
+            'url': url,
+            'hostname': hostname,
+            'status': status,
+            'expiry_date': expiry_date.strftime('%Y-%m-%d %H:%M:%S UTC'),
+            'days_until_expiry': days_until_expiry,
+            'error': None
+        }
+        
+        logger.info(f"Certificate for {url} expires on {result['expiry_date']} ({days_until_expiry} days) - Status: {status}",
+                    extra={'host': hostname})
+        return result
+    
+    def _build_error_result(self, url: str, hostname: Optional[str], error: Exception) -> Dict:
+        """
+        Build a result dictionary for an unexpected error during a check.
+        
+        Args:
+            url (str): URL that was checked
+            hostname (Optional[str]): Hostname if it was parsed before the error
+            error (Exception): The error that occurred
+            
+        Returns:
+            Dict: Certificate check result with ERROR status
+        """
+        logger.error(f"Error checking certificate for {url}: {error}", extra={'host': hostname})
+        return {
+            'url': url,
+            'hostname': hostname if hostname is not None else 'Unknown',
+            'status': 'ERROR',
+            'expiry_date': 'N/A',
+            'days_until_expiry': 'N/A',
+            'error': str(error)
+        }
+    
+    def _probe_timeout(self) -> float:
+        """
+        Connection timeout for the next probe.
+        
+        Returns:
+            float: The configured 'timeout', cut to what is left of the run's deadline
+        """
+        timeout = self.config.get('timeout', 10)
+        if self.budget is not None:
+            timeout = max(min(timeout, self.budget.remaining()), 0.1)
+        return timeout
+    
+    def _finish_check(self, url: str, hostname: str, port: int, address: Optional[str],
+                      cert_info: Optional[Dict], timings: Dict[str, float]) -> Dict:
+        """
+        Turn a completed probe into a result and record it in the cache.
+        
+        Args:
+            url (str): URL that was checked
+            hostname (str): Hostname that was checked
+            port (int): Port that was checked
+            address (Optional[str]): Pre-resolved IP address that was probed
+            cert_info (Optional[Dict]): Certificate information or None if retrieval failed
+            timings (Dict[str, float]): Phase durations measured for the probe
+            
+        Returns:
+            Dict: Certificate check result including its 'timings'
+        """
+        if address is not None and self.resolver is not None:
+            timings['resolve'] = self.resolver.durations.get(hostname, 0.0)
+        
+        result = self._build_result(url, hostname, cert_info)
+        if address is not None and self.config.get('dns', {}).get('probe_all_addresses', False):
+            result['address'] = address
+        result['timings'] = timings
+        self._update_cache(hostname, port, cert_info)
+        if self._probed_certificates is not None and cert_info is not None:
+            self._probed_certificates[(url, address)] = cert_info
+        return result
+    
+    def _check_single_certificate(self, url: str, address: Optional[str] = None, queued_at: Optional[float] = None) -> Dict:
+        """
+        Check certificate for a single URL.
+        
+        Args:
+            url (str): URL to check
+            address (Optional[str]): Pre-resolved IP address to probe
+            queued_at (Optional[float]): time.monotonic() when the check was queued, to time the wait
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        hostname = None
+        timings = {}
+        if queued_at is not None:
+            record_phase(timings, 'queue', queued_at)
+        
+        try:
+            hostname, port = self._parse_url(url)
+            logger.info(f"Checking certificate for {url}", extra={'host': hostname})
+            timeout = self._probe_timeout()
+            
+            cert_info = self._get_certificate_info(hostname, port, timeout, address, timings=timings,
+                                                   protocol=urlparse(url).scheme)
+            return self._finish_check(url, hostname, port, address, cert_info, timings)
+            
+        except Exception as e:
+            return self._build_error_result(url, hostname, e)
+    
+    async def _get_certificate_info_async(self, hostname: str, port: int, timeout: int, address: Optional[str] = None,
+                                          timings: Optional[Dict[str, float]] = None, protocol: str = 'https') -> Optional[Dict]:
+        """
+        Retrieve SSL certificate information without blocking the event loop.
+        
+        The timeout covers TCP connect, any STARTTLS upgrade and the TLS
+        handshake together, so every host gets its own deadline regardless of
+        how busy the loop is. TLS is started on the open connection so the
+        phases can be timed apart.
+        
+        Args:
+            hostname (str): The hostname to check
+            port (int): The port to connect to
+            timeout (int): Connection timeout in seconds
+            address (Optional[str]): Pre-resolved IP address to connect to, hostname is still sent as SNI
+            timings (Optional[Dict[str, float]]): Filled with 'connect', 'starttls', 'handshake' and
+                'parse' durations in seconds for the phases that completed
+            protocol (str): URL scheme; schemes in STARTTLS_PROTOCOLS are upgraded
+                to TLS before the handshake
+            
+        Returns:
+            Optional[Dict]: Certificate information or None if failed
+        """
+        import asyncio
+        
+        timings = {} if timings is None else timings
+        try:
+            context = self.ssl_contexts.get_context()
+            
+            started = time.monotonic()
+            deadline = started + timeout
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(address or hostname, port),
+                timeout=timeout
+            )
+            try:
+                started = record_phase(timings, 'connect', started)
+                if protocol in STARTTLS_PROTOCOLS:
+                    await asyncio.wait_for(
+                        run_starttls_async(reader, writer, STARTTLS_PROTOCOLS[protocol](hostname)),
+                        timeout=max(deadline - started, 0)
+                    )
+                    started = record_phase(timings, 'starttls', started)
+                await asyncio.wait_for(
+                    writer.start_tls(context, server_hostname=hostname),
+                    timeout=max(deadline - started, 0)
+                )
+                started = record_phase(timings, 'handshake', started)
+                cert = self.ssl_contexts.read_certificate(writer.get_extra_info('ssl_object'))
+                record_phase(timings, 'parse', started)
+            finally:
+                # Skip the TLS close_notify exchange, we only needed the handshake
+                writer.transport.abort()
+            
+            return cert
+            
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout connecting to {hostname}:{port}", extra={'host': hostname})
+            return None
+        except socket.gaierror as e:
+            logger.error(f"DNS resolution failed for {hostname}: {e}", extra={'host': hostname})
+            return None
+        except ssl.SSLError as e:
+            logger.error(f"SSL error for {hostname}: {e}", extra={'host': hostname})
+            return None
+        except StartTLSError as e:
+            logger.error(f"STARTTLS failed for {hostname}:{port}: {e}", extra={'host': hostname})
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error for {hostname}: {e}", extra={'host': hostname})
+            return None
+    
+    async def _check_single_certificate_async(self, url: str, address: Optional[str] = None, queued_at: Optional[float] = None) -> Dict:
+        """
+        Check certificate for a single URL on the asyncio engine.
+        
+        Args:
+            url (str): URL to check
+            address (Optional[str]): Pre-resolved IP address to probe
+            queued_at (Optional[float]): time.monotonic() when the check was queued, to time the wait
+            
+        Returns:
+            Dict: Certificate check result, identical in shape to _check_single_certificate
+        """
+        import asyncio
+        
+        hostname = None
+        timings = {}
+        if queued_at is not None:
+            record_phase(timings, 'queue', queued_at)
+        
+        try:
+            hostname, port = self._parse_url(url)
+            logger.info(f"Checking certificate for {url}", extra={'host': hostname})
+            timeout = self._probe_timeout()
+            
+            cert_info = await self._get_certificate_info_async(hostname, port, timeout, address, timings=timings,
+                                                               protocol=urlparse(url).scheme)
+            if self.cache is None or cert_info is None:
+                return self._finish_check(url, hostname, port, address, cert_info, timings)
+            # A SQLite commit on the event loop would stall every handshake in flight
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._finish_check, url, hostname, port, address, cert_info, timings
+            )
+            
+        except Exception as e:
+            return self._build_error_result(url, hostname, e)
+    
+    def _backend_key(self, url: str, address: Optional[str]) -> str:
+        """
+        Backend key used by the scheduler for a probe.
+        
+        Args:
+            url (str): URL to check
+            address (Optional[str]): Pre-resolved IP address, if any
+            
+        Returns:
+            str: Backend key from AdaptiveScheduler.backend_key
+        """
+        if address is None:
+            try:
+                address = self._parse_url(url)[0]
+            except Exception:
+                address = url
+        return self.scheduler.backend_key(address)
+    
+    async def _check_scheduled_async(self, url: str, address: Optional[str]) -> Dict:
+        """
+        Check one certificate within the adaptive scheduler's limits.
+        
+        Args:
+            url (str): URL to check
+            address (Optional[str]): Pre-resolved IP address to probe
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        key = self._backend_key(url, address)
+        queued_at = time.monotonic()
+        await self.scheduler.acquire(key)
+        started = time.monotonic()
+        result = None
+        try:
+            result = await self._check_single_certificate_async(url, address, queued_at)
+            return result
+        finally:
+            success = result is not None and result['status'] != 'ERROR'
+            await self.scheduler.release(key, time.monotonic() - started, success)
+    
+    async def _check_certificates_async(self, probes: Iterable[Tuple[str, Optional[str]]], on_result: Callable[[Dict], None]) -> None:
+        """
+        Check certificates for all probes with a bounded number of concurrent handshakes.
+        
+        A fixed set of workers pulls probes from a shared iterator, so only
+        max_concurrency coroutines exist at any time regardless of list size.
+        With the adaptive scheduler enabled, probes are interleaved by backend
+        and each worker waits for the scheduler before connecting.
+        
+        Args:
+            probes (Iterable[Tuple[str, Optional[str]]]): URL and optional pre-resolved address pairs
+            on_result (Callable[[Dict], None]): Called with each result as soon as it completes
+        """
+        import asyncio
+        
+        max_concurrency = self.config.get('max_concurrency', 500)
+        check = self._check_single_certificate_async
+        
+        if self.scheduler is not None:
+            self.scheduler.start_run()
+            probes = self.scheduler.interleave(list(probes), self._backend_key)
+            check = self._check_scheduled_async
+        
+        if self.budget is not None:
+            check = functools.partial(self._check_budgeted_async, check)
+        
+        pending = iter(probes)
+        # Probe each worker is busy with, to report it if the deadline passes
+        slots = [None] * max_concurrency
+        
+        async def worker(slot):
+            for url, address in pending:
+                slots[slot] = (url, address)
+                result = await check(url, address)
+                slots[slot] = None
+                on_result(result)
+        
+        workers = asyncio.gather(*(worker(slot) for slot in range(max_concurrency)))
+        if self.budget is None:
+            await workers
+            return
+        try:
+            await asyncio.wait_for(workers, max(self.budget.remaining(), 0))
+        except asyncio.TimeoutError:
+            stragglers = [probe for probe in slots if probe is not None] + list(pending)
+            for url, address in stragglers:
+                on_result(self._build_timeout_result(url, address))
+    
+    async def _check_budgeted_async(self, check: Callable, url: str, address: Optional[str]) -> Dict:
+        """
+        Run one probe with retries and hedging under the run's budget.
+        
+        A probe still running after the observed 95th percentile gets a
+        second attempt, at another resolved address when there is one, and
+        the first success wins. Failures are retried after a jittered backoff.
+        
+        Args:
+            check (Callable): Coroutine function taking url and address
+            url (str): URL to check
+            address (Optional[str]): Pre-resolved IP address to probe
+            
+        Returns:
+            Dict: Certificate check result
+        """
+        import asyncio
+        
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            tasks = {asyncio.ensure_future(check(url, address))}
+            result = None
+            try:
+                while self.budget.hedge and len(tasks) == 1:
+                    # Until enough probes have completed there is no p95 yet, look again shortly
+                    hedge_after = self.budget.hedge_delay()
+                    elapsed = time.monotonic() - started
+                    done, _ = await asyncio.wait(tasks, timeout=max((hedge_after or elapsed + 0.5) - elapsed, 0))
+                    if done:
+                        break
+                    if hedge_after is not None:
+                        logger.info(f"Hedging slow check of {url}")
+                        tasks.add(asyncio.ensure_future(check(url, self._alternate_address(url, address))))
+                while tasks and (result is None or result['status'] == 'ERROR'):
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    result = min((task.result() for task in done), key=lambda r: r['status'] == 'ERROR')
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            if result['status'] != 'ERROR':
+                self.budget.observe(time.monotonic() - started)
+                return result
+            delay = self.budget.retry_delay(attempt)
+            if delay is None:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    def _check_certificates_threaded(self, probes: Iterable[Tuple[str, Optional[str]]], on_result: Callable[[Dict], None]) -> None:
+        """
+        Check certificates for all probes on a thread pool.
+        
+        Args:
+            probes (Iterable[Tuple[str, Optional[str]]]): URL and optional pre-resolved address pairs
+            on_result (Callable[[Dict], None]): Called with each result as soon as it completes
+        """
+        max_workers = self.config.get('max_workers', 5)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_url = {
+                executor.submit(self._check_single_certificate, url, address, time.monotonic()): url 
+                for url, address in probes
+            }
+            
+            for future in concurrent.futures.as_completed(future_to_url):
+                result = future.result()
+                with self.lock:
+                    on_result(result)
+    
+    def _check_certificates_budgeted(self, probes: Iterable[Tuple[str, Optional[str]]],
+                                     on_result: Callable[[Dict], None]) -> None:
+        """
+        Check certificates on a thread pool within the run's deadline.
+        
+        The calling thread schedules the attempts: it keeps up to max_workers
+        probes in flight, resubmits failed ones after their backoff, hedges
+        attempts that run past the observed 95th percentile, and when the
+        deadline passes reports every unfinished probe as timed out without
+        waiting for it.
+        
+        Args:
+            probes (Iterable[Tuple[str, Optional[str]]]): URL and optional pre-resolved address pairs
+            on_result (Callable[[Dict], None]): Called with each result as soon as it is final
+        """
+        budget = self.budget
+        max_workers = self.config.get('max_workers', 5)
+        pending = collections.deque(probes)
+        # (ready at, sequence, probe) of failed probes waiting for their retry
+        retries = []
+        sequence = itertools.count()
+        # Probes with an attempt in flight, by sequence number
+        active = {}
+        # Attempt future -> (probe, start time)
+        running = {}
+        # Half of the threads are spare for hedged attempts
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers * 2)
+        
+        def launch(probe, address):
+            future = executor.submit(self._check_single_certificate, probe['url'], address, time.monotonic())
+            running[future] = (probe, budget.clock())
+            probe['in_flight'] += 1
+        
+        try:
+            # Attempts that lost to their hedge may still be running, they are not waited for
+            while pending or retries or active:
+                now = budget.clock()
+                if now >= budget.deadline:
+                    break
+                while len(active) < max_workers and (retries and retries[0][0] <= now or pending):
+                    if retries and retries[0][0] <= now:
+                        probe = heapq.heappop(retries)[2]
+                    else:
+                        url, address = pending.popleft()
+                        probe = {'key': next(sequence), 'url': url, 'address': address, 'retries': 0, 'in_flight': 0}
+                    probe['started'], probe['hedged'] = now, False
+                    active[probe['key']] = probe
+                    launch(probe, probe['address'])
+                
+                wake = budget.deadline
+                if retries:
+                    wake = min(wake, retries[0][0])
+                hedge_after = budget.hedge_delay()
+                if hedge_after is not None:
+                    for probe in active.values():
+                        if probe['hedged']:
+                            continue
+                        if probe['started'] + hedge_after <= now:
+                            logger.info(f"Hedging slow check of {probe['url']}")
+                            probe['hedged'] = True
+                            launch(probe, self._alternate_address(probe['url'], probe['address']))
+                        else:
+                            wake = min(wake, probe['started'] + hedge_after)
+                
+                done, _ = concurrent.futures.wait(running, timeout=max(wake - now, 0),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    probe, started = running.pop(future)
+                    probe['in_flight'] -= 1
+                    if probe['key'] not in active:
+                        # The other attempt of this probe already settled it
+                        continue
+                    result = future.result()
+                    if result['status'] != 'ERROR':
+                        budget.observe(budget.clock() - started)
+                    elif probe['in_flight']:
+                        # The hedged attempt may still succeed
+                        continue
+                    else:
+                        delay = budget.retry_delay(probe['retries'])
+                        if delay is not None:
+                            probe['retries'] += 1
+                            del active[probe['key']]
+                            heapq.heappush(retries, (budget.clock() + delay, probe['key'], probe))
+                            continue
+                    del active[probe['key']]
+                    on_result(result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        stragglers = [(probe['url'], probe['address']) for probe in active.values()]
+        stragglers += [(entry[2]['url'], entry[2]['address']) for entry in retries]
+        for url, address in stragglers + list(pending):
+            on_result(self._build_timeout_result(url, address))
+    
+    def _alternate_address(self, url: str, address: Optional[str]) -> Optional[str]:
+        """
+        Address for a hedged attempt: the next resolved address of the host, if any.
+        
+        Args:
+            url (str): URL being checked
+            address (Optional[str]): Address of the slow attempt
+            
+        Returns:
+            Optional[str]: Another address, or the same one when there is no other
+        """
+        if address is None or self.resolver is None or self.config.get('dns', {}).get('probe_all_addresses', False):
+            return address
+        addresses = self.resolver.addresses(self._parse_url(url)[0])
+        if address not in addresses:
+            return address
+        return addresses[(addresses.index(address) + 1) % len(addresses)]
+    
+    def _build_timeout_result(self, url: str, address: Optional[str]) -> Dict:
+        """
+        Build the result of a probe that had not finished when the deadline passed.
+        
+        Args:
+            url (str): URL that was being checked
+            address (Optional[str]): Pre-resolved IP address that was being probed
+            
+        Returns:
+            Dict: Certificate check result with ERROR status
+        """
+        try:
+            hostname = self._parse_url(url)[0]
+        except Exception:
+            hostname = None
+        result = self._build_error_result(
+            url, hostname, TimeoutError(f"Timed out: scan deadline of {self.budget.seconds}s reached")
+        )
+        if address is not None and self.config.get('dns', {}).get('probe_all_addresses', False):
+            result['address'] = address
+        return result
+    
+    def _plan_probes(self, websites: List[str]) -> Tuple[List[Tuple[str, Optional[str]]], List[Dict]]:
+        """
+        Run the DNS resolution stage and turn websites into probes.
+        
+        Without a resolver every URL becomes one probe that resolves its own
+        hostname. With one, all hostnames are resolved concurrently first;
+        unresolvable URLs fail immediately and the rest are probed by IP,
+        either at the first address or at every address when
+        'probe_all_addresses' is enabled.
+        
+        Args:
+            websites (List[str]): URLs to check
+            
+        Returns:
+            Tuple[List[Tuple[str, Optional[str]]], List[Dict]]: Probes to run and results for unresolvable URLs
+        """
+        if self.resolver is None:
+            return [(url, None) for url in websites], []
+        
+        import asyncio
+        
+        parsed = {}
+        for url in websites:
+            try:
+                parsed[url] = self._parse_url(url)
+            except Exception:
+                # Let the probe stage report the parse error
+                parsed[url] = None
+        
+        hosts = [target for target in parsed.values() if target is not None]
+        addresses = asyncio.run(self.resolver.resolve_all(hosts))
+        probe_all = self.config.get('dns', {}).get('probe_all_addresses', False)
+        
+        probes = []
+        failures = []
+        for url, target in parsed.items():
+            if target is None:
+                probes.append((url, None))
+                continue
+            
+            resolved = addresses.get(target[0], [])
+            if not resolved:
+                result = self._build_result(url, target[0], None)
+                result['error'] = f"DNS resolution failed: {self.resolver.errors.get(target[0], 'no addresses')}"
+                failures.append(result)
+            elif probe_all:
+                probes.extend((url, address) for address in resolved)
+            else:
+                probes.append((url, resolved[0]))
+        
+        logger.info(f"Resolved {len(addresses)} unique hostnames into {len(probes)} probes")
+        return probes, failures
+    
+    def _update_cache(self, hostname: str, port: int, cert_info: Optional[Dict]) -> None:
+        """
+        Record a successful probe in the result cache, if enabled.
+        
+        A failed cache write is logged and never replaces the probe's result.
+        
+        Args:
+            hostname (str): Hostname that was checked
+            port (int): Port that was checked
+            cert_info (Optional[Dict]): Certificate information or None if retrieval failed
+        """
+        if self.cache is None or cert_info is None:
+            return
+        expiry_date = self._effective_expiry(cert_info)
+        try:
+            self.cache.put(f"{hostname}:{port}", int(expiry_date.timestamp()),
+                           cert_info.get('fingerprint'), int(time.time()))
+        except sqlite3.Error as e:
+            # The probe succeeded; a cache write failure only costs a handshake next run
+            logger.warning(f"Could not cache certificate for {hostname}:{port}: {e}")
+    
+    def _is_cache_entry_fresh(self, entry: Dict, now: float) -> bool:
+        """
+        Decide whether a cached certificate can be reused instead of probing.
+        
+        An entry is reused only if it is younger than 'max_age_hours' and its
+        status cannot cross a threshold before the next scheduled run.
+        
+        Args:
+            entry (Dict): Cache entry from ResultCache.get
+            now (float): Current time as epoch seconds
+            
+        Returns:
+            bool: True if the cached entry can be used
+        """
+        cache_config = self.config.get('cache', {})
+        max_age = cache_config.get('max_age_hours', 168) * 3600
+        run_interval = cache_config.get('run_interval_hours', 24) * 3600
+        
+        if now - entry['checked_at'] > max_age:
+            return False
+        
+        days_now = int((entry['not_after'] - now) // 86400)
+        days_next_run = int((entry['not_after'] - now - run_interval) // 86400)
+        return self._determine_status(days_now) == self._determine_status(days_next_run)
+    
+    def _partition_cached(self, websites: List[str], force_refresh: bool) -> Tuple[List[str], List[Dict]]:
+        """
+        Split websites into those that need a probe and results served from the cache.
+        
+        Args:
+            websites (List[str]): URLs to check
+            force_refresh (bool): Ignore the cache and probe every URL
+            
+        Returns:
+            Tuple[List[str], List[Dict]]: URLs to probe and results built from cache entries
+        """
+        if self.cache is None or force_refresh:
+            return websites, []
+        
+        now = self.reference_time if self.reference_time is not None else time.time()
+        to_probe = []
+        cached_results = []
+        
+        for url in websites:
+            try:
+                hostname, port = self._parse_url(url)
+                entry = self.cache.get(f"{hostname}:{port}")
+            except Exception:
+                entry = None
+            
+            if entry is not None and self._is_cache_entry_fresh(entry, now):
+                expiry_date = datetime.fromtimestamp(entry['not_after'], timezone.utc)
+                result = self._build_expiry_result(url, hostname, expiry_date)
+                if entry['fingerprint']:
+                    result['fingerprint'] = entry['fingerprint']
+                cached_results.append(result)
+            else:
+                to_probe.append(url)
+        
+        logger.info(f"Reusing {len(cached_results)} cached certificates, probing {len(to_probe)}")
+        return to_probe, cached_results
+    
+    def _validate_engine(self) -> str:
+        """
+        Return the configured scan engine.
+        
+        Returns:
+            str: 'threads' or 'asyncio'
+            
+        Raises:
+            ValueError: If the configured engine is unknown
+        """
+        engine = self.config.get('engine', 'threads')
+        if engine not in ('threads', 'asyncio'):
+            logger.error(f"Unknown scan engine: {engine}")
+            raise ValueError(f"Unknown scan engine: {engine}")
+        return engine
+    
+    def _recorder(self, on_result: Callable[[Dict], None]) -> Callable[[Dict], None]:
+        """
+        Wrap a result callback so every result is also counted in the metrics and kept in the history.
+        
+        Args:
+            on_result (Callable[[Dict], None]): Called with each result after it is recorded
+            
+        Returns:
+            Callable[[Dict], None]: Callback to hand each result to
+        """
+        observed_at = self.reference_time if self.reference_time is not None else time.time()
+        
+        def record(result):
+            self.metrics.observe(result)
+            if self.history is not None:
+                try:
+                    self.history.record(result, observed_at)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not record {result['url']} in history: {e}")
+            on_result(result)
+        
+        return record
+    
+    def _scan(self, websites: List[str], force_refresh: bool, on_result: Callable[[Dict], None]) -> None:
+        """
+        Run the cache, DNS and probe stages for a batch of websites.
+        
+        Args:
+            websites (List[str]): URLs to check
+            force_refresh (bool): Probe every URL even if a cached result is fresh
+            on_result (Callable[[Dict], None]): Called with each result as soon as it is known
+        """
+        engine = self._validate_engine()
+        record = self._recorder(on_result)
+        
+        to_probe, cached = self._partition_cached(websites, force_refresh)
+        probes, failures = self._plan_probes(to_probe)
+        for result in cached + failures:
+            record(result)
+        
+        if self.config.get('consolidate', {}).get('enabled', False):
+            self._run_consolidated(engine, probes, record)
+        else:
+            self._run_probes(engine, probes, record)
+        
+        if self.cache is not None:
+            self.cache.commit()
+        if self.history is not None:
+            self.history.commit()
     
-    def __init__(self, config_file: str = 'config.json'):
+    def _run_probes(self, engine: str, probes: List[Tuple[str, Optional[str]]], on_result: Callable[[Dict], None]) -> None:
         """
-        Initialize the CertificateChecker with configuration.
+        Run probes on the selected scan engine.
         
         Args:
-            config_file (str): Path to the configuration file
+            engine (str): 'threads' or 'asyncio'
+            probes (List[Tuple[str, Optional[str]]]): URL and pre-resolved address pairs
+            on_result (Callable[[Dict], None]): Called with each result as soon as it is known
         """
-        self.config = self._load_config(config_file)
-        self.results = []
-        self.lock = threading.Lock()
-        # Get thresholds from config or use defaults
-        self.thresholds = self.config.get('thresholds', {'critical': 7, 'warning': 30})
+        if not probes:
+            return
+        if engine == 'asyncio':
+            import asyncio
+            asyncio.run(self._check_certificates_async(probes, on_result))
+        elif self.budget is not None:
+            self._check_certificates_budgeted(probes, on_result)
+        else:
+            self._check_certificates_threaded(probes, on_result)
     
-    def _load_config(self, config_file: str) -> Dict:
+    def _group_probes(self, probes: List[Tuple[str, Optional[str]]]) -> Dict[Tuple, List[Tuple[str, Optional[str]]]]:
         """
-        Load configuration from JSON file.
+        Group probes that reach the same endpoint.
+        
+        The endpoint is the pre-resolved address and port when the DNS stage
+        ran, otherwise the hostname and port.
         
         Args:
-            config_file (str): Path to the configuration file
+            probes (List[Tuple[str, Optional[str]]]): URL and pre-resolved address pairs
             
         Returns:
-            Dict: Configuration dictionary
+            Dict[Tuple, List[Tuple[str, Optional[str]]]]: Probes per endpoint, in input order
+        """
+        groups = {}
+        for url, address in probes:
+            try:
+                hostname, port = self._parse_url(url)
+                key = (address or hostname, port)
+            except Exception:
+                # Let the probe stage report the parse error
+                key = (url, address)
+            groups.setdefault(key, []).append((url, address))
+        return groups
+    
+    def _run_consolidated(self, engine: str, probes: List[Tuple[str, Optional[str]]],
+                          on_result: Callable[[Dict], None]) -> None:
+        """
+        Handshake once per endpoint and share the certificate between URLs it covers.
+        
+        The first URL of each endpoint is probed. Every other URL on that
+        endpoint with the same hostname gets its result from that
+        certificate, marked with 'consolidated_with'. This assumes that one
+        hostname and port serve the same certificate to every request,
+        whatever the URL path. With 'share_by_san' enabled, URLs whose
+        hostname is covered by the certificate's SANs share it as well, which
+        additionally assumes the endpoint does not select between overlapping
+        certificates by SNI. URLs that are not shared, or whose endpoint
+        failed, are then probed individually.
+        
+        Args:
+            engine (str): 'threads' or 'asyncio'
+            probes (List[Tuple[str, Optional[str]]]): URL and pre-resolved address pairs
+            on_result (Callable[[Dict], None]): Called with each result as soon as it is known
+        """
+        groups = list(self._group_probes(probes).values())
+        probe_all = self.config.get('dns', {}).get('probe_all_addresses', False)
+        share_by_san = self.config.get('consolidate', {}).get('share_by_san', False)
+        
+        self._probed_certificates = {}
+        try:
+            self._run_probes(engine, [group[0] for group in groups], on_result)
+            
+            remaining = []
+            for group in groups:
+                cert_info = self._probed_certificates.get(group[0])
+                probed_hostname = self._parse_url(group[0][0])[0] if len(group) > 1 else None
+                for url, address in group[1:]:
+                    hostname, port = self._parse_url(url)
+                    # The same hostname gets the same certificate; another one only if SAN sharing is trusted
+                    if cert_info is None or (hostname != probed_hostname
+                                             and not (share_by_san and certificate_covers(cert_info, hostname))):
+                        remaining.append((url, address))
+                        continue
+                    result = self._build_result(url, hostname, cert_info)
+                    if address is not None and probe_all:
+                        result['address'] = address
+                    result['consolidated_with'] = group[0][0]
+                    self._update_cache(hostname, port, cert_info)
+                    on_result(result)
+            
+            self._run_probes(engine, remaining, on_result)
+        finally:
+            self._probed_certificates = None
+        
+        logger.info(f"Consolidated {len(probes)} probes into {len(groups) + len(remaining)} handshakes "
+                    f"across {len(groups)} endpoints")
+    
+    def _sort_key(self, result: Dict) -> int:
+        """
+        Sort key ordering results by urgency (expired first, errors last).
+        
+        Args:
+            result (Dict): Certificate check result
+            
+        Returns:
+            int: Days until expiry, or UNKNOWN_DAYS if unknown
+        """
+        days = result['days_until_expiry']
+        return days if type(days) is int else UNKNOWN_DAYS
+    
+    def check_certificates(self, force_refresh: bool = False, shard: Optional[Tuple[int, int]] = None,
+                           on_result: Optional[Callable[[Dict], None]] = None) -> ResultStore:
+        """
+        Check certificates for all URLs in the configuration.
+        
+        The scan engine is selected with the 'engine' config key: 'threads'
+        (default) or 'asyncio'. Both return the same result dictionaries.
+        When the cache is enabled, URLs whose status cannot change before
+        the next run are answered from the cache without a handshake. When
+        the 'dns' stage is enabled, hostnames are resolved up front. With
+        'checkpoint' enabled, results are journaled as they complete and an
+        interrupted scan resumes where it stopped.
+        
+        Args:
+            force_refresh (bool): Probe every URL even if a cached result is fresh
+            shard (Optional[Tuple[int, int]]): Shard index and shard count; only URLs
+                assigned to that shard by shard_index are checked
+            on_result (Optional[Callable[[Dict], None]]): Called with every result as it
+                completes, e.g. a streaming renderer's write
+        
+        Returns:
+            ResultStore: Certificate check results sorted by urgency
             
         Raises:
-            FileNotFoundError: If config file doesn't exist
-            json.JSONDecodeError: If config file is invalid JSON
+            ValueError: If the configured engine is unknown
         """
+        websites = self.config.get('websites', [])
+        
+        if shard is not None:
+            index, count = shard
+            websites = [url for url in websites if shard_index(url, count) == index]
+            logger.info(f"Shard {index + 1}/{count} has {len(websites)} websites")
+        
+        # Certificate files are scanned once, by the first shard
+        scan_files = self.config.get('files', {}).get('enabled', False) and (shard is None or shard[0] == 0)
+        if not websites and not scan_files:
+            logger.warning("No websites found in configuration")
+            return ResultStore()
+        
+        engine = self._validate_engine()
+        logger.info(f"Starting certificate checks for {len(websites)} websites using {engine} engine")
+        self.reference_time = time.time()
+        self.budget = self._create_budget()
+        
+        started = time.monotonic()
+        results = ResultStore()
+        listener = on_result
+        checkpoint = self._open_checkpoint(shard)
+        if checkpoint is not None:
+            wanted = set(websites)
+            resumed = [result for result in checkpoint.open() if result['url'] in wanted]
+            done = {result['url'] for result in resumed}
+            websites = [url for url in websites if url not in done]
+            results.extend(resumed)
+            # Resumed results were classified at an earlier time
+            results.reclassify(self.reference_time, self.thresholds)
+            if listener is not None:
+                for result in results:
+                    listener(result)
+        
+        def on_result(result):
+            results.append(result)
+            if checkpoint is not None:
+                checkpoint.record(result)
+            if listener is not None:
+                listener(result)
+        
+        if checkpoint is None and listener is None:
+            on_result = results.append
+        
         try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                logger.info(f"Configuration loaded from {config_file}")
-                return config
-        except FileNotFoundError:
-            logger.error(f"Configuration file {config_file} not found")
-            raise
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in configuration file: {e}")
-            raise
+            if scan_files:
+                record = self._recorder(on_result)
+                for result in self.check_files():
+                    record(result)
+            self._scan(websites, force_refresh, on_result)
+        finally:
+            self.budget = None
+            if checkpoint is not None:
+                checkpoint.close()
+        if checkpoint is not None:
+            checkpoint.finish()
+        self.metrics.observe_scan(time.monotonic() - started, len(results))
+        self.export_metrics()
+        
+        # Sort results by days until expiry (expired first, then by urgency)
+        results.sort_by_urgency()
+        
+        self.results = results
+        logger.info(f"Certificate checks completed for {len(results)} websites")
+        return results
     
-    def _parse_url(self, url: str) -> Tuple[str, int]:
+    def check_files(self) -> List[Dict]:
         """
-        Parse URL to extract hostname and port.
+        Check the certificates stored in files under the 'files' paths.
+        
+        Files whose mtime and size match the index are not read again;
+        changed files are parsed in a process pool when there are enough
+        of them. Every certificate of a bundle gets its own result, with
+        'file://' URLs numbered '#1', '#2'... for bundles, classified with
+        the same thresholds as network results.
+        
+        Returns:
+            List[Dict]: Certificate check results
+        """
+        files_config = self.config.get('files', {})
+        patterns = files_config.get('patterns', ['*.pem', '*.crt', '*.cer', '*.der'])
+        found = {path: (stat.st_mtime_ns, stat.st_size)
+                 for path, stat in find_certificate_files(files_config.get('paths', []), patterns)}
+        
+        index = CertificateFileIndex(files_config.get('index', 'cert_file_index.db'))
+        try:
+            indexed = index.load()
+            changed = [path for path, key in found.items() if indexed.get(path, (None, None))[:2] != key]
+            workers = files_config.get('workers') or os.cpu_count() or 1
+            # Starting worker processes only pays off for a larger batch
+            if workers > 1 and len(changed) >= 8 * workers:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                    parsed = dict(zip(changed, executor.map(read_certificate_file, changed, chunksize=32)))
+            else:
+                parsed = {path: read_certificate_file(path) for path in changed}
+            for path, entry in parsed.items():
+                index.put(path, *found[path], entry)
+            index.remove(path for path in indexed if path not in found)
+        finally:
+            index.close()
+        logger.info(f"Found {len(found)} certificate files, parsed {len(changed)} new or changed")
+        
+        results = []
+        for path in sorted(found):
+            entry = parsed[path] if path in parsed else json.loads(indexed[path][2])
+            url = f"file://{path}"
+            if entry['error'] is not None:
+                results.append(self._build_error_result(url, path, ValueError(entry['error'])))
+                continue
+            certificates = entry['certificates']
+            if not certificates:
+                # Private keys and other PEM files without a certificate block
+                logger.debug(f"No certificate in {path}, skipped", extra={'host': path})
+            for number, certificate in enumerate(certificates, 1):
+                expiry_date = datetime.fromtimestamp(ResultStore.expiry_seconds(certificate['not_after']), timezone.utc)
+                result = self._build_expiry_result(url if len(certificates) == 1 else f"{url}#{number}",
+                                                   certificate['hostname'], expiry_date)
+                result['fingerprint'] = certificate['fingerprint']
+                results.append(result)
+        return results
+    
+    def _create_budget(self) -> Optional[ProbeBudget]:
+        """
+        Start the deadline budget for a scan, if enabled.
+        
+        Returns:
+            Optional[ProbeBudget]: Budget, or None if 'deadline' is disabled
+        """
+        deadline_config = self.config.get('deadline', {})
+        if not deadline_config.get('enabled', False):
+            return None
+        return ProbeBudget(
+            deadline_config.get('seconds', 300),
+            retries=deadline_config.get('retries', 2),
+            backoff=deadline_config.get('backoff_seconds', 1.0),
+            hedge=deadline_config.get('hedge', True),
+            min_samples=deadline_config.get('hedge_min_samples', 20)
+        )
+    
+    def _open_checkpoint(self, shard: Optional[Tuple[int, int]] = None) -> Optional[ScanCheckpoint]:
+        """
+        Create the checkpoint journal for a scan, if enabled.
         
         Args:
-            url (str): URL to parse
+            shard (Optional[Tuple[int, int]]): Shard index and count; each shard keeps its own journal
             
         Returns:
-            Tuple[str, int]: Hostname and port
+            Optional[ScanCheckpoint]: Checkpoint, or None if 'checkpoint' is disabled
         """
-        parsed = urlparse(url)
-        hostname = parsed.hostname or parsed.netloc
-        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
-        return hostname, port
+        checkpoint_config = self.config.get('checkpoint', {})
+        if not checkpoint_config.get('enabled', False):
+            return None
+        path = checkpoint_config.get('path', 'cert_checkpoint.jsonl')
+        if shard is not None:
+            root, extension = os.path.splitext(path)
+            path = f"{root}.shard-{shard[0] + 1}-of-{shard[1]}{extension}"
+        return ScanCheckpoint(path, checkpoint_config.get('window_hours', 24) * 3600)
     
-    def _get_certificate_info(self, hostname: str, port: int, timeout: int) -> Optional[Dict]:
+    def stream_certificates(self, targets: Iterable[str], output: TextIO, top_n: int = 20,
+                            force_refresh: bool = False) -> Tuple[List[Dict], Dict[str, int]]:
         """
-        Retrieve SSL certificate information for a given hostname and port.
+        Check certificates for a stream of URLs, writing results as JSON Lines.
+        
+        Targets are consumed in chunks of 'stream_chunk_size' so memory stays
+        flat however long the inventory is. Each result is written to output
+        as soon as it completes. Only per-status counts and a bounded heap
+        of the top_n most urgent results are kept for reporting.
         
         Args:
-            hostname (str): The hostname to check
-            port (int): The port to connect to
-            timeout (int): Connection timeout in seconds
+            targets (Iterable[str]): URLs to check, e.g. from read_targets
+            output (TextIO): Destination for one JSON object per line
+            top_n (int): Number of most urgent results to keep, 0 to keep none
+            force_refresh (bool): Probe every URL even if a cached result is fresh
             
         Returns:
-            Optional[Dict]: Certificate information or None if failed
+            Tuple[List[Dict], Dict[str, int]]: Most urgent results sorted by urgency and counts per status
+        """
+        self._validate_engine()
+        chunk_size = self.config.get('stream_chunk_size', 10000)
+        self.reference_time = time.time()
+        counts = dict.fromkeys(['OK', 'WARNING', 'CRITICAL', 'EXPIRED', 'ERROR'], 0)
+        # Max-heap on urgency (negated key) so the least urgent entry is evicted first
+        heap = []
+        sequence = itertools.count()
+        
+        def on_result(result):
+            output.write(json.dumps(result, default=str) + '\n')
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            if top_n > 0:
+                entry = (-self._sort_key(result), next(sequence), result)
+                if len(heap) < top_n:
+                    heapq.heappush(heap, entry)
+                else:
+                    heapq.heappushpop(heap, entry)
+        
+        started = time.monotonic()
+        targets = iter(targets)
+        self.budget = self._create_budget()
+        try:
+            while True:
+                chunk = list(itertools.islice(targets, chunk_size))
+                if not chunk:
+                    break
+                logger.info(f"Streaming certificate checks for {len(chunk)} websites")
+                self._scan(chunk, force_refresh, on_result)
+                output.flush()
+        finally:
+            self.budget = None
+        
+        self.metrics.observe_scan(time.monotonic() - started, sum(counts.values()))
+        self.export_metrics()
+        
+        top_results = [entry[2] for entry in sorted(heap, key=lambda entry: (-entry[0], entry[1]))]
+        logger.info(f"Streaming certificate checks completed for {sum(counts.values())} websites")
+        return top_results, counts
+    
+    def export_metrics(self) -> None:
         """
+        Write the Prometheus textfile if one is configured.
+        """
+        metrics_config = self.config.get('metrics', {})
+        if not metrics_config.get('enabled', False) or not metrics_config.get('textfile'):
+            return
         try:
-            # Create SSL context
-            context = ssl.create_default_context()
+            self.metrics.write_textfile(metrics_config['textfile'])
+        except OSError as e:
+            logger.error(f"Error writing metrics file: {e}")
+    
+    def start_metrics_server(self) -> bool:
+        """
+        Start the /metrics HTTP endpoint if a port is configured.
+        
+        Returns:
+            bool: True if the endpoint was started
+        """
+        metrics_config = self.config.get('metrics', {})
+        if not metrics_config.get('enabled', False) or metrics_config.get('http_port') is None:
+            return False
+        self.metrics.serve(metrics_config['http_port'], metrics_config.get('http_host', '0.0.0.0'))
+        return True
+    
+    def create_renderer(self, stream: TextIO = None, changes: bool = False) -> ResultRenderer:
+        """
+        Create the console renderer selected by 'output_format'.
+        
+        Args:
+            stream (TextIO): Destination, sys.stdout if None
+            changes (bool): Render the entries returned by compute_changes instead of results
             
-            # Connect to the server and get certificate
-            with socket.create_connection((hostname, port), timeout=timeout) as sock:
-                with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-                    cert = ssock.getpeercert()
-                    
-            return cert
+        Returns:
+            ResultRenderer: Renderer for 'table' (default), 'csv', 'jsonl' or 'summary'
+            
+        Raises:
+            ValueError: If the configured output format is unknown
+        """
+        output_format = self.config.get('output_format', 'table')
+        renderers = CHANGE_RENDERERS if changes else RENDERERS
+        if output_format not in renderers:
+            logger.error(f"Unknown output format: {output_format}")
+            raise ValueError(f"Unknown output format: {output_format}")
+        return renderers[output_format](self.thresholds, stream)
+    
+    def display_results(self, results: List[Dict], counts: Optional[Dict[str, int]] = None,
+                        renderer: Optional[ResultRenderer] = None) -> None:
+        """
+        Display certificate check results in the configured output format.
+        
+        Args:
+            results (List[Dict]): Certificate check results
+            counts (Optional[Dict[str, int]]): Per-status totals when results is only
+                the most urgent subset, as returned by stream_certificates
+            renderer (Optional[ResultRenderer]): Streaming renderer that was already fed
+                every result during the scan; only its summary is completed
+        """
+        if counts is None:
+            counts = status_counts(results)
+        if renderer is None:
+            renderer = self.create_renderer()
+            # The summary format never looks at individual rows
+            if not isinstance(renderer, SummaryRenderer):
+                for result in results:
+                    renderer.write(result)
+        renderer.finish(counts)
+    
+    def display_changes(self, changes: List[Dict], counts: Dict[str, int]) -> None:
+        """
+        Display only the certificates that changed since the previous run, in the configured output format.
+        
+        Args:
+            changes (List[Dict]): Changed results, as returned by compute_changes
+            counts (Dict[str, int]): Per-status totals of the whole run
+        """
+        renderer = self.create_renderer(changes=True)
+        for change in changes:
+            renderer.write(change)
+        renderer.finish(counts)
+    
+    def send_slack_webhook_alert(self, results: List[Dict], checked: Optional[int] = None) -> bool:
+        """
+        Send Slack webhook alert for critical certificates.
+        
+        Delivery is handled by a SlackAlertDispatcher that is kept for the
+        lifetime of the checker, so its connection pool and deduplication
+        state are reused across daemon batches.
+        
+        Args:
+            results (List[Dict]): Certificate check results
+            checked (Optional[int]): Number of certificates checked, when results
+                is only the changed subset
+            
+        Returns:
+            bool: True if webhook sent successfully
+        """
+        webhook_config = self.config.get('slack_webhook', {})
+        
+        if not webhook_config.get('enabled', False):
+            logger.info("Slack webhook alerting is disabled")
+            return False
+        
+        if self._slack_dispatcher is None:
+            self._slack_dispatcher = SlackAlertDispatcher(webhook_config)
+        else:
+            self._slack_dispatcher.webhook_config = webhook_config
+        
+        try:
+            return self._slack_dispatcher.send(results, self.thresholds, checked)
+        except Exception as e:
+            logger.error(f"Unexpected error sending Slack webhook: {e}")
+            return False
+    
+    def save_results_to_file(self, results: List[Dict], filename: str = 'cert_results.json') -> None:
+        """
+        Save results to a JSON file.
+        
+        Args:
+            results (List[Dict]): Certificate check results
+            filename (str): Output filename
+        """
+        try:
+            output_data = {
+                'timestamp': datetime.now().isoformat(),
+                'total_checked': len(results),
+                'thresholds': self.thresholds,
+                'results': list(results)
+            }
+            
+            with open(filename, 'w') as f:
+                json.dump(output_data, f, indent=2, default=str)
+            
+            logger.info(f"Results saved to {filename}")
             
-        except socket.timeout:
-            logger.error(f"Timeout connecting to {hostname}:{port}")
-            return None
-        except socket.gaierror as e:
-            logger.error(f"DNS resolution failed for {hostname}: {e}")
-            return None
-        except ssl.SSLError as e:
-            logger.error(f"SSL error for {hostname}: {e}")
-            return None
         except Exception as e:
-            logger.error(f"Unexpected error for {hostname}: {e}")
+            logger.error(f"Error saving results to file: {e}")
+    
+    def load_previous_results(self, filename: str = 'cert_results.json') -> Optional[List[Dict]]:
+        """
+        Load the results saved by the previous run.
+        
+        Args:
+            filename (str): Result file in the save_results_to_file format
+            
+        Returns:
+            Optional[List[Dict]]: Previous results, or None if there is no usable snapshot
+        """
+        try:
+            with open(filename, 'r') as f:
+                return json.load(f)['results']
+        except FileNotFoundError:
+            logger.info(f"No previous results in {filename}, every certificate is reported as new")
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring invalid previous results in {filename}: {e}")
+        return None
+    
+    def compute_changes(self, previous: Optional[List[Dict]], current: List[Dict]) -> List[Dict]:
+        """
+        Compare results with a previous snapshot and keep only what changed.
+        
+        Results are matched by URL (and address when every address is
+        probed). Each change is the current result with a 'change' key:
+        'added', 'new_error', 'recovered', 'renewed' (new expiry date),
+        'status_changed' or 'removed', plus the previous status and
+        expiry date. Removed entries carry their last known result.
+        
+        Args:
+            previous (Optional[List[Dict]]): Results of the previous run
+            current (List[Dict]): Results of this run
+            
+        Returns:
+            List[Dict]: Changed results sorted by urgency
+        """
+        index = {(r['url'], r.get('address')): r for r in previous or []}
+        changes = []
+        
+        for result in current:
+            before = index.pop((result['url'], result.get('address')), None)
+            if before is None:
+                change = 'added'
+            elif result['status'] == 'ERROR' and before['status'] != 'ERROR':
+                change = 'new_error'
+            elif before['status'] == 'ERROR' and result['status'] != 'ERROR':
+                change = 'recovered'
+            elif result['expiry_date'] != before['expiry_date']:
+                change = 'renewed'
+            elif result['status'] != before['status']:
+                change = 'status_changed'
+            else:
+                continue
+            changes.append(dict(result, change=change,
+                                previous_status=before['status'] if before else None,
+                                previous_expiry_date=before['expiry_date'] if before else None))
+        
+        for before in index.values():
+            changes.append(dict(before, change='removed',
+                                previous_status=before['status'],
+                                previous_expiry_date=before['expiry_date']))
+        
+        changes.sort(key=self._sort_key)
+        logger.info(f"{len(changes)} of {len(current)} results changed since the previous run")
+        return changes
+    
+    def merge_results(self, filenames: List[str]) -> ResultStore:
+        """
+        Combine partial result files written by shard runs.
+        
+        Days until expiry and statuses are recomputed from one reference
+        time, since shards finish at different moments.
+        
+        Args:
+            filenames (List[str]): Result files in the save_results_to_file format
+            
+        Returns:
+            ResultStore: All results sorted by urgency
+            
+        Raises:
+            FileNotFoundError: If a partial result file is missing
+            json.JSONDecodeError: If a partial result file is invalid JSON
+        """
+        results = ResultStore()
+        for filename in filenames:
+            with open(filename, 'r') as f:
+                partial = json.load(f)
+            results.extend(partial['results'])
+            logger.info(f"Merged {len(partial['results'])} results from {filename}")
+        
+        # Shards finish at different times, count their days from one instant
+        self.reference_time = time.time()
+        results.reclassify(self.reference_time, self.thresholds)
+        results.sort_by_urgency()
+        self.results = results
+        return results
+
+def shard_index(url: str, shard_count: int) -> int:
+    """
+    Assign a URL to a shard using a hash that is stable across processes and machines.
+    
+    Args:
+        url (str): URL to assign
+        shard_count (int): Total number of shards
+        
+    Returns:
+        int: Shard index in range(shard_count)
+    """
+    digest = hashlib.sha1(url.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+def shard_filename(index: int, count: int) -> str:
+    """
+    Name of the partial result file written by one shard.
+    
+    Args:
+        index (int): Zero-based shard index
+        count (int): Total number of shards
+        
+    Returns:
+        str: Partial result filename
+    """
+    return f"cert_results.shard-{index + 1}-of-{count}.json"
+
+def run_shard(config_file: str, index: int, count: int, force_refresh: bool = False) -> str:
+    """
+    Scan one shard and write its partial result file.
+    
+    Used both by --shard (one container per shard) and as the worker
+    function for --workers (one process per shard).
+    
+    Args:
+        config_file (str): Path to the configuration file
+        index (int): Zero-based shard index
+        count (int): Total number of shards
+        force_refresh (bool): Probe every URL even if a cached result is fresh
+        
+    Returns:
+        str: Path of the partial result file
+    """
+    checker = CertificateChecker(config_file)
+    results = checker.check_certificates(force_refresh=force_refresh, shard=(index, count))
+    filename = shard_filename(index, count)
+    checker.save_results_to_file(results, filename)
+    return filename
+
+def run_sharded(checker: 'CertificateChecker', workers: int, force_refresh: bool = False) -> ResultStore:
+    """
+    Scan all shards in parallel worker processes and merge their partial results.
+    
+    Args:
+        checker (CertificateChecker): Checker whose configuration is scanned
+        workers (int): Number of shards and worker processes
+        force_refresh (bool): Probe every URL even if a cached result is fresh
+        
+    Returns:
+        ResultStore: Merged results sorted by urgency
+    """
+    logger.info(f"Starting sharded scan with {workers} worker processes")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_shard, checker.config_file, index, workers, force_refresh)
+            for index in range(workers)
+        ]
+        filenames = [future.result() for future in futures]
+    return checker.merge_results(filenames)
+
+class CertificateDaemon:
+    """
+    Keeps a CertificateChecker resident and rechecks each website when it is due.
+    
+    Websites sit in a priority queue keyed by their next due time. The delay
+    until the next check is half the time left before the certificate can
+    cross its next threshold, clamped between a minimum and maximum
+    interval, so certificates close to a threshold are rechecked often and
+    far-off ones rarely. The first pass and every later interval are spread
+    out with jitter so the load is even over the day rather than one spike.
+    """
+    
+    def __init__(self, checker: 'CertificateChecker', clock: Callable[[], float] = time.time):
+        """
+        Initialize the daemon.
+        
+        Args:
+            checker (CertificateChecker): Checker to keep resident
+            clock (Callable[[], float]): Source of the current time as epoch seconds
+        """
+        self.checker = checker
+        self.clock = clock
+        self.queue = []
+        self.due = {}
+        self.latest = {}
+        self._config_mtime = self._read_config_mtime()
+        self._stop = threading.Event()
+        self._sync_targets(self.clock())
+    
+    def _settings(self) -> Dict:
+        """
+        Return the 'daemon' config section with defaults applied.
+        
+        Returns:
+            Dict: Scheduling settings in seconds
+        """
+        daemon_config = self.checker.config.get('daemon', {})
+        return {
+            'min_interval': daemon_config.get('min_interval_minutes', 60) * 60,
+            'max_interval': daemon_config.get('max_interval_hours', 24) * 3600,
+            'error_interval': daemon_config.get('error_interval_minutes', 30) * 60,
+            'initial_spread': daemon_config.get('initial_spread_minutes', 60) * 60,
+            'jitter': daemon_config.get('jitter', 0.1),
+            'reload_check': daemon_config.get('reload_check_seconds', 30),
+            'max_batch': daemon_config.get('max_batch', 500)
+        }
+    
+    def _read_config_mtime(self) -> Optional[float]:
+        """
+        Return the modification time of the configuration file.
+        
+        Returns:
+            Optional[float]: mtime, or None if the file cannot be read
+        """
+        try:
+            return os.stat(self.checker.config_file).st_mtime
+        except OSError:
             return None
     
-    def _parse_certificate_date(self, date_string: str) -> datetime:
+    def _schedule(self, url: str, due: float) -> None:
         """
-        Parse certificate date string to datetime object.
+        Set the next due time of a website.
         
         Args:
-            date_string (str): Date string from certificate
-            
-        Returns:
-            datetime: Parsed datetime object
+            url (str): Website URL
+            due (float): Epoch seconds when it should be checked
         """
-        return datetime.strptime(date_string, '%b %d %H:%M:%S %Y %Z').replace(tzinfo=timezone.utc)
+        self.due[url] = due
+        heapq.heappush(self.queue, (due, url))
     
-    def _calculate_days_until_expiry(self, expiry_date: datetime) -> int:
+    def _sync_targets(self, now: float) -> None:
         """
-        Calculate days until certificate expires.
+        Reconcile the queue with the websites in the current configuration.
+        
+        New websites are spread evenly over the initial spread window. Removed
+        websites are dropped from the due table; their stale queue entries are
+        skipped when popped.
         
         Args:
-            expiry_date (datetime): Certificate expiry date
-            
-        Returns:
-            int: Days until expiry (negative if already expired)
+            now (float): Current time as epoch seconds
         """
-        now = datetime.now(timezone.utc)
-        delta = expiry_date - now
-        return delta.days
+        websites = self.checker.config.get('websites', [])
+        removed = set(self.due) - set(websites)
+        for url in removed:
+            del self.due[url]
+        self.latest = {key: result for key, result in self.latest.items() if key[0] not in removed}
+        
+        added = [url for url in websites if url not in self.due]
+        spread = self._settings()['initial_spread']
+        for index, url in enumerate(added):
+            self._schedule(url, now + spread * index / len(added))
+        
+        if added or removed:
+            logger.info(f"Daemon tracking {len(self.due)} websites ({len(added)} added, {len(removed)} removed)")
     
-    def _determine_status(self, days_until_expiry: int) -> str:
+    def _reload_if_changed(self, now: float) -> bool:
         """
-        Determine status based on configurable thresholds.
+        Reload the configuration if its file has changed since the last check.
         
         Args:
-            days_until_expiry (int): Days until expiry
+            now (float): Current time as epoch seconds
             
         Returns:
-            str: Status (CRITICAL, WARNING, OK, EXPIRED)
+            bool: True if the configuration was reloaded
         """
-        if days_until_expiry < 0:
-            return 'EXPIRED'
-        elif days_until_expiry <= self.thresholds['critical']:
-            return 'CRITICAL'
-        elif days_until_expiry <= self.thresholds['warning']:
-            return 'WARNING'
-        else:
-            return 'OK'
+        mtime = self._read_config_mtime()
+        if mtime is None or mtime == self._config_mtime:
+            return False
+        try:
+            self.checker.reload_config()
+        except (OSError, json.JSONDecodeError, ValueError, sqlite3.Error) as e:
+            logger.error(f"Keeping previous configuration, reload failed: {e}")
+            return False
+        finally:
+            self._config_mtime = mtime
+        logger.info("Configuration changed, reloaded without restart")
+        self._sync_targets(now)
+        return True
     
-    def _check_single_certificate(self, url: str) -> Dict:
+    def next_check_delay(self, result: Dict) -> float:
         """
-        Check certificate for a single URL.
+        Compute how long to wait before checking a website again.
         
         Args:
-            url (str): URL to check
+            result (Dict): Latest certificate check result for the website
             
         Returns:
-            Dict: Certificate check result
+            float: Delay in seconds, before jitter
         """
-        logger.info(f"Checking certificate for {url}")
+        settings = self._settings()
+        days = result['days_until_expiry']
+        if not isinstance(days, int):
+            return settings['error_interval']
         
-        try:
-            hostname, port = self._parse_url(url)
-            timeout = self.config.get('timeout', 10)
-            
-            cert_info = self._get_certificate_info(hostname, port, timeout)
-            
-            if cert_info is None:
-                return {
-                    'url': url,
-                    'hostname': hostname,
-                    'status': 'ERROR',
-                    'expiry_date': 'N/A',
-                    'days_until_expiry': 'N/A',
-                    'error': 'Failed to retrieve certificate'
-                }
-            
-            # Parse certificate dates
-            expiry_date = self._parse_certificate_date(cert_info['notAfter'])
-            days_until_expiry = self._calculate_days_until_expiry(expiry_date)
-            
-            # Determine status using configurable thresholds
-            status = self._determine_status(days_until_expiry)
-            
-            result = {
-                'url': url,
-                'hostname': hostname,
-                'status': status,
-                'expiry_date': expiry_date.strftime('%Y-%m-%d %H:%M:%S UTC'),
-                'days_until_expiry': days_until_expiry,
-                'error': None
-            }
-            
-            logger.info(f"Certificate for {url} expires on {result['expiry_date']} ({days_until_expiry} days) - Status: {status}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error checking certificate for {url}: {e}")
-            return {
-                'url': url,
-                'hostname': hostname if 'hostname' in locals() else 'Unknown',
-                'status': 'ERROR',
-                'expiry_date': 'N/A',
-                'days_until_expiry': 'N/A',
-                'error': str(e)
-            }
+        thresholds = self.checker.thresholds
+        if days > thresholds['warning']:
+            boundary = thresholds['warning']
+        elif days > thresholds['critical']:
+            boundary = thresholds['critical']
+        elif days >= 0:
+            boundary = -1
+        else:
+            # Already expired, check often to notice the renewal
+            return settings['min_interval']
+        
+        seconds_to_crossing = (days - boundary) * 86400
+        return min(max(seconds_to_crossing / 2, settings['min_interval']), settings['max_interval'])
     
-    def check_certificates(self) -> List[Dict]:
+    def run_pending(self) -> List[Dict]:
         """
-        Check certificates for all URLs in the configuration.
+        Check every website that is due, then reschedule and persist the results.
         
         Returns:
-            List[Dict]: List of certificate check results
+            List[Dict]: Results of the websites checked in this batch
         """
-        websites = self.config.get('websites', [])
+        now = self.clock()
+        settings = self._settings()
+        batch = []
+        while self.queue and self.queue[0][0] <= now and len(batch) < settings['max_batch']:
+            due, url = heapq.heappop(self.queue)
+            if self.due.get(url) == due:
+                batch.append(url)
         
-        if not websites:
-            logger.warning("No websites found in configuration")
+        if not batch:
             return []
         
-        logger.info(f"Starting certificate checks for {len(websites)} websites")
-        
-        # Use ThreadPoolExecutor for concurrent certificate checks
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_url = {
-                executor.submit(self._check_single_certificate, url): url 
-                for url in websites
-            }
-            
-            results = []
-            for future in concurrent.futures.as_completed(future_to_url):
-                result = future.result()
-                with self.lock:
-                    results.append(result)
+        results = []
+        self.checker.reference_time = now
+        self.checker._scan(batch, True, results.append)
+        self.checker.export_metrics()
+        if self.checker.config.get('report_mode', 'full') == 'delta':
+            previous = [self.latest[key] for key in ((r['url'], r.get('address')) for r in results) if key in self.latest]
+            alerts = [c for c in self.checker.compute_changes(previous, results) if c['change'] != 'removed']
+        else:
+            alerts = results
         
-        # Sort results by days until expiry (expired first, then by urgency)
-        results.sort(key=lambda x: (
-            x['days_until_expiry'] if isinstance(x['days_until_expiry'], int) else float('inf')
-        ))
+        delays = {}
+        for result in results:
+            self.latest[(result['url'], result.get('address'))] = result
+            delay = self.next_check_delay(result)
+            # With several addresses per URL the most urgent one decides
+            delays[result['url']] = min(delay, delays.get(result['url'], delay))
+        for url, delay in delays.items():
+            jitter = delay * settings['jitter'] * (2 * random.random() - 1)
+            self._schedule(url, now + delay + jitter)
         
-        self.results = results
-        logger.info(f"Certificate checks completed for {len(results)} websites")
+        snapshot = sorted(self.latest.values(), key=self.checker._sort_key)
+        self.checker.results = snapshot
+        self.checker.save_results_to_file(snapshot)
+        self.checker.send_slack_webhook_alert(alerts, len(results))
         return results
     
-    def display_results(self, results: List[Dict]) -> None:
+    def seconds_until_next(self) -> float:
         """
-        Display certificate check results in a formatted table.
+        Seconds until the next website is due.
         
-        Args:
-            results (List[Dict]): Certificate check results
+        Returns:
+            float: Delay in seconds, 0 if something is already due
         """
-        if not results:
-            print("No results to display")
-            return
+        while self.queue and self.due.get(self.queue[0][1]) != self.queue[0][0]:
+            heapq.heappop(self.queue)
+        if not self.queue:
+            return float('inf')
+        return max(self.queue[0][0] - self.clock(), 0.0)
+    
+    def run_forever(self) -> None:
+        """
+        Run checks as they become due until stop() is called.
+        """
+        logger.info(f"Daemon started with {len(self.due)} websites")
+        reload_check = self._settings()['reload_check']
+        while not self._stop.is_set():
+            self._reload_if_changed(self.clock())
+            self.run_pending()
+            self._stop.wait(min(self.seconds_until_next(), reload_check))
+        logger.info("Daemon stopped")
+    
+    def stop(self) -> None:
+        """
+        Ask run_forever to return after the current batch.
+        """
+        self._stop.set()
+
+class CertificateService:
+    """
+    Long-lived local HTTP API around a CertificateChecker.
+    
+    Endpoints:
+        GET /check?url=URL     Check one website and return its result
+        POST /check            Check the URLs in an NDJSON body (one URL string
+                               or {"url": ...} object per line), streaming one
+                               result per line as each completes
+        GET /results           Latest known results, filtered by 'status'
+                               (comma-separated), 'min_days' and 'max_days'
+    
+    Checks go through the checker's result cache. Concurrent requests for
+    the same URL are coalesced onto a single handshake.
+    """
+    
+    def __init__(self, checker: 'CertificateChecker'):
+        """
+        Initialize the service.
         
-        # Prepare table data
-        headers = ['URL', 'Hostname', 'Status', 'Expiry Date', 'Days Until Expiry']
-        table_data = []
+        Args:
+            checker (CertificateChecker): Configured checker
+        """
+        self.checker = checker
+        # On-demand checks count days from the moment of each request
+        self.checker.reference_time = None
+        self.latest = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=checker.config.get('max_workers', 5))
+        self._server = None
         
-        for result in results:
-            table_data.append([
-                result['url'],
-                result['hostname'],
-                result['status'],
-                result['expiry_date'],
-                result['days_until_expiry']
-            ])
-        
-        # Display table
-        print("\n" + "="*80)
-        print("SSL/TLS Certificate Expiry Report")
-        print("="*80)
-        print(tabulate(table_data, headers=headers, tablefmt='grid'))
-        
-        # Display summary with configurable thresholds
-        total = len(results)
-        expired = sum(1 for r in results if r['status'] == 'EXPIRED')
-        critical = sum(1 for r in results if r['status'] == 'CRITICAL')
-        warning = sum(1 for r in results if r['status'] == 'WARNING')
-        ok = sum(1 for r in results if r['status'] == 'OK')
-        errors = sum(1 for r in results if r['status'] == 'ERROR')
-        
-        print(f"\nSummary:")
-        print(f"Total certificates checked: {total}")
-        print(f"🟢 OK: {ok}")
-        print(f"🟡 Warning (≤{self.thresholds['warning']} days): {warning}")
-        print(f"🔴 Critical (≤{self.thresholds['critical']} days): {critical}")
-        print(f"❌ Expired: {expired}")
-        print(f"❗ Errors: {errors}")
-        print(f"\nConfigured Thresholds:")
-        print(f"Critical: ≤{self.thresholds['critical']} days")
-        print(f"Warning: ≤{self.thresholds['warning']} days")
-        print("="*80)
-    
-    def send_slack_webhook_alert(self, results: List[Dict]) -> bool:
+        for result in checker.load_previous_results() or []:
+            self.latest[result['url']] = result
+    
+    def check(self, url: str, force_refresh: bool = False) -> Dict:
         """
-        Send Slack webhook alert for critical certificates.
+        Check one website, sharing the probe with concurrent requests for it.
         
         Args:
-            results (List[Dict]): Certificate check results
+            url (str): URL to check; 'host' and 'host:port' mean https
+            force_refresh (bool): Probe even if a cached result is still valid
             
         Returns:
-            bool: True if webhook sent successfully
+            Dict: Certificate check result
         """
-        webhook_config = self.config.get('slack_webhook', {})
+        if '://' not in url:
+            url = f"https://{url}"
         
-        if not webhook_config.get('enabled', False):
-            logger.info("Slack webhook alerting is disabled")
-            return False
+        with self._lock:
+            future = self._inflight.get(url)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[url] = future
+        if not owner:
+            return future.result()
         
-        # Check for critical/expired certificates
-        critical_certs = [r for r in results if r['status'] in ['CRITICAL', 'EXPIRED', 'ERROR']]
-        warning_certs = [r for r in results if r['status'] == 'WARNING']
+        try:
+            to_probe, cached = self.checker._partition_cached([url], force_refresh)
+            result = cached[0] if cached else self.checker._check_single_certificate(url)
+            self.checker.metrics.observe(result)
+            try:
+                if self.checker.cache is not None:
+                    self.checker.cache.commit()
+                if self.checker.history is not None:
+                    self.checker.history.record(result, time.time())
+            except sqlite3.Error as e:
+                # The check itself succeeded; the response must not depend on the stores
+                logger.warning(f"Could not store the result for {url}: {e}")
+            self.latest[url] = result
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[url]
+    
+    def check_many(self, urls: Iterable[str], force_refresh: bool = False) -> Iterator[Dict]:
+        """
+        Check several websites concurrently.
         
-        # Decide whether to send alert
-        should_send = (
-            (critical_certs and webhook_config.get('send_on_critical', True)) or
-            (warning_certs and webhook_config.get('send_on_warning', False))
-        )
+        Args:
+            urls (Iterable[str]): URLs to check
+            force_refresh (bool): Probe even if a cached result is still valid
+            
+        Yields:
+            Dict: Each result as soon as it completes
+        """
+        futures = [self._executor.submit(self.check, url, force_refresh) for url in urls]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+    
+    def query(self, statuses: Optional[List[str]] = None, min_days: Optional[int] = None,
+              max_days: Optional[int] = None) -> List[Dict]:
+        """
+        Filter the latest known results.
         
-        if not should_send:
-            logger.info("No alerts to send based on configuration")
-            return False
+        Days until expiry and status are recomputed for the current time
+        first, so results loaded at startup or checked days ago still
+        answer the filters correctly.
         
-        try:
-            webhook_url = webhook_config.get('url')
-            if not webhook_url:
-                logger.error("No Slack webhook URL configured")
-                return False
-            
-            # Determine alert color and emoji based on severity
-            if critical_certs:
-                color = "danger"
-                alert_level = "CRITICAL"
-                emoji = "🚨"
-            elif warning_certs:
-                color = "warning"
-                alert_level = "WARNING"
-                emoji = "⚠️"
-            else:
-                color = "good"
-                alert_level = "INFO"
-                emoji = "ℹ️"
-            
-            # Build the main message
-            main_text = f"{emoji} *Certificate Expiry Alert - {alert_level}*"
-            
-            # Create Slack message payload
-            slack_payload = {
-                "text": main_text,
-                "username": "Certificate Monitor",
-                "icon_emoji": ":shield:",
-                "attachments": [
-                    {
-                        "color": color,
-                        "title": f"Certificate Monitoring Report",
-                        "text": f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}",
-                        "fields": [
-                            {
-                                "title": "Total Certificates Checked",
-                                "value": str(len(results)),
-                                "short": True
-                            },
-                            {
-                                "title": "Critical/Expired",
-                                "value": str(len(critical_certs)),
-                                "short": True
-                            },
-                            {
-                                "title": "Warning",
-                                "value": str(len(warning_certs)),
-                                "short": True
-                            },
-                            {
-                                "title": "Thresholds",
-                                "value": f"Critical: ≤{self.thresholds['critical']} days, Warning: ≤{self.thresholds['warning']} days",
-                                "short": True
-                            }
-                        ],
-                        "footer": "Certificate Monitor",
-                        "footer_icon": "https://slack.com/img/favicon.ico",
-                        "ts": int(datetime.now().timestamp())
-                    }
-                ]
-            }
-            
-            # Add critical certificates details
-            if critical_certs:
-                critical_text = "*CRITICAL/EXPIRED Certificates:*\n"
-                for cert in critical_certs[:10]:
-                    status_emoji = "🔴" if cert['status'] == 'CRITICAL' else "❌" if cert['status'] == 'EXPIRED' else "❗"
-                    critical_text += f"• {status_emoji} *{cert['url']}*: {cert['status']} ({cert['days_until_expiry']} days)\n"
-                
-                if len(critical_certs) > 10:
-                    critical_text += f"\n_... and {len(critical_certs) - 10} more critical certificates_"
-                
-                slack_payload["attachments"].append({
-                    "color": "danger",
-                    "title": "Critical Certificates Details",
-                    "text": critical_text,
-                    "mrkdwn_in": ["text"]
-                })
-            
-            # Add warning certificates details if enabled
-            if warning_certs and webhook_config.get('send_on_warning', False):
-                warning_text = "*WARNING Certificates:*\n"
-                for cert in warning_certs[:5]:
-                    warning_text += f"• 🟡 *{cert['url']}*: {cert['status']} ({cert['days_until_expiry']} days)\n"
-                
-                if len(warning_certs) > 5:
-                    warning_text += f"\n_... and {len(warning_certs) - 5} more warning certificates_"
-                
-                slack_payload["attachments"].append({
-                    "color": "warning", 
-                    "title": "Warning Certificates Details",
-                    "text": warning_text,
-                    "mrkdwn_in": ["text"]
-                })
-            
-            # Send webhook
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(webhook_url, json=slack_payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            logger.info(f"Slack webhook alert sent successfully")
-            return True
+        Args:
+            statuses (Optional[List[str]]): Statuses to include, all if None
+            min_days (Optional[int]): Minimum days until expiry
+            max_days (Optional[int]): Maximum days until expiry
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to send Slack webhook alert: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Unexpected error sending Slack webhook: {e}")
-            return False
+        Returns:
+            List[Dict]: Matching results sorted by urgency
+        """
+        results = ResultStore(list(self.latest.values()))
+        results.reclassify(time.time(), self.checker.thresholds)
+        matches = []
+        for result in results:
+            if statuses is not None and result['status'] not in statuses:
+                continue
+            days = result['days_until_expiry']
+            if (min_days is not None or max_days is not None) and type(days) is not int:
+                continue
+            if min_days is not None and days < min_days:
+                continue
+            if max_days is not None and days > max_days:
+                continue
+            matches.append(result)
+        matches.sort(key=self.checker._sort_key)
+        return matches
     
-    def save_results_to_file(self, results: List[Dict], filename: str = 'cert_results.json') -> None:
+    def start(self, port: int = 8080, host: str = '127.0.0.1') -> int:
         """
-        Save results to a JSON file.
+        Serve the API from a background thread.
         
         Args:
-            results (List[Dict]): Certificate check results
-            filename (str): Output filename
+            port (int): Port to listen on, 0 for any free port
+            host (str): Address to bind
+            
+        Returns:
+            int: Port the service listens on
         """
-        try:
-            output_data = {
-                'timestamp': datetime.now().isoformat(),
-                'total_checked': len(results),
-                'thresholds': self.thresholds,
-                'results': results
-            }
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs
+        service = self
+        
+        class ServiceHandler(BaseHTTPRequestHandler):
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
             
-            with open(filename, 'w') as f:
-                json.dump(output_data, f, indent=2, default=str)
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                force_refresh = params.get('force_refresh') in ('1', 'true')
+                try:
+                    if parsed.path == '/check':
+                        if not params.get('url'):
+                            self._send_json(400, {'error': "Missing 'url' parameter"})
+                            return
+                        self._send_json(200, service.check(params['url'], force_refresh))
+                    elif parsed.path == '/results':
+                        statuses = params['status'].upper().split(',') if params.get('status') else None
+                        min_days = int(params['min_days']) if 'min_days' in params else None
+                        max_days = int(params['max_days']) if 'max_days' in params else None
+                        self._send_json(200, service.query(statuses, min_days, max_days))
+                    else:
+                        self._send_json(404, {'error': 'Not found'})
+                except ValueError as e:
+                    self._send_json(400, {'error': str(e)})
             
-            logger.info(f"Results saved to {filename}")
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                if parsed.path != '/check':
+                    self._send_json(404, {'error': 'Not found'})
+                    return
+                force_refresh = parse_qs(parsed.query).get('force_refresh', [''])[-1] in ('1', 'true')
+                length = int(self.headers.get('Content-Length', 0))
+                urls = []
+                try:
+                    for line in self.rfile.read(length).decode('utf-8').splitlines():
+                        if line.strip():
+                            entry = json.loads(line)
+                            urls.append(entry['url'] if isinstance(entry, dict) else entry)
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send_json(400, {'error': f"Invalid NDJSON body: {e}"})
+                    return
+                
+                # Stream results as they complete; the response ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                for result in service.check_many(urls, force_refresh):
+                    self.wfile.write(json.dumps(result, default=str).encode('utf-8') + b'\n')
+                    self.wfile.flush()
             
-        except Exception as e:
-            logger.error(f"Error saving results to file: {e}")
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), ServiceHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Certificate API listening on http://{host}:{self._server.server_port}")
+        return self._server.server_port
+    
+    def stop(self) -> None:
+        """
+        Stop serving and release the worker threads.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._executor.shutdown(wait=False)
 
-def main():
+def read_targets(stream: TextIO) -> Iterator[str]:
     """
-    Main function to run the certificate checker.
+    Read URLs from a newline-delimited stream, skipping blank lines and comments.
+    
+    Args:
+        stream (TextIO): Open file or sys.stdin
+        
+    Yields:
+        str: One URL per non-empty line
+    """
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def run_streaming(checker: 'CertificateChecker', args: argparse.Namespace) -> None:
+    """
+    Run a streaming scan from a target file or stdin to a JSON Lines file.
+    
+    Args:
+        checker (CertificateChecker): Configured checker
+        args (argparse.Namespace): Parsed command line arguments
     """
+    source = sys.stdin if args.targets == '-' else open(args.targets, 'r')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
     try:
-        # Initialize certificate checker
-        checker = CertificateChecker()
-        
-        # Check certificates
-        results = checker.check_certificates()
+        top_results, counts = checker.stream_certificates(
+            read_targets(source), output, top_n=args.top, force_refresh=args.force_refresh
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    
+    if args.top > 0:
+        checker.display_results(top_results, counts)
+    logger.info(f"Streamed results written to {args.output}")
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parse a --shard argument of the form INDEX/COUNT (1-based index).
+    
+    Args:
+        value (str): Argument value such as '2/4'
         
-        # Display results
-        checker.display_results(results)
+    Returns:
+        Tuple[int, int]: Zero-based shard index and shard count
         
-        # Save results to file
+    Raises:
+        argparse.ArgumentTypeError: If the value is malformed or out of range
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected INDEX/COUNT")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and {count}")
+    return index - 1, count
+
+def report_results(checker: 'CertificateChecker', results: List[Dict],
+                   renderer: Optional[ResultRenderer] = None) -> None:
+    """
+    Display, save and alert on a complete set of results.
+    
+    With 'report_mode' set to 'delta', the report and the Slack alert only
+    cover what changed since the previous cert_results.json.
+    
+    Args:
+        checker (CertificateChecker): Configured checker
+        results (List[Dict]): Certificate check results
+        renderer (Optional[ResultRenderer]): Streaming renderer already fed during the scan
+    """
+    if checker.config.get('report_mode', 'full') == 'delta':
+        changes = checker.compute_changes(checker.load_previous_results(), results)
+        checker.display_changes(changes, status_counts(results))
         checker.save_results_to_file(results)
+        checker.send_slack_webhook_alert([c for c in changes if c['change'] != 'removed'], len(results))
+        return
+    
+    # Display results
+    checker.display_results(results, renderer=renderer)
+    
+    # Save results to file
+    checker.save_results_to_file(results)
+    
+    # Send Slack webhook alerts if needed
+    checker.send_slack_webhook_alert(results)
+
+def run_query(history: HistoryStore, args: argparse.Namespace) -> None:
+    """
+    Answer a query subcommand from the history store and print the rows.
+    
+    Args:
+        history (HistoryStore): Open history store
+        args (argparse.Namespace): Parsed 'query' arguments
+    """
+    now = time.time()
+    if args.query == 'expiring':
+        rows = history.expiring(now + args.days * 86400, args.status, args.limit)
+    elif args.query == 'top':
+        rows = history.most_urgent(args.limit, args.status)
+    else:
+        rows = history.rotations(args.hostname, now - args.since_days * 86400 if args.since_days else 0)
+        for row in rows:
+            for key in ('first_seen', 'last_seen'):
+                row[key] = datetime.fromtimestamp(row[key], timezone.utc).strftime(ResultStore.DATE_FORMAT)
+    
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    if args.query == 'history':
+        columns = ['fingerprint', 'first_seen', 'last_seen', 'expiry_date', 'observations']
+    else:
+        columns = ['url', 'address', 'status', 'expiry_date', 'days_until_expiry', 'error']
+    from tabulate import tabulate
+    print(tabulate([[row[c] for c in columns] for row in rows], headers=columns, tablefmt='grid'))
+
+def load_check_config(config_file: Optional[str]) -> Dict:
+    """
+    Configuration for a 'check' run, which works without any config file.
+    
+    Args:
+        config_file (Optional[str]): --config value; config.json is used if it exists
+        
+    Returns:
+        Dict: Loaded configuration, or an empty one
+        
+    Raises:
+        FileNotFoundError: If an explicitly given config file doesn't exist
+    """
+    path = config_file or 'config.json'
+    if config_file is None and not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def run_check(args: argparse.Namespace) -> int:
+    """
+    Check the hosts given on the command line and print their results.
+    
+    Thresholds, TLS and cache settings come from the config file when
+    there is one, but its websites are replaced by the given hosts.
+    Nothing is saved and no alert is sent. Logging goes to stderr at
+    WARNING unless the config has a 'logging' section.
+    
+    Args:
+        args (argparse.Namespace): Parsed 'check' arguments
+        
+    Returns:
+        int: Exit status, 2 if any certificate is CRITICAL, EXPIRED or failed to check
+    """
+    config = load_check_config(args.config)
+    config['websites'] = [host if '://' in host else f"https://{host}" for host in args.hosts]
+    config.setdefault('logging', {'level': 'WARNING', 'path': None, 'stream': 'stderr'})
+    config.pop('checkpoint', None)
+    if args.timeout is not None:
+        config['timeout'] = args.timeout
+    if args.format is not None:
+        config['output_format'] = args.format
+    
+    checker = CertificateChecker(args.config, config=config)
+    results = checker.check_certificates(force_refresh=args.force_refresh)
+    checker.display_results(results)
+    counts = status_counts(results)
+    return 2 if any(counts.get(status) for status in ('CRITICAL', 'EXPIRED', 'ERROR')) else 0
+
+def run_scan(args: argparse.Namespace) -> None:
+    """
+    Scan the configured websites in the mode selected by the 'scan' options.
+    
+    Args:
+        args (argparse.Namespace): Parsed 'scan' arguments
+    """
+    import signal
+    
+    # Initialize certificate checker
+    checker = CertificateChecker(args.config or 'config.json')
+    checker.start_metrics_server()
+    
+    if args.targets:
+        run_streaming(checker, args)
+        return
+    
+    if args.serve:
+        service_config = checker.config.get('service', {})
+        service = CertificateService(checker)
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+        service.start(service_config.get('port', 8080), service_config.get('host', '127.0.0.1'))
+        try:
+            stopped.wait()
+        finally:
+            service.stop()
+        return
+    
+    if args.daemon:
+        daemon = CertificateDaemon(checker)
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+        daemon.run_forever()
+        return
+    
+    if args.shard:
+        index, count = args.shard
+        run_shard(checker.config_file, index, count, args.force_refresh)
+        return
+    
+    renderer = None
+    if args.merge:
+        results = checker.merge_results(args.merge)
+    elif args.workers:
+        results = run_sharded(checker, args.workers, args.force_refresh)
+    else:
+        # Stream rows to the console as they complete when the format allows it
+        if checker.config.get('report_mode', 'full') != 'delta':
+            renderer = checker.create_renderer()
+            if not renderer.streaming:
+                renderer = None
+        # Check certificates
+        results = checker.check_certificates(force_refresh=args.force_refresh,
+                                             on_result=renderer.write if renderer else None)
+    
+    report_results(checker, results, renderer)
 
-        # Send Slack webhook alerts if needed
+def run_report(args: argparse.Namespace) -> None:
+    """
+    Display saved results again, recounted to today, without probing.
+    
+    Args:
+        args (argparse.Namespace): Parsed 'report' arguments
+    """
+    checker = CertificateChecker(args.config or 'config.json')
+    results = checker.merge_results([args.input])
+    checker.display_results(results)
+    if args.alert:
         checker.send_slack_webhook_alert(results)
+
+def run_query_command(args: argparse.Namespace) -> int:
+    """
+    Open the history store and answer a 'query' subcommand.
+    
+    Args:
+        args (argparse.Namespace): Parsed 'query' arguments
         
+    Returns:
+        int: Exit status, 1 if there is no history database
+    """
+    path = args.db
+    if path is None:
+        try:
+            with open(args.config or 'config.json', 'r') as f:
+                path = json.load(f).get('history', {}).get('path', 'cert_history.db')
+        except FileNotFoundError:
+            path = 'cert_history.db'
+    if not os.path.exists(path):
+        logger.error(f"History database not found: {path}")
+        return 1
+    history = HistoryStore(path)
+    try:
+        run_query(history, args)
+    finally:
+        history.close()
+    return 0
+
+COMMANDS = {
+    'check': run_check,
+    'scan': run_scan,
+    'report': run_report,
+    'query': run_query_command,
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command line parser with one subcommand per entry in COMMANDS.
+    
+    Returns:
+        argparse.ArgumentParser: Parser for main()
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', metavar='PATH',
+                        help='path to the configuration file (default: config.json)')
+    
+    parser = argparse.ArgumentParser(description='Check SSL/TLS certificate expiry dates',
+                                     epilog="Without a command, 'scan' runs with the options given.")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    
+    check_parser = commands.add_parser('check', parents=[common],
+                                       help='check the given hosts now, with or without a config file')
+    check_parser.add_argument('hosts', nargs='+', metavar='HOST',
+                              help="'host', 'host:port' or a URL such as smtp://mail.example.com")
+    check_parser.add_argument('--timeout', type=int, metavar='SECONDS', help='connection timeout')
+    check_parser.add_argument('--format', choices=sorted(RENDERERS), help="override 'output_format'")
+    check_parser.add_argument('--force-refresh', action='store_true',
+                              help='probe even if a cached result is still valid')
+    
+    scan_parser = commands.add_parser('scan', parents=[common],
+                                      help='check every configured website, then report, save and alert')
+    scan_parser.add_argument('--force-refresh', action='store_true',
+                             help='probe every website even if a cached result is still valid')
+    scan_parser.add_argument('--targets', metavar='PATH',
+                             help="stream URLs from a newline-delimited file ('-' for stdin) instead of the config")
+    scan_parser.add_argument('--output', metavar='PATH', default='cert_results.jsonl',
+                             help="JSON Lines output for streaming mode ('-' for stdout)")
+    scan_parser.add_argument('--top', type=int, default=20,
+                             help='number of most urgent certificates to report in streaming mode (0 disables the report)')
+    scan_parser.add_argument('--daemon', action='store_true',
+                             help='stay resident and recheck each website when it is due')
+    scan_parser.add_argument('--serve', action='store_true',
+                             help="run the HTTP API configured under 'service' instead of a batch")
+    sharding = scan_parser.add_mutually_exclusive_group()
+    sharding.add_argument('--shard', type=parse_shard, metavar='INDEX/COUNT',
+                          help='scan only this shard and write a partial result file, e.g. 2/4')
+    sharding.add_argument('--workers', type=int, metavar='N',
+                          help='scan N shards in parallel processes and merge the results')
+    sharding.add_argument('--merge', nargs='+', metavar='FILE',
+                          help='merge partial result files from shard runs and report once')
+    
+    report_parser = commands.add_parser('report', parents=[common],
+                                        help='show saved results again without probing')
+    report_parser.add_argument('--input', metavar='PATH', default='cert_results.json',
+                               help='result file written by a scan')
+    report_parser.add_argument('--alert', action='store_true', help='also send the Slack alert')
+    
+    query_parser = commands.add_parser('query', parents=[common], help='answer questions from the scan history store')
+    query_parser.add_argument('--db', metavar='PATH',
+                              help="history database (defaults to 'history.path' from the config)")
+    queries = query_parser.add_subparsers(dest='query', required=True)
+    expiring_parser = queries.add_parser('expiring', help='certificates expiring within a number of days')
+    expiring_parser.add_argument('--days', type=int, default=14)
+    expiring_parser.add_argument('--limit', type=int, default=100)
+    top_parser = queries.add_parser('top', help='most urgent certificates by expiry')
+    top_parser.add_argument('--limit', type=int, default=20)
+    history_parser = queries.add_parser('history', help='certificates a hostname has served over time')
+    history_parser.add_argument('hostname')
+    history_parser.add_argument('--since-days', type=int, metavar='N',
+                                help='only observations from the last N days')
+    # Rotations are grouped by fingerprint across statuses, so only the other queries filter by status
+    for subparser in (expiring_parser, top_parser):
+        subparser.add_argument('--status', action='append', choices=ResultStore.STATUSES,
+                               help='only results with this status (repeatable)')
+    for subparser in (expiring_parser, top_parser, history_parser):
+        subparser.add_argument('--json', action='store_true', help='print JSON Lines instead of a table')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Main function to run the certificate checker.
+    
+    Args:
+        argv (Optional[List[str]]): Command line arguments, sys.argv[1:] if None
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Options without a command keep their old meaning as 'scan' options
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv.insert(0, 'scan')
+    args = build_parser().parse_args(argv)
+    
+    try:
+        status = COMMANDS[args.command](args)
     except KeyboardInterrupt:
         logger.info("Script interrupted by user")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
         sys.exit(1)
+    if status:
+        sys.exit(status)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
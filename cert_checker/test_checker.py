@@ -9,8 +9,152 @@ from main import CertificateChecker
 import json
 import tempfile
 import os
+import socket
+import ssl
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 
+def make_self_signed_certificate(hostname, days_valid, directory):
+    """Write a throwaway self-signed certificate and key, returning their paths."""
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=days_valid))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, f"{hostname}.crt")
+    key_path = os.path.join(directory, f"{hostname}.key")
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+def make_chained_certificate(hostname, ca_days_valid, days_valid, directory):
+    """Write a leaf signed by a throwaway CA, with the CA appended to the chain file, returning their paths."""
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    
+    now = datetime.now(timezone.utc)
+    ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Test Intermediate CA')])
+    ca_cert = (
+        x509.CertificateBuilder()
+        .subject_name(ca_name)
+        .issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=ca_days_valid))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(ca_key, hashes.SHA256())
+    )
+    key = ec.generate_private_key(ec.SECP256R1())
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)]))
+        .issuer_name(ca_name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=days_valid))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+        .add_extension(x509.AuthorityInformationAccess([x509.AccessDescription(
+            x509.oid.AuthorityInformationAccessOID.OCSP, x509.UniformResourceIdentifier('http://ocsp.example.com')
+        )]), critical=False)
+        .sign(ca_key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, f"{hostname}-chain.crt")
+    key_path = os.path.join(directory, f"{hostname}-chain.key")
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM) + ca_cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+def start_tls_server(cert_path, key_path, connections=1):
+    """Serve TLS handshakes on a local port in a background thread, returning the port."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    listener = socket.create_server(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    
+    def serve():
+        with listener:
+            for _ in range(connections):
+                conn, _ = listener.accept()
+                try:
+                    with context.wrap_socket(conn, server_side=True):
+                        pass
+                except (ssl.SSLError, OSError):
+                    pass
+    
+    threading.Thread(target=serve, daemon=True).start()
+    return port
+
+def start_starttls_server(cert_path, key_path, protocol, connections=1, accept=True):
+    """Serve the server side of a STARTTLS upgrade followed by a TLS handshake, returning the port."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    listener = socket.create_server(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    
+    def negotiate(conn):
+        stream = conn.makefile('rb')
+        if protocol == 'smtp':
+            conn.sendall(b'220 mail.example.com ESMTP\r\n')
+            stream.readline()
+            conn.sendall(b'250-mail.example.com\r\n250 STARTTLS\r\n')
+            stream.readline()
+            conn.sendall(b'220 Ready to start TLS\r\n' if accept else b'454 TLS not available\r\n')
+        elif protocol == 'imap':
+            conn.sendall(b'* OK IMAP4rev1 ready\r\n')
+            stream.readline()
+            conn.sendall(b'a1 OK Begin TLS\r\n' if accept else b'a1 BAD STARTTLS disabled\r\n')
+        elif protocol == 'ldap':
+            stream.read(31)
+            conn.sendall(bytes([0x30, 0x0c, 0x02, 0x01, 0x01, 0x78, 0x07, 0x0a, 0x01, 0 if accept else 2,
+                                0x04, 0x00, 0x04, 0x00]))
+        elif protocol == 'postgres':
+            stream.read(8)
+            conn.sendall(b'S' if accept else b'N')
+        stream.close()
+    
+    def serve():
+        with listener:
+            for _ in range(connections):
+                conn, _ = listener.accept()
+                try:
+                    negotiate(conn)
+                    if accept:
+                        with context.wrap_socket(conn, server_side=True):
+                            pass
+                except (ssl.SSLError, OSError):
+                    pass
+                finally:
+                    conn.close()
+    
+    threading.Thread(target=serve, daemon=True).start()
+    return port
+
 class TestCertificateChecker(unittest.TestCase):
     def setUp(self):
         # Create a temporary config file with Slack webhook config
@@ -125,10 +269,11 @@ class TestCertificateChecker(unittest.TestCase):
         finally:
             os.unlink(invalid_config.name)
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_send_slack_webhook_alert_success(self, mock_post):
         # Mock successful webhook response
         mock_response = MagicMock()
+        mock_response.status_code = 200
         mock_response.raise_for_status.return_value = None
         mock_post.return_value = mock_response
         
@@ -155,6 +300,77 @@ class TestCertificateChecker(unittest.TestCase):
         self.assertIn('Certificate Expiry Alert', payload['text'])
         self.assertEqual(len(payload['attachments']), 2)
     
+    def _critical_results(self, count):
+        return [
+            {
+                'url': f'https://host{i}.example.com',
+                'hostname': f'host{i}.example.com',
+                'status': 'CRITICAL',
+                'expiry_date': '2025-01-15 23:59:59 UTC',
+                'days_until_expiry': 5,
+                'error': None,
+                'fingerprint': f'{i:064x}'
+            }
+            for i in range(count)
+        ]
+    
+    @patch('requests.Session.post')
+    def test_send_slack_webhook_alert_paginates(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        
+        self.assertTrue(self.checker.send_slack_webhook_alert(self._critical_results(120)))
+        
+        # 120 certificates at 50 per message, every one of them listed
+        self.assertEqual(mock_post.call_count, 3)
+        payloads = [call[1]['json'] for call in mock_post.call_args_list]
+        self.assertEqual(len(payloads[0]['attachments']), 2)
+        self.assertIn('continued 3/3', payloads[2]['text'])
+        listed = sum(a['text'].count('•') for p in payloads for a in p['attachments'])
+        self.assertEqual(listed, 120)
+    
+    @patch('time.sleep')
+    @patch('requests.Session.post')
+    def test_send_slack_webhook_alert_retries_after_rate_limit(self, mock_post, mock_sleep):
+        limited = MagicMock(status_code=429, headers={'Retry-After': '7'})
+        mock_post.side_effect = [limited, MagicMock(status_code=200)]
+        
+        self.assertTrue(self.checker.send_slack_webhook_alert(self._critical_results(1)))
+        self.assertEqual(mock_post.call_count, 2)
+        mock_sleep.assert_called_once_with(7.0)
+        
+        # An excessive Retry-After is clamped
+        self.checker.config['slack_webhook']['max_retry_after_seconds'] = 5
+        limited.headers['Retry-After'] = '86400'
+        mock_post.side_effect = [limited, MagicMock(status_code=200)]
+        self.assertTrue(self.checker.send_slack_webhook_alert(self._critical_results(1)))
+        mock_sleep.assert_called_with(5)
+    
+    @patch('requests.Session.post')
+    def test_send_slack_webhook_alert_deduplicates(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        with tempfile.TemporaryDirectory() as directory:
+            self.checker.config['slack_webhook'].update({
+                'deduplicate': True,
+                'dedupe_state': os.path.join(directory, 'state.json')
+            })
+            results = self._critical_results(2)
+            
+            self.assertTrue(self.checker.send_slack_webhook_alert(results))
+            self.assertFalse(self.checker.send_slack_webhook_alert(results))
+            self.assertEqual(mock_post.call_count, 1)
+            
+            # A changed status or a renewed certificate is alerted again
+            results[0]['status'] = 'EXPIRED'
+            results[1]['fingerprint'] = 'f' * 64
+            self.assertTrue(self.checker.send_slack_webhook_alert(results))
+            payload = mock_post.call_args[1]['json']
+            self.assertEqual(payload['attachments'][0]['fields'][1]['value'], '2')
+            
+            # The replaced certificate's key is dropped from the state
+            with open(os.path.join(directory, 'state.json')) as f:
+                keys = [key for key in json.load(f) if key.startswith(results[1]['url'] + '|')]
+            self.assertEqual(keys, [f"{results[1]['url']}|{'f' * 64}"])
+    
     def test_send_slack_webhook_alert_disabled(self):
         # Test with webhook disabled
         config_disabled = {
@@ -201,7 +417,7 @@ class TestCertificateChecker(unittest.TestCase):
         }
         
         mock_ssl_socket = MagicMock()
-        mock_ssl_socket.getpeercert.return_value = mock_cert
+        mock_ssl_socket.getpeercert.side_effect = lambda binary_form=False: b'DER' if binary_form else dict(mock_cert)
         
         mock_context = MagicMock()
         mock_context.wrap_socket.return_value.__enter__.return_value = mock_ssl_socket
@@ -211,7 +427,8 @@ class TestCertificateChecker(unittest.TestCase):
         mock_socket.return_value.__enter__.return_value = mock_socket_conn
         
         result = self.checker._get_certificate_info("example.com", 443, 10)
-        self.assertEqual(result, mock_cert)
+        import hashlib
+        self.assertEqual(result, dict(mock_cert, fingerprint=hashlib.sha256(b'DER').hexdigest()))
     
     @patch('main.socket.create_connection')
     @patch('main.ssl.create_default_context')  
@@ -229,6 +446,1125 @@ class TestCertificateChecker(unittest.TestCase):
         self.assertEqual(result['status'], 'ERROR')
         self.assertEqual(result['expiry_date'], 'N/A')
         self.assertEqual(result['days_until_expiry'], 'N/A')
+    
+    def test_asyncio_engine_matches_threaded_engine(self):
+        # Both engines must produce identical result dicts for the same certificates
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        mock_cert = {'notAfter': future}
+        self.checker.config['websites'] = ["https://a.example.com", "https://b.example.com:8443", "https://c.example.com"]
+        
+        async def fake_async_info(hostname, port, timeout, address=None, **kwargs):
+            return None if hostname == 'c.example.com' else mock_cert
+        
+        with patch.object(self.checker, '_get_certificate_info',
+                          side_effect=lambda h, p, t, a=None, **kwargs: None if h == 'c.example.com' else mock_cert):
+            self.checker.config['engine'] = 'threads'
+            threaded = self.checker.check_certificates()
+        
+        with patch.object(self.checker, '_get_certificate_info_async', side_effect=fake_async_info):
+            self.checker.config['engine'] = 'asyncio'
+            self.checker.config['max_concurrency'] = 2
+            async_results = self.checker.check_certificates()
+        
+        # Phase timings naturally differ between runs
+        without_timings = lambda results: sorted(({k: v for k, v in r.items() if k != 'timings'} for r in results),
+                                                 key=lambda r: r['url'])
+        self.assertEqual(without_timings(threaded), without_timings(async_results))
+        self.assertEqual(async_results[-1]['status'], 'ERROR')
+    
+    def test_asyncio_engine_writes_cache_off_the_event_loop(self):
+        from main import ResultCache
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.config.update({'engine': 'asyncio', 'websites': ["https://a.example.com", "https://b.example.com"]})
+        
+        async def fake_async_info(hostname, port, timeout, address=None, **kwargs):
+            return {'notAfter': future}
+        
+        with tempfile.TemporaryDirectory() as directory:
+            self.checker.cache = ResultCache(os.path.join(directory, 'cache.db'))
+            writers = []
+            put = self.checker.cache.put
+            
+            def record_thread(*args):
+                writers.append(threading.current_thread())
+                put(*args)
+            
+            with patch.object(self.checker, '_get_certificate_info_async', side_effect=fake_async_info), \
+                 patch.object(self.checker.cache, 'put', side_effect=record_thread):
+                results = self.checker.check_certificates(force_refresh=True)
+            self.assertEqual({r['status'] for r in results}, {'OK'})
+            self.assertEqual(len(writers), 2)
+            # The event loop runs in this thread; the writes ran in the executor
+            self.assertNotIn(threading.current_thread(), writers)
+            self.assertIsNotNone(self.checker.cache.get('a.example.com:443'))
+            self.checker.cache.close()
+    
+    def test_deadline_retries_failures_and_reports_stragglers(self):
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.config['websites'] = ["https://fast.example.com", "https://flaky.example.com",
+                                           "https://blackhole.example.com"]
+        self.checker.config['deadline'] = {'enabled': True, 'seconds': 0.5, 'retries': 2,
+                                           'backoff_seconds': 0.01, 'hedge': False}
+        calls = []
+        release = threading.Event()
+        
+        def probe(hostname, port, timeout, address=None, **kwargs):
+            calls.append(hostname)
+            if hostname == 'blackhole.example.com':
+                release.wait(1)
+            if hostname == 'flaky.example.com' and calls.count(hostname) == 1:
+                return None
+            return {'notAfter': future}
+        
+        started = time.monotonic()
+        with patch.object(self.checker, '_get_certificate_info', side_effect=probe):
+            results = self.checker.check_certificates()
+            self.assertLess(time.monotonic() - started, 0.9)
+            # Let the abandoned probe finish before the patch is undone
+            release.set()
+            time.sleep(0.05)
+        
+        by_url = {r['url']: r for r in results}
+        self.assertEqual(by_url["https://fast.example.com"]['status'], 'OK')
+        self.assertEqual(by_url["https://flaky.example.com"]['status'], 'OK')
+        self.assertEqual(calls.count('flaky.example.com'), 2)
+        self.assertEqual(by_url["https://blackhole.example.com"]['status'], 'ERROR')
+        self.assertIn('deadline', by_url["https://blackhole.example.com"]['error'])
+        self.assertIsNone(self.checker.budget)
+    
+    def test_probes_slower_than_p95_are_hedged(self):
+        import asyncio
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.config['websites'] = [f"https://host{i}.example.com" for i in range(4)] + ["https://slow.example.com"]
+        self.checker.config['max_workers'] = 1
+        self.checker.config['max_concurrency'] = 1
+        self.checker.config['deadline'] = {'enabled': True, 'seconds': 5, 'hedge_min_samples': 3}
+        
+        release = threading.Event()
+        
+        # Only the first attempt at the slow host stalls
+        def probe(hostname, port, timeout, address=None, **kwargs):
+            attempts.append(hostname)
+            release.wait(2 if attempts.count('slow.example.com') == 1 and hostname == 'slow.example.com' else 0.01)
+            return {'notAfter': future}
+        
+        async def probe_async(hostname, port, timeout, address=None, **kwargs):
+            attempts.append(hostname)
+            await asyncio.sleep(2 if attempts.count('slow.example.com') == 1 and hostname == 'slow.example.com' else 0.01)
+            return {'notAfter': future}
+        
+        for engine, method, side_effect in [('threads', '_get_certificate_info', probe),
+                                            ('asyncio', '_get_certificate_info_async', probe_async)]:
+            with self.subTest(engine=engine):
+                attempts = []
+                self.checker.config['engine'] = engine
+                started = time.monotonic()
+                with patch.object(self.checker, method, side_effect=side_effect):
+                    results = self.checker.check_certificates()
+                    self.assertLess(time.monotonic() - started, 1)
+                    release.set()
+                    time.sleep(0.05)
+                self.assertEqual(attempts.count('slow.example.com'), 2)
+                self.assertEqual({r['status'] for r in results}, {'OK'})
+    
+    def test_unknown_engine_raises(self):
+        self.checker.config['engine'] = 'fibers'
+        with self.assertRaises(ValueError):
+            self.checker.check_certificates()
+    
+    @patch('asyncio.open_connection')
+    def test_get_certificate_info_async_timeout(self, mock_open_connection):
+        import asyncio
+        
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+        
+        mock_open_connection.side_effect = hang
+        result = asyncio.run(self.checker._get_certificate_info_async("slow.example.com", 443, 0.05))
+        self.assertIsNone(result)
+    
+    def test_ssl_context_is_shared(self):
+        context = self.checker.ssl_contexts.get_context()
+        self.assertIs(context, self.checker.ssl_contexts.get_context())
+        self.assertTrue(context.options & ssl.OP_NO_TICKET)
+    
+    def test_ssl_context_settings(self):
+        from main import SSLContextManager
+        manager = SSLContextManager({'mode': 'fetch', 'minimum_version': 'TLSv1.2', 'session_tickets': True})
+        context = manager.get_context()
+        self.assertEqual(context.verify_mode, ssl.CERT_NONE)
+        self.assertEqual(context.minimum_version, ssl.TLSVersion.TLSv1_2)
+        self.assertFalse(context.options & ssl.OP_NO_TICKET)
+        
+        with self.assertRaises(ValueError):
+            SSLContextManager({'minimum_version': 'SSLv2'})
+    
+    def test_fetch_mode_reads_self_signed_certificate(self):
+        from main import SSLContextManager
+        with tempfile.TemporaryDirectory() as directory:
+            cert_path, key_path = make_self_signed_certificate('localhost', 20, directory)
+            
+            # Verification rejects the self-signed certificate
+            port = start_tls_server(cert_path, key_path)
+            self.assertIsNone(self.checker._get_certificate_info('localhost', port, 5))
+            
+            # Fetch-only mode still returns its expiry data
+            self.checker.ssl_contexts = SSLContextManager({'mode': 'fetch'})
+            port = start_tls_server(cert_path, key_path)
+            cert_info = self.checker._get_certificate_info('localhost', port, 5)
+            self.assertEqual(cert_info['subjectAltName'], (('DNS', 'localhost'),))
+            result = self.checker._build_result('https://localhost', 'localhost', cert_info)
+            self.assertEqual(result['status'], 'WARNING')
+    
+    def test_starttls_protocols_on_both_engines(self):
+        import asyncio
+        from main import SSLContextManager
+        self.checker.ssl_contexts = SSLContextManager({'mode': 'fetch'})
+        self.assertEqual(self.checker._parse_url('smtp://mail.example.com'), ('mail.example.com', 25))
+        self.assertEqual(self.checker._parse_url('postgres://db.example.com'), ('db.example.com', 5432))
+        
+        with tempfile.TemporaryDirectory() as directory:
+            cert_path, key_path = make_self_signed_certificate('localhost', 90, directory)
+            for protocol in ('smtp', 'imap', 'ldap', 'postgres'):
+                port = start_starttls_server(cert_path, key_path, protocol, connections=2)
+                url = f"{protocol}://localhost:{port}"
+                
+                threaded = self.checker._check_single_certificate(url)
+                async_result = asyncio.run(self.checker._check_single_certificate_async(url))
+                for result in (threaded, async_result):
+                    self.assertEqual(result['status'], 'OK', protocol)
+                    self.assertIn('starttls', result['timings'])
+                
+                # A server that refuses the upgrade is reported as an error
+                port = start_starttls_server(cert_path, key_path, protocol, accept=False)
+                refused = self.checker._check_single_certificate(f"{protocol}://localhost:{port}")
+                self.assertEqual(refused['status'], 'ERROR', protocol)
+    
+    def test_chain_metadata_and_earliest_expiry_on_both_engines(self):
+        import asyncio
+        from main import SSLContextManager
+        self.checker.ssl_contexts = SSLContextManager({'mode': 'fetch', 'chain': True})
+        with tempfile.TemporaryDirectory() as directory:
+            # The leaf is valid for 200 days but its intermediate expires in 5
+            cert_path, key_path = make_chained_certificate('localhost', 5, 200, directory)
+            port = start_tls_server(cert_path, key_path, connections=2)
+            url = f"https://localhost:{port}"
+            
+            threaded = self.checker._check_single_certificate(url)
+            async_result = asyncio.run(self.checker._check_single_certificate_async(url))
+        
+        for result in (threaded, async_result):
+            self.assertEqual(result['status'], 'CRITICAL')
+            leaf, intermediate = result['chain']
+            self.assertEqual(leaf['fingerprint'], result['fingerprint'])
+            self.assertEqual(leaf['subject_alt_names'], ['localhost'])
+            self.assertEqual((leaf['key_type'], leaf['key_size']), ('EC', 256))
+            self.assertEqual(leaf['ocsp_urls'], ['http://ocsp.example.com'])
+            self.assertEqual(leaf['issuer'], intermediate['subject'])
+            self.assertEqual((intermediate['key_type'], intermediate['key_size']), ('RSA', 2048))
+            self.assertEqual(result['expiry_date'], intermediate['not_after'])
+    
+    def test_cache_skips_certificates_that_cannot_change_status(self):
+        from main import ResultCache
+        with tempfile.TemporaryDirectory() as directory:
+            self.checker.config['cache'] = {'enabled': True, 'run_interval_hours': 24, 'max_age_hours': 168}
+            self.checker.cache = ResultCache(os.path.join(directory, 'cache.db'))
+            self.checker.config['websites'] = ["https://far.example.com", "https://near.example.com"]
+            now = datetime.now(timezone.utc)
+            certs = {
+                'far.example.com': {'notAfter': (now + timedelta(days=200)).strftime('%b %d %H:%M:%S %Y GMT')},
+                # Crosses the 30 day warning threshold before the next daily run
+                'near.example.com': {'notAfter': (now + timedelta(days=31, hours=12)).strftime('%b %d %H:%M:%S %Y GMT')}
+            }
+            
+            with patch.object(self.checker, '_get_certificate_info', side_effect=lambda h, p, t, a=None, **kwargs: certs[h]) as probe:
+                first = self.checker.check_certificates()
+                self.assertEqual(probe.call_count, 2)
+                
+                second = self.checker.check_certificates()
+                self.assertEqual(probe.call_count, 3)
+                self.assertEqual(probe.call_args[0], ('near.example.com', 443, 5, None))
+                self.assertEqual([r['expiry_date'] for r in first], [r['expiry_date'] for r in second])
+                self.assertNotIn('timings', second[-1])
+                
+                self.checker.check_certificates(force_refresh=True)
+                self.assertEqual(probe.call_count, 5)
+            self.checker.cache.close()
+    
+    def test_cache_write_failure_keeps_probe_result(self):
+        from main import ResultCache
+        import sqlite3
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            self.checker.cache = ResultCache(path)
+            other = ResultCache(path)
+            # Each write is visible to another process's connection without waiting for commit()
+            other.put('shared.example.com:443', 1, 'ab', 2)
+            self.assertEqual(self.checker.cache.get('shared.example.com:443')['fingerprint'], 'ab')
+            
+            future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+            with patch.object(self.checker, '_get_certificate_info', return_value={'notAfter': future}), \
+                 patch.object(self.checker.cache, 'put', side_effect=sqlite3.OperationalError('database is locked')):
+                result = self.checker._check_single_certificate("https://example.com")
+            self.assertEqual(result['status'], 'OK')
+            self.assertIsNone(result['error'])
+            other.close()
+            self.checker.cache.close()
+    
+    def test_cache_entry_max_age(self):
+        now = time.time()
+        entry = {'not_after': int(now + 200 * 86400), 'fingerprint': None, 'checked_at': int(now - 3600)}
+        self.checker.config['cache'] = {'max_age_hours': 24}
+        self.assertTrue(self.checker._is_cache_entry_fresh(entry, now))
+        entry['checked_at'] = int(now - 25 * 3600)
+        self.assertFalse(self.checker._is_cache_entry_fresh(entry, now))
+    
+    def test_dns_stage_resolves_each_hostname_once(self):
+        from main import DNSResolver
+        import asyncio
+        resolver = DNSResolver(ttl=300)
+        addrinfo = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 443)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.2', 443)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 443))
+        ]
+        
+        async def getaddrinfo(hostname, port, **kwargs):
+            if hostname == 'missing.example.com':
+                raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+            return addrinfo
+        
+        async def run():
+            loop = asyncio.get_running_loop()
+            with patch.object(loop, 'getaddrinfo', side_effect=getaddrinfo) as lookup:
+                answers = await resolver.resolve_all([('a.example.com', 443), ('a.example.com', 8443),
+                                                      ('missing.example.com', 443)])
+                await resolver.resolve_all([('a.example.com', 443)])
+                return answers, lookup.call_count
+        
+        answers, lookups = asyncio.run(run())
+        self.assertEqual(answers, {'a.example.com': ['10.0.0.1', '10.0.0.2'], 'missing.example.com': []})
+        self.assertEqual(lookups, 2)
+        self.assertIn('Name or service not known', resolver.errors['missing.example.com'])
+        self.assertNotIn('a.example.com', resolver.errors)
+    
+    def test_dns_stage_probes_every_address(self):
+        from main import DNSResolver
+        self.checker.config['dns'] = {'enabled': True, 'probe_all_addresses': True}
+        self.checker.resolver = DNSResolver()
+        self.checker.config['websites'] = ["https://lb.example.com", "https://missing.example.com"]
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        
+        async def fake_resolve_all(hosts):
+            self.checker.resolver.errors['missing.example.com'] = '[Errno -2] Name or service not known'
+            return {'lb.example.com': ['10.0.0.1', '10.0.0.2'], 'missing.example.com': []}
+        
+        # One backend serves an expired certificate
+        certs = {
+            '10.0.0.1': {'notAfter': future},
+            '10.0.0.2': {'notAfter': 'Jan 15 23:59:59 2020 GMT'}
+        }
+        
+        with patch.object(self.checker.resolver, 'resolve_all', side_effect=fake_resolve_all), \
+             patch.object(self.checker, '_get_certificate_info', side_effect=lambda h, p, t, a=None, **kwargs: certs[a]) as probe:
+            results = self.checker.check_certificates()
+        
+        self.assertEqual(probe.call_count, 2)
+        by_address = {r.get('address'): r for r in results}
+        self.assertEqual(by_address['10.0.0.2']['status'], 'EXPIRED')
+        self.assertEqual(by_address['10.0.0.1']['status'], 'OK')
+        self.assertEqual(by_address[None]['url'], 'https://missing.example.com')
+        self.assertEqual(by_address[None]['status'], 'ERROR')
+        self.assertEqual(by_address[None]['error'], 'DNS resolution failed: [Errno -2] Name or service not known')
+    
+    def test_consolidated_scan_shares_certificates_per_endpoint(self):
+        from main import DNSResolver
+        self.checker.config['dns'] = {'enabled': True}
+        self.checker.config['consolidate'] = {'enabled': True}
+        self.checker.resolver = DNSResolver()
+        self.checker.config['websites'] = [
+            "https://example.com", "https://www.example.com", "https://api.example.com:443",
+            "https://example.com/login", "https://other.example.org", "https://example.com:8443"
+        ]
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        wildcard = {'notAfter': future, 'subjectAltName': (('DNS', 'example.com'), ('DNS', '*.example.com'))}
+        
+        async def fake_resolve_all(hosts):
+            return {host: ['10.0.0.1'] for host, port in hosts}
+        
+        with patch.object(self.checker.resolver, 'resolve_all', side_effect=fake_resolve_all), \
+             patch.object(self.checker, '_get_certificate_info', side_effect=lambda h, p, t, a=None, **kwargs: wildcard) as probe:
+            # By default only URLs with the same hostname and port share a handshake
+            self.checker.check_certificates()
+            self.assertEqual(sorted(call[0][:2] for call in probe.call_args_list),
+                             [('api.example.com', 443), ('example.com', 443), ('example.com', 8443),
+                              ('other.example.org', 443), ('www.example.com', 443)])
+            probe.reset_mock()
+            self.checker.config['consolidate']['share_by_san'] = True
+            results = self.checker.check_certificates()
+        
+        # One handshake per IP:port, plus other.example.org which the certificate does not cover
+        self.assertEqual(sorted(call[0][:2] for call in probe.call_args_list),
+                         [('example.com', 443), ('example.com', 8443), ('other.example.org', 443)])
+        by_url = {r['url']: r for r in results}
+        self.assertEqual(len(by_url), 6)
+        self.assertEqual(by_url["https://api.example.com:443"]['consolidated_with'], "https://example.com")
+        self.assertEqual(by_url["https://example.com/login"]['consolidated_with'], "https://example.com")
+        self.assertNotIn('consolidated_with', by_url["https://other.example.org"])
+        self.assertTrue(all(r['status'] == 'OK' for r in results))
+        
+        from main import certificate_covers
+        self.assertFalse(certificate_covers(wildcard, 'a.b.example.com'))
+        self.assertTrue(certificate_covers(wildcard, 'WWW.Example.com.'))
+    
+    def test_read_targets_skips_blank_lines_and_comments(self):
+        import io
+        from main import read_targets
+        stream = io.StringIO("https://a.example.com\n\n# staging\n  https://b.example.com  \n")
+        self.assertEqual(list(read_targets(stream)), ["https://a.example.com", "https://b.example.com"])
+    
+    def test_stream_certificates_writes_json_lines_and_keeps_top_n(self):
+        import io
+        now = datetime.now(timezone.utc)
+        days = {f"host{i}.example.com": i * 10 - 5 for i in range(10)}
+        
+        def fake_info(hostname, port, timeout, address=None, **kwargs):
+            if hostname == 'host9.example.com':
+                return None
+            return {'notAfter': (now + timedelta(days=days[hostname], hours=1)).strftime('%b %d %H:%M:%S %Y GMT')}
+        
+        self.checker.config['stream_chunk_size'] = 3
+        output = io.StringIO()
+        targets = (f"https://{hostname}" for hostname in days)
+        with patch.object(self.checker, '_get_certificate_info', side_effect=fake_info):
+            top, counts = self.checker.stream_certificates(targets, output, top_n=3)
+        
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(lines), 10)
+        self.assertEqual([r['days_until_expiry'] for r in top], [-5, 5, 15])
+        self.assertEqual(counts, {'OK': 5, 'WARNING': 2, 'CRITICAL': 1, 'EXPIRED': 1, 'ERROR': 1})
+    
+    def test_checkpoint_resumes_interrupted_scan(self):
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.config['websites'] = [f"https://host{i}.example.com" for i in range(4)]
+        self.checker.config['max_workers'] = 1
+        
+        def probe(hostname, port, timeout, address=None, **kwargs):
+            if hostname == 'host2.example.com' and interrupt:
+                raise KeyboardInterrupt
+            return {'notAfter': future}
+        
+        with tempfile.TemporaryDirectory() as directory:
+            journal = os.path.join(directory, 'checkpoint.jsonl')
+            self.checker.config['checkpoint'] = {'enabled': True, 'path': journal}
+            
+            interrupt = True
+            with patch.object(self.checker, '_get_certificate_info', side_effect=probe):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.checker.check_certificates()
+            self.assertTrue(os.path.exists(journal))
+            
+            interrupt = False
+            with patch.object(self.checker, '_get_certificate_info', side_effect=probe) as resumed_probe:
+                results = self.checker.check_certificates()
+            
+            # Only the targets that had not completed are probed again
+            self.assertEqual(sorted(call[0][0] for call in resumed_probe.call_args_list),
+                             ['host2.example.com', 'host3.example.com'])
+            self.assertEqual(sorted(r['url'] for r in results), self.checker.config['websites'])
+            self.assertFalse(os.path.exists(journal))
+    
+    def test_output_formats_render_results(self):
+        import csv
+        import io
+        from main import CSVRenderer
+        future = (datetime.now(timezone.utc) + timedelta(days=20)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.config['websites'] = ["https://a.example.com", "https://b.example.com"]
+        
+        # Streaming formats write each row while the scan runs
+        stream = io.StringIO()
+        renderer = CSVRenderer(self.checker.thresholds, stream)
+        with patch.object(self.checker, '_get_certificate_info', return_value={'notAfter': future}):
+            results = self.checker.check_certificates(on_result=renderer.write)
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        self.assertEqual(sorted(row['url'] for row in rows), self.checker.config['websites'])
+        self.assertEqual({row['status'] for row in rows}, {'WARNING'})
+        
+        for output_format, expected in [('jsonl', '"url": "https://a.example.com"'),
+                                        ('summary', 'Total certificates checked: 2'),
+                                        ('table', '| https://b.example.com')]:
+            self.checker.config['output_format'] = output_format
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                self.checker.display_results(results)
+            self.assertIn(expected, stdout.getvalue())
+        
+        self.checker.config['output_format'] = 'xml'
+        with self.assertRaises(ValueError):
+            self.checker.create_renderer()
+    
+    def test_log_filter_applies_host_levels_and_rate_limits_errors(self):
+        import logging
+        from main import HostLogFilter, JSONLogFormatter
+        now = [0.0]
+        log_filter = HostLogFilter(logging.INFO, logging.WARNING, {'debug.example.com': logging.DEBUG}, 60,
+                                   clock=lambda: now[0])
+        
+        def record(level, message, host=None):
+            entry = logging.LogRecord('main', level, __file__, 1, message, None, None)
+            if host is not None:
+                entry.host = host
+            return entry
+        
+        self.assertTrue(log_filter.filter(record(logging.INFO, "Starting")))
+        self.assertFalse(log_filter.filter(record(logging.INFO, "Checking a.example.com", 'a.example.com')))
+        self.assertTrue(log_filter.filter(record(logging.DEBUG, "Checking debug.example.com", 'debug.example.com')))
+        
+        # The same error for other hosts is dropped until the interval has passed
+        self.assertTrue(log_filter.filter(record(logging.ERROR, "Timeout connecting to a.example.com:443", 'a.example.com')))
+        self.assertFalse(log_filter.filter(record(logging.ERROR, "Timeout connecting to b.example.com:443", 'b.example.com')))
+        self.assertFalse(log_filter.filter(record(logging.ERROR, "Timeout connecting to c.example.com:443", 'c.example.com')))
+        self.assertTrue(log_filter.filter(record(logging.ERROR, "SSL error for a.example.com: bad", 'a.example.com')))
+        now[0] = 61
+        later = record(logging.ERROR, "Timeout connecting to d.example.com:443", 'd.example.com')
+        self.assertTrue(log_filter.filter(later))
+        self.assertEqual(later.getMessage(), "Timeout connecting to d.example.com:443 (2 similar messages suppressed)")
+        
+        line = json.loads(JSONLogFormatter().format(later))
+        self.assertEqual((line['level'], line['host']), ('ERROR', 'd.example.com'))
+    
+    def test_cli_check_needs_no_config_and_bare_options_mean_scan(self):
+        import io
+        import main
+        future = (datetime.now(timezone.utc) + timedelta(days=5)).strftime('%b %d %H:%M:%S %Y GMT')
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                with patch.object(CertificateChecker, '_get_certificate_info', return_value={'notAfter': future}), \
+                     patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                    with self.assertRaises(SystemExit) as exit_status:
+                        main.main(['check', 'api.example.com', 'smtp://mail.example.com', '--format', 'jsonl'])
+                self.assertEqual(os.listdir(directory), [])
+            finally:
+                os.chdir(cwd)
+        # CRITICAL certificates fail the pipeline step
+        self.assertEqual(exit_status.exception.code, 2)
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(sorted(line['url'] for line in lines), ['https://api.example.com', 'smtp://mail.example.com'])
+        
+        # The rotation history has no status to filter on
+        with patch('sys.stderr', new_callable=io.StringIO), self.assertRaises(SystemExit):
+            main.build_parser().parse_args(['query', 'history', 'api.example.com', '--status', 'OK'])
+        args = main.build_parser().parse_args(['query', 'top', '--status', 'OK'])
+        self.assertEqual(args.status, ['OK'])
+        
+        scan = MagicMock(return_value=None)
+        with patch.dict(main.COMMANDS, {'scan': scan}):
+            main.main(['--config', 'other.json', '--daemon'])
+        args = scan.call_args[0][0]
+        self.assertEqual((args.command, args.config, args.daemon), ('scan', 'other.json', True))
+    
+    def test_import_leaves_scan_only_modules_unloaded(self):
+        import subprocess
+        import sys
+        # A fresh interpreter, since this test process has imported asyncio already
+        code = "import sys, main; print(sorted(m for m in ('asyncio', 'signal', 'requests', 'tabulate') if m in sys.modules))"
+        output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+    
+    def test_scan_streams_rows_to_stdout_and_logs_to_stderr(self):
+        import csv
+        import io
+        import main
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'config.json'), 'w') as f:
+                json.dump({'websites': ["https://a.example.com", "https://b.example.com"], 'output_format': 'csv',
+                           'logging': {'level': 'INFO', 'path': None}}, f)
+            os.chdir(directory)
+            try:
+                with patch.object(CertificateChecker, '_get_certificate_info', return_value={'notAfter': future}), \
+                     patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                     patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                    main.main(['scan'])
+                    main.log_pipeline.stop()
+            finally:
+                os.chdir(cwd)
+        rows = list(csv.DictReader(io.StringIO(stdout.getvalue())))
+        self.assertEqual(sorted(row['url'] for row in rows), ["https://a.example.com", "https://b.example.com"])
+        self.assertEqual({row['status'] for row in rows}, {'OK'})
+        self.assertIn('Checking certificate for https://a.example.com', stderr.getvalue())
+    
+    def test_check_files_parses_bundles_and_skips_unchanged_files(self):
+        import main
+        with tempfile.TemporaryDirectory() as directory:
+            certs = os.path.join(directory, 'certs')
+            os.makedirs(os.path.join(certs, 'nested'))
+            leaf, key = make_self_signed_certificate('internal.example.com', 5, certs)
+            root, _ = make_self_signed_certificate('root.example.com', 400, certs)
+            with open(os.path.join(certs, 'nested', 'bundle.pem'), 'w') as bundle:
+                for path in (key, leaf, root):
+                    with open(path) as f:
+                        bundle.write(f.read())
+            with open(os.path.join(certs, 'broken.crt'), 'w') as f:
+                f.write('not a certificate')
+            os.symlink(leaf, os.path.join(certs, 'nested', 'link.crt'))
+            self.checker.config['websites'] = []
+            self.checker.config['files'] = {'enabled': True, 'paths': [certs],
+                                            'index': os.path.join(directory, 'index.db')}
+            
+            with patch('main.read_certificate_file', wraps=main.read_certificate_file) as read:
+                results = self.checker.check_certificates()
+            self.assertEqual(read.call_count, 4)
+            by_url = {r['url']: r for r in results}
+            self.assertEqual(by_url[f"file://{certs}/nested/bundle.pem#1"]['status'], 'CRITICAL')
+            self.assertEqual(by_url[f"file://{certs}/nested/bundle.pem#2"]['hostname'], 'root.example.com')
+            self.assertEqual(by_url[f"file://{certs}/broken.crt"]['status'], 'ERROR')
+            # The symlink and its target are the same file and reported once
+            self.assertEqual(len(results), 5)
+            
+            os.remove(os.path.join(certs, 'broken.crt'))
+            with patch('main.read_certificate_file', wraps=main.read_certificate_file) as read:
+                results = self.checker.check_certificates()
+            self.assertEqual(read.call_count, 0)
+            self.assertEqual(len(results), 4)
+            self.assertEqual(results[0]['status'], 'CRITICAL')
+    
+    def test_check_files_logs_key_only_files_and_uses_wal_index(self):
+        import sqlite3
+        with tempfile.TemporaryDirectory() as directory:
+            _, key = make_self_signed_certificate('internal.example.com', 90, directory)
+            os.rename(key, os.path.join(directory, 'privkey.pem'))
+            index = os.path.join(directory, 'index.db')
+            self.checker.config['websites'] = []
+            self.checker.config['files'] = {'enabled': True, 'paths': [directory], 'index': index}
+            with self.assertLogs('main', level='DEBUG') as logs:
+                results = self.checker.check_certificates()
+            self.assertEqual([r['hostname'] for r in results], ['internal.example.com'])
+            self.assertTrue(any('No certificate in' in line and 'privkey.pem' in line for line in logs.output))
+            conn = sqlite3.connect(index)
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            conn.close()
+    
+    def test_file_results_reach_metrics_and_history(self):
+        from main import HistoryStore
+        with tempfile.TemporaryDirectory() as directory:
+            make_self_signed_certificate('internal.example.com', 5, directory)
+            self.checker.config['websites'] = []
+            self.checker.config['files'] = {'enabled': True, 'paths': [directory], 'patterns': ['*.crt'],
+                                            'index': os.path.join(directory, 'index.db')}
+            self.checker.history = HistoryStore(os.path.join(directory, 'history.db'))
+            self.checker.check_certificates()
+            
+            self.assertEqual(self.checker.metrics.probes, {'CRITICAL': 1})
+            rows = self.checker.history.most_urgent()
+            self.assertEqual([(r['url'], r['status']) for r in rows],
+                             [(f"file://{directory}/internal.example.com.crt", 'CRITICAL')])
+            self.checker.history.close()
+    
+    def test_history_store_records_runs_and_answers_queries(self):
+        from main import HistoryStore
+        self.checker.config['websites'] = ["https://a.example.com", "https://b.example.com"]
+        now = datetime.now(timezone.utc)
+        expiry = {'a.example.com': 10, 'b.example.com': 90}
+        
+        def probe(hostname, port, timeout, address=None, **kwargs):
+            days = expiry[hostname]
+            return {'notAfter': (now + timedelta(days=days)).strftime('%b %d %H:%M:%S %Y GMT'),
+                    'fingerprint': f"{hostname}-{days}"}
+        
+        with tempfile.TemporaryDirectory() as directory:
+            self.checker.history = HistoryStore(os.path.join(directory, 'history.db'))
+            with patch.object(self.checker, 'load_previous_results', return_value=None), \
+                 patch.object(self.checker, '_get_certificate_info', side_effect=probe):
+                self.checker.check_certificates()
+                # Host a rotates to a new certificate before the second run
+                expiry['a.example.com'] = 100
+                self.checker.check_certificates()
+            history = self.checker.history
+            
+            # Current-state queries only see the latest result per target
+            self.assertEqual(history.expiring(time.time() + 14 * 86400), [])
+            urgent = history.most_urgent(limit=1)
+            self.assertEqual([r['url'] for r in urgent], ["https://b.example.com"])
+            self.assertEqual(urgent[0]['status'], 'OK')
+            self.assertEqual(len(history.most_urgent(statuses=['WARNING'])), 0)
+            
+            rotations = history.rotations('a.example.com')
+            self.assertEqual([r['fingerprint'] for r in rotations], ['a.example.com-10', 'a.example.com-100'])
+            self.assertEqual([r['observations'] for r in rotations], [1, 1])
+            history.close()
+    
+    def test_shard_index_partitions_targets_stably(self):
+        from main import shard_index
+        urls = [f"https://host{i}.example.com" for i in range(100)]
+        shards = [[url for url in urls if shard_index(url, 4) == index] for index in range(4)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(urls))
+        self.assertTrue(all(shards))
+        # Known value guards against accidental use of the randomized built-in hash()
+        self.assertEqual(shard_index("https://google.com", 4), 0)
+        self.assertEqual(shard_index("https://github.com", 4), 2)
+    
+    def test_check_certificates_scans_only_its_shard(self):
+        from main import shard_index
+        self.checker.config['websites'] = [f"https://host{i}.example.com" for i in range(20)]
+        with patch.object(self.checker, '_get_certificate_info', return_value=None):
+            results = self.checker.check_certificates(shard=(1, 3))
+        self.assertTrue(results)
+        self.assertTrue(all(shard_index(r['url'], 3) == 1 for r in results))
+    
+    def test_sharded_scan_records_every_shard_in_history(self):
+        from main import run_sharded, HistoryStore
+        import sqlite3
+        with tempfile.TemporaryDirectory() as directory:
+            history_path = os.path.join(directory, 'history.db')
+            config_path = os.path.join(directory, 'config.json')
+            websites = [f"https://host{i}.example.com" for i in range(9)]
+            with open(config_path, 'w') as f:
+                json.dump({'websites': websites, 'timeout': 5, 'max_workers': 1,
+                           'history': {'enabled': True, 'path': history_path},
+                           'logging': {'level': 'ERROR', 'path': None}}, f)
+            future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+            
+            def probe(checker, hostname, port, timeout, address=None, **kwargs):
+                # Fails if any shard holds the history write lock across a probe
+                conn = sqlite3.connect(history_path, timeout=1)
+                conn.execute('BEGIN IMMEDIATE')
+                conn.rollback()
+                conn.close()
+                return {'notAfter': future}
+            
+            checker = CertificateChecker(config_path)
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                with patch.object(CertificateChecker, '_get_certificate_info', probe):
+                    results = run_sharded(checker, 3)
+            finally:
+                os.chdir(cwd)
+            checker.history.close()
+            
+            self.assertEqual(sorted(r['url'] for r in results), sorted(websites))
+            self.assertEqual({r['status'] for r in results}, {'OK'})
+            history = HistoryStore(history_path)
+            self.assertEqual(sorted(r['url'] for r in history.most_urgent(limit=20)), sorted(websites))
+            history.close()
+    
+    def test_merge_results_combines_partial_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = []
+            for index, days in enumerate([40, 3, 'N/A']):
+                status = 'ERROR' if days == 'N/A' else self.checker._determine_status(days)
+                result = {'url': f"https://host{index}.example.com", 'hostname': f"host{index}.example.com",
+                          'status': status, 'expiry_date': 'N/A', 'days_until_expiry': days, 'error': None}
+                filename = os.path.join(directory, f"part{index}.json")
+                self.checker.save_results_to_file([result], filename)
+                filenames.append(filename)
+            
+            merged = self.checker.merge_results(filenames)
+        self.assertEqual([r['days_until_expiry'] for r in merged], [3, 40, 'N/A'])
+    
+    def test_result_store_round_trips_and_counts(self):
+        from main import ResultStore
+        results = [
+            {'url': 'https://a.example.com', 'hostname': 'a.example.com', 'status': 'OK',
+             'expiry_date': '2030-01-15 23:59:59 UTC', 'days_until_expiry': 400, 'error': None,
+             'fingerprint': 'ab' * 32, 'timings': {'connect': 0.25, 'handshake': 0.5}},
+            {'url': 'https://b.example.com', 'hostname': None, 'status': 'ERROR', 'expiry_date': 'N/A',
+             'days_until_expiry': 'N/A', 'error': 'Failed to retrieve certificate', 'address': '2001:db8::1'},
+            {'url': 'https://c.example.com', 'hostname': 'c.example.com', 'status': 'EXPIRED',
+             'expiry_date': '2020-02-29 00:00:00 UTC', 'days_until_expiry': -100, 'error': None}
+        ]
+        store = ResultStore(results)
+        
+        self.assertEqual(store, results)
+        self.assertEqual(store[-1], results[2])
+        self.assertEqual(store.counts, {'OK': 1, 'ERROR': 1, 'EXPIRED': 1})
+        
+        store.sort_by_urgency()
+        self.assertEqual(list(store), sorted(results, key=self.checker._sort_key))
+        self.assertEqual(json.loads(json.dumps(list(store))), list(store))
+    
+    def test_fast_certificate_dates_and_reference_time(self):
+        from main import ResultStore, cert_time_to_seconds
+        for value in ('Jan  5 00:00:01 2025 GMT', 'Feb 29 23:59:59 2028 GMT', 'Dec 31 12:00:00 1999 UTC'):
+            expected = datetime.strptime(value, '%b %d %H:%M:%S %Y %Z').replace(tzinfo=timezone.utc)
+            self.assertEqual(cert_time_to_seconds(value), int(expected.timestamp()))
+        for value in ('2025-01-05 00:00:01 UTC', '2028-02-29 23:59:59 UTC'):
+            expected = datetime.strptime(value, ResultStore.DATE_FORMAT).replace(tzinfo=timezone.utc)
+            self.assertEqual(ResultStore.expiry_seconds(value), int(expected.timestamp()))
+        for value in ('N/A', None, '2025-01-05', '2025-01-05 00:00:01 GMT'):
+            self.assertIsNone(ResultStore.expiry_seconds(value))
+        
+        # Every result of a run counts days from the same instant
+        self.checker.reference_time = cert_time_to_seconds('Jan 10 12:00:00 2025 GMT')
+        expiry = self.checker._parse_certificate_date('Jan 17 12:00:00 2025 GMT')
+        self.assertEqual(self.checker._calculate_days_until_expiry(expiry), 7)
+        self.assertEqual(self.checker._calculate_days_until_expiry(expiry - timedelta(seconds=1)), 6)
+        
+        results = [self.checker._build_expiry_result(f"https://{days}.example.com", f"{days}.example.com",
+                                                     expiry + timedelta(days=days))
+                   for days in (30, -10, 300)]
+        results.append(self.checker._build_result('https://down.example.com', 'down.example.com', None))
+        store = ResultStore(results)
+        
+        # Ten days later the same certificates are reclassified in bulk
+        store.reclassify(self.checker.reference_time + 10 * 86400, self.checker.thresholds)
+        store.sort_by_urgency()
+        self.assertEqual([(r['status'], r['days_until_expiry']) for r in store],
+                         [('EXPIRED', -13), ('WARNING', 27), ('OK', 297), ('ERROR', 'N/A')])
+        self.assertEqual(store.counts, {'OK': 1, 'WARNING': 1, 'EXPIRED': 1, 'ERROR': 1})
+    
+    def test_compute_changes_classifies_transitions(self):
+        def result(host, status, expiry='2030-01-01 00:00:00 UTC', days=100):
+            return {'url': f"https://{host}", 'hostname': host, 'status': status,
+                    'expiry_date': expiry, 'days_until_expiry': days, 'error': None}
+        previous = [result('same', 'OK'), result('worse', 'WARNING', days=10), result('renewed', 'CRITICAL', days=3),
+                    result('broken', 'OK'), result('fixed', 'ERROR', 'N/A', 'N/A'), result('gone', 'OK')]
+        current = [result('same', 'OK'), result('worse', 'CRITICAL', days=5),
+                   result('renewed', 'OK', '2031-01-01 00:00:00 UTC', 400), result('broken', 'ERROR', 'N/A', 'N/A'),
+                   result('fixed', 'OK'), result('new', 'WARNING', days=20)]
+        
+        changes = {c['hostname']: c for c in self.checker.compute_changes(previous, current)}
+        self.assertEqual({host: c['change'] for host, c in changes.items()}, {
+            'worse': 'status_changed', 'renewed': 'renewed', 'broken': 'new_error',
+            'fixed': 'recovered', 'new': 'added', 'gone': 'removed'
+        })
+        self.assertEqual(changes['worse']['previous_status'], 'WARNING')
+        self.assertIsNone(changes['new']['previous_status'])
+    
+    def test_delta_report_uses_output_format(self):
+        import csv
+        import io
+        previous = [{'url': 'https://a.example.com', 'hostname': 'a.example.com', 'status': 'OK',
+                     'expiry_date': '2030-01-01 00:00:00 UTC', 'days_until_expiry': 100, 'error': None}]
+        current = [dict(previous[0], status='WARNING', days_until_expiry=20)]
+        changes = self.checker.compute_changes(previous, current)
+        
+        for output_format, expected in [('table', '| https://a.example.com | status_changed'),
+                                        ('summary', 'Changes since the previous run: 1'),
+                                        ('jsonl', '"change": "status_changed"')]:
+            self.checker.config['output_format'] = output_format
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                self.checker.display_changes(changes, {'WARNING': 1})
+            self.assertIn(expected, stdout.getvalue())
+        
+        self.checker.config['output_format'] = 'csv'
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.checker.display_changes(changes, {'WARNING': 1})
+        rows = list(csv.DictReader(io.StringIO(stdout.getvalue())))
+        self.assertEqual([(r['url'], r['change'], r['previous_status'], r['status']) for r in rows],
+                         [('https://a.example.com', 'status_changed', 'OK', 'WARNING')])
+    
+    @patch('requests.Session.post')
+    def test_delta_report_alerts_only_on_changes(self, mock_post):
+        from main import report_results
+        mock_post.return_value = MagicMock(status_code=200)
+        self.checker.config['report_mode'] = 'delta'
+        results = [
+            {'url': f"https://host{i}.example.com", 'hostname': f"host{i}.example.com", 'status': 'CRITICAL',
+             'expiry_date': '2025-01-15 23:59:59 UTC', 'days_until_expiry': 5, 'error': None}
+            for i in range(3)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            previous_dir = os.getcwd()
+            os.chdir(directory)
+            try:
+                with patch('builtins.print'):
+                    report_results(self.checker, results)
+                    report_results(self.checker, results)
+                    self.assertEqual(mock_post.call_count, 1)
+                    
+                    results[0] = dict(results[0], status='EXPIRED', days_until_expiry=-1)
+                    report_results(self.checker, results)
+            finally:
+                os.chdir(previous_dir)
+        
+        self.assertEqual(mock_post.call_count, 2)
+        attachments = mock_post.call_args[1]['json']['attachments']
+        self.assertEqual(attachments[0]['fields'][0]['value'], '3')
+        self.assertEqual(attachments[1]['text'].count('•'), 1)
+    
+    def test_parse_shard(self):
+        import argparse
+        from main import parse_shard
+        self.assertEqual(parse_shard('2/4'), (1, 4))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_shard('5/4')
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_shard('two')
+    
+    def test_scheduler_aimd_adjusts_limit(self):
+        from main import AdaptiveScheduler
+        scheduler = AdaptiveScheduler({'initial_concurrency': 10, 'target_latency': 1.0}, max_concurrency=100)
+        for _ in range(10):
+            scheduler._adjust(0.1, True)
+        self.assertAlmostEqual(scheduler.limit, 11, delta=0.1)
+        
+        scheduler._adjust(0.1, False)
+        self.assertAlmostEqual(scheduler.limit, 5.5, delta=0.1)
+        # A burst of failures within one latency window only halves once
+        scheduler._adjust(5.0, True)
+        self.assertAlmostEqual(scheduler.limit, 5.5, delta=0.1)
+    
+    def test_scheduler_groups_backends_and_interleaves(self):
+        from main import AdaptiveScheduler
+        scheduler = AdaptiveScheduler({}, max_concurrency=100)
+        self.assertEqual(scheduler.backend_key('203.0.113.7'), '203.0.113.0/24')
+        self.assertEqual(scheduler.backend_key('2001:db8::1'), '2001:db8::/48')
+        self.assertEqual(scheduler.backend_key('example.com'), 'example.com')
+        
+        probes = [('a1', '10.0.0.1'), ('a2', '10.0.0.2'), ('a3', '10.0.0.3'), ('b1', '10.0.1.1'), ('c1', '10.0.2.1')]
+        ordered = scheduler.interleave(probes, lambda url, address: scheduler.backend_key(address))
+        self.assertEqual([url for url, _ in ordered], ['a1', 'b1', 'c1', 'a2', 'a3'])
+    
+    def test_scheduler_returns_slots_of_probes_cancelled_while_spaced(self):
+        import asyncio
+        from main import AdaptiveScheduler
+        scheduler = AdaptiveScheduler({'initial_concurrency': 10, 'max_per_backend': 1, 'min_interval': 0.2}, 10)
+        
+        async def run():
+            scheduler.start_run()
+            await scheduler.acquire('backend')
+            await scheduler.release('backend', 0.01, True)
+            # The next start to the backend is spaced out; cancel it while it waits
+            spaced = asyncio.ensure_future(scheduler.acquire('backend'))
+            await asyncio.sleep(0.05)
+            spaced.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await spaced
+            self.assertEqual((scheduler.active, scheduler._backend_active), (0, {}))
+            # The backend slot is free again for the next probe
+            await asyncio.wait_for(scheduler.acquire('backend'), timeout=1)
+            await scheduler.release('backend', 0.01, True)
+        
+        asyncio.run(run())
+    
+    def test_scheduler_caps_connections_per_backend(self):
+        import asyncio
+        from main import AdaptiveScheduler
+        self.checker.config.update({'engine': 'asyncio', 'max_concurrency': 20})
+        self.checker.scheduler = AdaptiveScheduler({'initial_concurrency': 20, 'max_per_backend': 2}, 20)
+        self.checker.config['websites'] = [f"https://cdn.example.com/{i}" for i in range(8)] + \
+                                          [f"https://other{i}.example.com" for i in range(4)]
+        active = {}
+        peak = {}
+        
+        async def fake_check(url, address=None, queued_at=None):
+            host = url.split('/')[2]
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return {'url': url, 'hostname': host, 'status': 'ERROR', 'expiry_date': 'N/A',
+                    'days_until_expiry': 'N/A', 'error': None}
+        
+        with patch.object(self.checker, '_check_single_certificate_async', side_effect=fake_check):
+            results = self.checker.check_certificates()
+        
+        self.assertEqual(len(results), 12)
+        self.assertEqual(peak['cdn.example.com'], 2)
+    
+    def test_probe_timings_on_both_engines(self):
+        import asyncio
+        from main import SSLContextManager
+        self.checker.ssl_contexts = SSLContextManager({'mode': 'fetch'})
+        with tempfile.TemporaryDirectory() as directory:
+            cert_path, key_path = make_self_signed_certificate('localhost', 90, directory)
+            port = start_tls_server(cert_path, key_path, connections=2)
+            url = f"https://localhost:{port}"
+            
+            threaded = self.checker._check_single_certificate(url, queued_at=time.monotonic())
+            async_result = asyncio.run(self.checker._check_single_certificate_async(url))
+        
+        self.assertEqual(threaded['status'], 'OK')
+        self.assertEqual(set(threaded['timings']), {'queue', 'connect', 'handshake', 'parse'})
+        self.assertEqual(async_result['status'], 'OK')
+        self.assertEqual(set(async_result['timings']), {'connect', 'handshake', 'parse'})
+    
+    def test_metrics_render_and_serve(self):
+        from main import ScanMetrics
+        import urllib.request
+        metrics = ScanMetrics()
+        metrics.observe({'status': 'OK', 'timings': {'connect': 0.02, 'handshake': 0.3}})
+        metrics.observe({'status': 'ERROR', 'timings': {'connect': 12.0}})
+        metrics.observe_scan(1.5, 2)
+        text = metrics.render()
+        
+        self.assertIn('cert_checker_probes_total{status="OK"} 1', text)
+        self.assertIn('cert_checker_phase_seconds_bucket{phase="connect",le="0.025"} 1', text)
+        self.assertIn('cert_checker_phase_seconds_bucket{phase="connect",le="+Inf"} 2', text)
+        self.assertIn('cert_checker_phase_seconds_count{phase="handshake"} 1', text)
+        self.assertIn('cert_checker_last_scan_results 2', text)
+        
+        metrics.serve(0, '127.0.0.1')
+        try:
+            port = metrics._server.server_port
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                self.assertEqual(response.read().decode('utf-8'), metrics.render())
+        finally:
+            metrics.shutdown()
+    
+    def test_service_coalesces_checks_and_streams_bulk_results(self):
+        import urllib.request
+        from main import CertificateService
+        future = (datetime.now(timezone.utc) + timedelta(days=20)).strftime('%b %d %H:%M:%S %Y GMT')
+        
+        def slow_probe(hostname, port, timeout, address=None, **kwargs):
+            time.sleep(0.2)
+            return {'notAfter': future}
+        
+        with patch.object(self.checker, 'load_previous_results', return_value=None), \
+             patch.object(self.checker, '_get_certificate_info', side_effect=slow_probe) as probe:
+            service = CertificateService(self.checker)
+            port = service.start(0)
+            base = f"http://127.0.0.1:{port}"
+            try:
+                # Concurrent lookups of one host share a single handshake
+                responses = []
+                threads = [
+                    threading.Thread(target=lambda: responses.append(json.load(
+                        urllib.request.urlopen(f"{base}/check?url=api.example.com", timeout=5))))
+                    for _ in range(5)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(probe.call_count, 1)
+                self.assertEqual([r['status'] for r in responses], ['WARNING'] * 5)
+                
+                body = b'"https://a.example.com"\n{"url": "https://b.example.com"}\n'
+                request = urllib.request.Request(f"{base}/check", data=body, method='POST')
+                lines = urllib.request.urlopen(request, timeout=5).read().splitlines()
+                self.assertEqual(sorted(json.loads(line)['url'] for line in lines),
+                                 ['https://a.example.com', 'https://b.example.com'])
+                
+                results = json.load(urllib.request.urlopen(f"{base}/results?status=warning&max_days=25", timeout=5))
+                self.assertEqual(len(results), 3)
+                self.assertEqual(json.load(urllib.request.urlopen(f"{base}/results?max_days=5", timeout=5)), [])
+            finally:
+                service.stop()
+    
+    def test_service_query_recounts_days_for_the_current_time(self):
+        from main import CertificateService
+        yesterday = datetime.now(timezone.utc) - timedelta(hours=12)
+        # Saved while the certificate still had half a day left
+        saved = [{'url': 'https://a.example.com', 'hostname': 'a.example.com', 'status': 'CRITICAL',
+                  'expiry_date': yesterday.strftime('%Y-%m-%d %H:%M:%S UTC'), 'days_until_expiry': 0, 'error': None}]
+        with patch.object(self.checker, 'load_previous_results', return_value=saved):
+            service = CertificateService(self.checker)
+        self.assertEqual(service.query(['CRITICAL']), [])
+        expired = service.query(['EXPIRED'])
+        self.assertEqual([(r['url'], r['days_until_expiry']) for r in expired], [('https://a.example.com', -1)])
+        self.assertEqual(service.query(min_days=0), [])
+    
+    def test_service_returns_results_when_history_write_fails(self):
+        import sqlite3
+        import urllib.request
+        from main import CertificateService
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%b %d %H:%M:%S %Y GMT')
+        self.checker.history = MagicMock()
+        self.checker.history.record.side_effect = sqlite3.OperationalError('database is locked')
+        with patch.object(self.checker, 'load_previous_results', return_value=None), \
+             patch.object(self.checker, '_get_certificate_info', return_value={'notAfter': future}):
+            service = CertificateService(self.checker)
+            port = service.start(0)
+            try:
+                result = json.load(urllib.request.urlopen(f"http://127.0.0.1:{port}/check?url=api.example.com", timeout=5))
+            finally:
+                service.stop()
+        self.assertEqual(result['status'], 'OK')
+        self.assertEqual(service.latest['https://api.example.com']['status'], 'OK')
+        self.checker.history = None
+    
+    def test_daemon_next_check_delay_tracks_thresholds(self):
+        from main import CertificateDaemon
+        daemon = CertificateDaemon(self.checker)
+        result = lambda days: {'days_until_expiry': days}
+        # 200 days out: far from the 30 day threshold, capped at the maximum interval
+        self.assertEqual(daemon.next_check_delay(result(200)), 24 * 3600)
+        # One day above the warning threshold: recheck within half a day
+        self.assertEqual(daemon.next_check_delay(result(31)), 12 * 3600)
+        self.assertEqual(daemon.next_check_delay(result(-3)), 3600)
+        self.assertEqual(daemon.next_check_delay(result('N/A')), 1800)
+    
+    def test_daemon_spreads_checks_and_reloads_config(self):
+        from main import CertificateDaemon
+        now = [1000000.0]
+        self.checker.config['websites'] = [f"https://host{i}.example.com" for i in range(4)]
+        future = (datetime.now(timezone.utc) + timedelta(days=200)).strftime('%b %d %H:%M:%S %Y GMT')
+        
+        with patch.object(self.checker, '_get_certificate_info', return_value={'notAfter': future}), \
+             patch.object(self.checker, 'save_results_to_file'), \
+             patch.object(self.checker, 'send_slack_webhook_alert'):
+            daemon = CertificateDaemon(self.checker, clock=lambda: now[0])
+            # The first pass is spread over the initial hour
+            self.assertEqual(len(daemon.run_pending()), 1)
+            now[0] += 1800
+            self.assertEqual(len(daemon.run_pending()), 2)
+            now[0] += 1800
+            self.assertEqual(len(daemon.run_pending()), 1)
+            self.assertEqual(daemon.run_pending(), [])
+            self.assertGreater(daemon.seconds_until_next(), 20 * 3600)
+            
+            # Editing the config file adds and removes websites without a restart
+            with open(self.temp_config.name, 'w') as f:
+                json.dump(dict(self.test_config, websites=["https://host0.example.com", "https://new.example.com"]), f)
+            os.utime(self.temp_config.name, (now[0] + 5, now[0] + 5))
+            self.assertTrue(daemon._reload_if_changed(now[0]))
+            self.assertEqual(set(daemon.due), {"https://host0.example.com", "https://new.example.com"})
+            self.assertEqual([r['url'] for r in daemon.run_pending()], ["https://new.example.com"])
+    
+    def test_failed_reload_keeps_previous_configuration(self):
+        from main import CertificateDaemon
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = os.path.join(directory, 'config.json')
+            config = dict(self.test_config, websites=["https://host0.example.com"],
+                          cache={'enabled': True, 'path': os.path.join(directory, 'cache.db')})
+            with open(config_path, 'w') as f:
+                json.dump(config, f)
+            checker = CertificateChecker(config_path)
+            cache = checker.cache
+            future = (datetime.now(timezone.utc) + timedelta(days=200)).strftime('%b %d %H:%M:%S %Y GMT')
+            
+            with patch.object(checker, '_get_certificate_info', return_value={'notAfter': future}), \
+                 patch.object(checker, 'save_results_to_file'), \
+                 patch.object(checker, 'send_slack_webhook_alert'):
+                daemon = CertificateDaemon(checker, clock=lambda: 1000000.0)
+                with open(config_path, 'w') as f:
+                    json.dump(dict(config, websites=["https://new.example.com"], tls={'mode': 'bogus'}), f)
+                os.utime(config_path, (1000005, 1000005))
+                self.assertFalse(daemon._reload_if_changed(1000000.0))
+                
+                self.assertEqual(checker.config['websites'], ["https://host0.example.com"])
+                self.assertIs(checker.cache, cache)
+                self.assertEqual(checker.ssl_contexts.mode, 'verify')
+                results = checker.check_certificates(force_refresh=True)
+                self.assertEqual([r['status'] for r in results], ['OK'])
+                self.assertIsNotNone(checker.cache.get('host0.example.com:443'))
+            checker.cache.close()
+    
+    def test_benchmark_smoke(self):
+        import argparse
+        import benchmark
+        args = argparse.Namespace(listeners=10, modes=['threads', 'asyncio'], latency_ms=5, reset_ratio=0.1,
+                                  hang_ratio=0, timeout=2, max_workers=5, max_concurrency=50, verify=True)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                report = benchmark.run_benchmark(args)
+            finally:
+                os.chdir(cwd)
+            # Logging is switched off for the measured runs
+            self.assertFalse(os.path.exists(os.path.join(directory, 'cert_checker.log')))
+        for mode in ('threads', 'asyncio'):
+            self.assertEqual(report['modes'][mode]['probes'], 10)
+            self.assertEqual(report['modes'][mode]['mismatches'], 0)
+            self.assertGreater(report['modes'][mode]['hosts_per_second'], 0)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file